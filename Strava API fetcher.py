@@ -1,5 +1,12 @@
 """
 TATRY FLOW — Strava Segment Collector
+
+Surowe odpowiedzi explore i szczegółów segmentów trafiają do archiwum
+(archiwum.py); --reparse odbudowuje z niego segments i snapshots bez sieci.
+Polyline segmentu zapisywany jest też jako zwarta geometria z bbox
+i wpisem w indeksie R*Tree segments_rtree (przestrzen.py).
+Snapshoty starsze niż SNAPSHOT_DAILY_MONTHS zwijane są po kolekcji do
+tygodni / miesięcy (retencja.py); eksport i raport czytają wszystkie warstwy.
 """
 
 import os
@@ -13,6 +20,10 @@ import argparse
 import requests
 from datetime import datetime, date
 
+import archiwum
+import przestrzen
+import retencja
+
 try:
     from dotenv import load_dotenv
     load_dotenv()
@@ -29,9 +40,15 @@ BBOX = {"min_lat": 49.10, "max_lat": 49.35, "min_lng": 19.60, "max_lng": 20.25}
 GRID_ROWS = 5
 GRID_COLS = 5
 ACTIVITY_TYPES = ["hiking", "running", "walking"]
-TOKEN_URL    = "https://www.strava.com/oauth/token"
-SEGMENTS_URL = "https://www.strava.com/api/v3/segments/explore"
+# Adresy nadpisywalne zmiennymi środowiska (np. bench/mock_serwer.py)
+API_URL      = os.getenv("STRAVA_API_URL",   "https://www.strava.com/api/v3").rstrip("/")
+TOKEN_URL    = os.getenv("STRAVA_TOKEN_URL", "https://www.strava.com/oauth/token")
+SEGMENTS_URL = f"{API_URL}/segments/explore"
 REQUEST_DELAY = 2.0
+TOKEN_MARGIN  = 300   # odśwież token, gdy do wygaśnięcia zostało mniej sekund
+
+# Ostatnie nagłówki limitów Strava - zapisywane w collection_runs przy checkpointach
+rate_state = {}
 
 logging.basicConfig(
     level=getattr(logging, LOG_LEVEL),
@@ -80,21 +97,28 @@ CREATE TABLE IF NOT EXISTS collection_log (
     status       TEXT
 );
 
-CREATE VIEW IF NOT EXISTS traffic AS
-    SELECT
-        s1.segment_id,
-        s1.captured_at                    AS date,
-        s1.effort_count                   AS effort_count_cumulative,
-        s1.effort_count - COALESCE(
-            (SELECT s2.effort_count
-             FROM snapshots s2
-             WHERE s2.segment_id = s1.segment_id
-               AND s2.captured_at < s1.captured_at
-             ORDER BY s2.captured_at DESC
-             LIMIT 1), 0
-        )                                 AS daily_efforts,
-        s1.athlete_count
-    FROM snapshots s1;
+-- Stan bieżącego / ostatniego przebiegu (checkpointy co kafelek i co segment)
+CREATE TABLE IF NOT EXISTS collection_runs (
+    id               INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_date         TEXT NOT NULL,
+    started_at       TEXT,
+    updated_at       TEXT,
+    finished_at      TEXT,
+    stage            INTEGER DEFAULT 1,
+    tiles_done       INTEGER DEFAULT 0,
+    queue_pos        INTEGER DEFAULT 0,
+    last_segment_id  INTEGER,
+    segments_found   INTEGER DEFAULT 0,
+    snapshots_saved  INTEGER DEFAULT 0,
+    errors           INTEGER DEFAULT 0,
+    rate_usage       TEXT,
+    rate_limit       TEXT,
+    rate_reset       INTEGER,
+    token_expires_at INTEGER,
+    status           TEXT
+);
+
+-- Widoki traffic / snapshots_all i warstwy zwinietych snapshotow: retencja.py
 """
 
 
@@ -109,12 +133,16 @@ def init_db():
     log.info(f"Inicjalizacja bazy danych: {DB_PATH}")
     conn = get_db()
     conn.executescript(SCHEMA)
+    archiwum.przygotuj(conn)
+    przestrzen.migruj(conn)
+    retencja.przygotuj(conn)
     conn.commit()
     conn.close()
     log.info("Baza gotowa.")
 
 
 def get_access_token():
+    """Zwraca (access_token, expires_at jako epoch)."""
     log.info("Pobieram access token ze Strava...")
     resp = requests.post(TOKEN_URL, data={
         "client_id":     CLIENT_ID,
@@ -127,7 +155,7 @@ def get_access_token():
     token = data["access_token"]
     expires = datetime.fromtimestamp(data["expires_at"]).strftime("%H:%M:%S")
     log.info(f"Token OK, wygasa o {expires}")
-    return token
+    return token, int(data["expires_at"])
 
 
 def build_tiles(bbox, rows, cols):
@@ -146,6 +174,30 @@ def build_tiles(bbox, rows, cols):
     return tiles
 
 
+def note_rate_limit(resp):
+    for key, header in (("rate_usage", "X-RateLimit-Usage"),
+                        ("rate_limit", "X-RateLimit-Limit"),
+                        ("rate_reset", "X-RateLimit-Reset")):
+        value = resp.headers.get(header)
+        if value:
+            rate_state[key] = value
+
+
+def wait_for_saved_rate_limit(run):
+    """Po wznowieniu: jeśli poprzedni przebieg wyczerpał limit 15-min, czekaj do resetu."""
+    try:
+        usage = int(str(run["rate_usage"]).split(",")[0])
+        limit = int(str(run["rate_limit"]).split(",")[0])
+        reset = int(run["rate_reset"])
+    except (TypeError, ValueError):
+        return
+    wait = reset - int(time.time())
+    if usage >= limit and wait > 0:
+        wait = min(wait + 5, 920)
+        log.warning(f"Limit wyczerpany w poprzednim przebiegu - czekam {wait}s...")
+        time.sleep(wait)
+
+
 def handle_rate_limit(resp):
     """Śpi tylko tyle ile trzeba według nagłówka Strava."""
     reset = resp.headers.get("X-RateLimit-Reset") or resp.headers.get("X-ReadRateLimit-Reset")
@@ -162,12 +214,13 @@ def handle_rate_limit(resp):
     time.sleep(900)
 
 
-def fetch_segments_for_tile(tile, activity_type, token):
+def fetch_segments_for_tile(tile, activity_type, token, archiwizuj=None):
     bounds = f"{tile['min_lat']},{tile['min_lng']},{tile['max_lat']},{tile['max_lng']}"
     params = {"bounds": bounds, "activity_type": activity_type}
     headers = {"Authorization": f"Bearer {token}"}
     try:
         resp = requests.get(SEGMENTS_URL, params=params, headers=headers, timeout=30)
+        note_rate_limit(resp)
         if resp.status_code == 429:
             handle_rate_limit(resp)
             return []
@@ -175,12 +228,27 @@ def fetch_segments_for_tile(tile, activity_type, token):
             log.error("Token wygasl!")
             return []
         resp.raise_for_status()
+        if archiwizuj:
+            archiwizuj(f"explore:{activity_type}:{bounds}", resp)
         return resp.json().get("segments", [])
     except requests.RequestException as e:
         log.error(f"Blad requestu: {e}")
         return []
 
 
+def segment_row(seg, activity_type, today):
+    return (
+        seg["id"], seg.get("name", ""), activity_type,
+        seg.get("start_latlng", [None, None])[0],
+        seg.get("start_latlng", [None, None])[1],
+        seg.get("end_latlng",   [None, None])[0],
+        seg.get("end_latlng",   [None, None])[1],
+        seg.get("climb_category", 0), seg.get("avg_grade", 0),
+        seg.get("elev_difference", 0), seg.get("distance", 0),
+        json.dumps(seg.get("points", "")), today, today,
+    )
+
+
 def upsert_segment(conn, seg, activity_type, today):
     existing = conn.execute("SELECT id FROM segments WHERE id = ?", (seg["id"],)).fetchone()
     if existing:
@@ -192,32 +260,29 @@ def upsert_segment(conn, seg, activity_type, today):
                  end_lat, end_lng, climb_category, avg_grade,
                  elev_difference, distance, polyline, first_seen, last_seen)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            seg["id"], seg.get("name", ""), activity_type,
-            seg.get("start_latlng", [None, None])[0],
-            seg.get("start_latlng", [None, None])[1],
-            seg.get("end_latlng",   [None, None])[0],
-            seg.get("end_latlng",   [None, None])[1],
-            seg.get("climb_category", 0), seg.get("avg_grade", 0),
-            seg.get("elev_difference", 0), seg.get("distance", 0),
-            json.dumps(seg.get("points", "")), today, today,
-        ))
-
-
-def fetch_segment_detail(segment_id, token):
-    url = f"https://www.strava.com/api/v3/segments/{segment_id}"
+        """, segment_row(seg, activity_type, today))
+        przestrzen.zapisz_geometrie(conn, seg["id"], seg.get("points", ""),
+                                    (seg.get("start_latlng"), seg.get("end_latlng")))
+
+
+def fetch_segment_detail(segment_id, token, archiwizuj=None):
+    url = f"{API_URL}/segments/{segment_id}"
     headers = {"Authorization": f"Bearer {token}"}
     try:
         resp = requests.get(url, headers=headers, timeout=30)
+        note_rate_limit(resp)
         if resp.status_code == 429:
             handle_rate_limit(resp)
             # Jeden retry po rate limit
             resp = requests.get(url, headers=headers, timeout=30)
+            note_rate_limit(resp)
             if resp.status_code != 200:
                 return None
         if resp.status_code in (401, 404):
             return None
         resp.raise_for_status()
+        if archiwizuj:
+            archiwizuj(f"segment:{segment_id}", resp)
         return resp.json()
     except requests.RequestException as e:
         log.error(f"Blad segmentu {segment_id}: {e}")
@@ -237,48 +302,128 @@ def save_snapshot(conn, segment_id, effort_count, athlete_count, captured_at):
         return False
 
 
-def collect(token):
-    today      = date.today().isoformat()
-    started_at = datetime.now().isoformat()
-    tiles      = build_tiles(BBOX, GRID_ROWS, GRID_COLS)
-    total_segments = total_snapshots = total_errors = 0
-    seen_ids = set()
-    conn = get_db()
+def start_or_resume_run(conn, today, force_discovery=False):
+    """
+    Przebieg z dzisiejszą datą i statusem 'running' jest wznawiany od checkpointu.
+    Niedokończone przebiegi z innych dni są zamykane ('abandoned'). Jeśli etap 1
+    skończył się już dziś (w dowolnym przebiegu), nowy przebieg zaczyna od etapu 2.
+    """
+    now = datetime.now().isoformat()
+    conn.execute("""
+        UPDATE collection_runs SET status = 'abandoned', updated_at = ?
+        WHERE status = 'running' AND run_date <> ?
+    """, (now, today))
+    run = conn.execute("""
+        SELECT * FROM collection_runs
+        WHERE run_date = ? AND status = 'running'
+        ORDER BY id DESC LIMIT 1
+    """, (today,)).fetchone()
+    if run:
+        run_id = run["id"]
+        log.info(f"Wznawiam przebieg #{run['id']}: etap {run['stage']}, "
+                 f"kafelki {run['tiles_done']}, kolejka {run['queue_pos']}")
+        if force_discovery and run["stage"] > 1:
+            conn.execute("UPDATE collection_runs SET stage = 1, tiles_done = 0 WHERE id = ?", (run["id"],))
+    else:
+        discovered = conn.execute("""
+            SELECT 1 FROM collection_runs WHERE run_date = ? AND stage >= 2 LIMIT 1
+        """, (today,)).fetchone()
+        stage = 2 if discovered and not force_discovery else 1
+        cur = conn.execute("""
+            INSERT INTO collection_runs (run_date, started_at, updated_at, stage, status)
+            VALUES (?, ?, ?, ?, 'running')
+        """, (today, now, now, stage))
+        run_id = cur.lastrowid
+        log.info(f"Nowy przebieg #{run_id}" + (" (etap 1 juz byl dzis - pomijam)" if stage == 2 else ""))
+    conn.commit()
+    return dict(conn.execute("SELECT * FROM collection_runs WHERE id = ?", (run_id,)).fetchone())
+
+
+def checkpoint(conn, run, **fields):
+    """Zapisuje stan przebiegu (bez commit - commit razem z danymi, atomowo)."""
+    run.update(fields)
+    run["updated_at"] = datetime.now().isoformat()
+    for key in ("rate_usage", "rate_limit"):
+        if key in rate_state:
+            run[key] = rate_state[key]
+    if "rate_reset" in rate_state:
+        try:
+            run["rate_reset"] = int(rate_state["rate_reset"])
+        except ValueError:
+            pass
+    cols = [k for k in run if k != "id"]
+    conn.execute(f"UPDATE collection_runs SET {', '.join(c + ' = ?' for c in cols)} WHERE id = ?",
+                 [run[c] for c in cols] + [run["id"]])
+
+
+def collect(token, token_expires_at=None, force_discovery=False):
+    today = date.today().isoformat()
+    tiles = build_tiles(BBOX, GRID_ROWS, GRID_COLS)
+    conn  = get_db()
+    run   = start_or_resume_run(conn, today, force_discovery)
+    wait_for_saved_rate_limit(run)
+
+    def fresh_token():
+        nonlocal token, token_expires_at
+        if token_expires_at and token_expires_at - time.time() < TOKEN_MARGIN:
+            token, token_expires_at = get_access_token()
+            checkpoint(conn, run, token_expires_at=token_expires_at)
+            conn.commit()
+        return token
+
+    def archiwizuj(klucz, resp):
+        archiwum.zapisz(conn, "strava", klucz, today, resp.content, resp.url)
+
+    checkpoint(conn, run, token_expires_at=token_expires_at)
+    conn.commit()
 
-    log.info("Etap 1: zbieranie ID segmentow...")
-    for tile_idx, tile in enumerate(tiles, 1):
-        for activity_type in ACTIVITY_TYPES:
-            segments = fetch_segments_for_tile(tile, activity_type, token)
+    if run["stage"] == 1:
+        log.info("Etap 1: zbieranie ID segmentow...")
+        combos = [(tile, activity_type) for tile in tiles for activity_type in ACTIVITY_TYPES]
+        seen_ids = set()
+        if run["tiles_done"]:
+            log.info(f"  Pomijam {run['tiles_done']}/{len(combos)} przetworzonych kafelkow")
+        for n, (tile, activity_type) in enumerate(combos[run["tiles_done"]:], run["tiles_done"] + 1):
+            segments = fetch_segments_for_tile(tile, activity_type, fresh_token(), archiwizuj)
             for seg in segments:
                 if seg["id"] not in seen_ids:
                     upsert_segment(conn, seg, activity_type, today)
                     seen_ids.add(seg["id"])
+            found = conn.execute("SELECT COUNT(*) FROM segments WHERE last_seen = ?", (today,)).fetchone()[0]
+            checkpoint(conn, run, tiles_done=n, segments_found=found)
             conn.commit()
             time.sleep(REQUEST_DELAY)
-    log.info(f"Znaleziono {len(seen_ids)} unikalnych segmentow")
+        checkpoint(conn, run, stage=2)
+        conn.commit()
+        log.info(f"Znaleziono {run['segments_found']} unikalnych segmentow")
 
     log.info("Etap 2: pobieranie effort_count...")
-    # Pobierz tylko segmenty które NIE mają jeszcze snapshotu z dzisiaj
+    # Pobierz tylko segmenty które NIE mają jeszcze snapshotu z dzisiaj; po wznowieniu
+    # od pozycji za ostatnim przetworzonym (błędne z tego przebiegu nie są ponawiane)
     all_ids = [row[0] for row in conn.execute("""
         SELECT id FROM segments
         WHERE id NOT IN (
             SELECT segment_id FROM snapshots WHERE captured_at = ?
         )
-    """, (today,)).fetchall()]
-    log.info(f"Segmentow do pobrania: {len(all_ids)}")
-
-    for i, seg_id in enumerate(all_ids, 1):
+          AND id > ?
+        ORDER BY id
+    """, (today, run["last_segment_id"] or 0)).fetchall()]
+    total = run["queue_pos"] + len(all_ids)
+    log.info(f"Segmentow do pobrania: {len(all_ids)}" +
+             (f" (wznowienie od pozycji {run['queue_pos']})" if run["queue_pos"] else ""))
+
+    for i, seg_id in enumerate(all_ids, run["queue_pos"] + 1):
         if i % 50 == 0:
-            log.info(f"  Postep: {i}/{len(all_ids)}...")
-        detail = fetch_segment_detail(seg_id, token)
+            log.info(f"  Postep: {i}/{total}...")
+        detail = fetch_segment_detail(seg_id, fresh_token(), archiwizuj)
         if detail is None:
-            total_errors += 1
+            checkpoint(conn, run, queue_pos=i, last_segment_id=seg_id, errors=run["errors"] + 1)
+            conn.commit()
             continue
         saved = save_snapshot(conn, seg_id, detail.get("effort_count", 0),
                               detail.get("athlete_count", 0), today)
-        if saved:
-            total_snapshots += 1
-        total_segments += 1
+        checkpoint(conn, run, queue_pos=i, last_segment_id=seg_id,
+                   snapshots_saved=run["snapshots_saved"] + (1 if saved else 0))
         conn.commit()
         time.sleep(REQUEST_DELAY)
 
@@ -288,28 +433,92 @@ def collect(token):
             (started_at, finished_at, tiles_queried, segments_found,
              snapshots_saved, errors, status)
         VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (started_at, finished_at, len(tiles) * len(ACTIVITY_TYPES),
-          total_segments, total_snapshots, total_errors, "OK"))
+    """, (run["started_at"], finished_at, run["tiles_done"],
+          run["queue_pos"] - run["errors"], run["snapshots_saved"], run["errors"], "OK"))
+    checkpoint(conn, run, stage=3, finished_at=finished_at, status="OK")
     conn.commit()
+    retencja.zwin(conn, today)
+    conn.close()
+    log.info(f"=== Kolekcja zakonczona: {run['queue_pos'] - run['errors']} segm, "
+             f"{run['snapshots_saved']} snap, {run['errors']} err ===")
+
+
+def reparse():
+    """
+    Odbudowuje segments i snapshots z archiwum surowych odpowiedzi (bez sieci).
+    Segmenty: dane z pierwszej odpowiedzi explore (jak przy kolekcji),
+    first_seen/last_seen jako min/max z istniejącymi. Snapshoty z archiwum
+    nadpisują te z tego samego dnia.
+    """
+    conn = get_db()
+    segment_rows, snapshot_rows = {}, []
+    for key, day, body in archiwum.odpowiedzi(conn, "strava"):
+        kind, _, rest = key.partition(":")
+        data = json.loads(body)
+        if kind == "explore":
+            activity_type = rest.split(":")[0]
+            for seg in data.get("segments", []):
+                row = segment_rows.get(seg["id"])
+                segment_rows[seg["id"]] = (row[:13] + (day,) if row
+                                           else segment_row(seg, activity_type, day))
+        elif kind == "segment":
+            snapshot_rows.append((int(rest), day, data.get("effort_count", 0), data.get("athlete_count", 0)))
+    with conn:
+        conn.executemany("""
+            INSERT INTO segments
+                (id, name, activity_type, start_lat, start_lng,
+                 end_lat, end_lng, climb_category, avg_grade,
+                 elev_difference, distance, polyline, first_seen, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                name = excluded.name, activity_type = excluded.activity_type,
+                start_lat = excluded.start_lat, start_lng = excluded.start_lng,
+                end_lat = excluded.end_lat, end_lng = excluded.end_lng,
+                climb_category = excluded.climb_category, avg_grade = excluded.avg_grade,
+                elev_difference = excluded.elev_difference, distance = excluded.distance,
+                polyline = excluded.polyline,
+                first_seen = MIN(COALESCE(first_seen, excluded.first_seen), excluded.first_seen),
+                last_seen  = MAX(COALESCE(last_seen, excluded.last_seen), excluded.last_seen)
+        """, list(segment_rows.values()))
+        for row in segment_rows.values():
+            przestrzen.zapisz_geometrie(conn, row[0], przestrzen.polyline_z_kolumny(row[11]),
+                                        (row[3:5], row[5:7]))
+        conn.executemany("""
+            INSERT INTO snapshots (segment_id, captured_at, effort_count, athlete_count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(segment_id, captured_at) DO UPDATE SET
+                effort_count = excluded.effort_count, athlete_count = excluded.athlete_count
+        """, snapshot_rows)
+    conn.close()
+    log.info(f"Reparse: {len(segment_rows)} segmentow, {len(snapshot_rows)} snapshotow z archiwum")
+
+
+def rollup():
+    conn = get_db()
+    retencja.zwin(conn)
     conn.close()
-    log.info(f"=== Kolekcja zakonczona: {total_segments} segm, {total_snapshots} snap, {total_errors} err ===")
 
 
 def report():
     conn = get_db()
     total_segments  = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+    retencja.przygotuj(conn)
     total_snapshots = conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
-    date_range      = conn.execute("SELECT MIN(captured_at), MAX(captured_at) FROM snapshots").fetchone()
+    rolled          = [conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                       for t in ("snapshots_weekly", "snapshots_monthly")]
+    date_range      = conn.execute("SELECT MIN(captured_at), MAX(captured_at) FROM snapshots_all").fetchone()
     print(f"\n{'='*50}")
     print(f"  TATRY FLOW — Raport")
     print(f"{'='*50}")
     print(f"  Segmentow:  {total_segments}")
-    print(f"  Snapshotow: {total_snapshots}")
+    print(f"  Snapshotow: {total_snapshots} (+ {rolled[0]} tyg., {rolled[1]} mies.)")
     print(f"  Daty:       {date_range[0]} -> {date_range[1]}")
     top = conn.execute("""
         SELECT s.name, s.activity_type, sn.effort_count, sn.captured_at
-        FROM segments s JOIN snapshots sn ON s.id = sn.segment_id
-        WHERE sn.captured_at = (SELECT MAX(captured_at) FROM snapshots WHERE segment_id = s.id)
+        FROM segments s JOIN (
+            SELECT segment_id, effort_count, MAX(captured_at) AS captured_at
+            FROM snapshots_all GROUP BY segment_id
+        ) sn ON s.id = sn.segment_id
         ORDER BY sn.effort_count DESC LIMIT 10
     """).fetchall()
     print(f"\n  TOP 10:")
@@ -320,6 +529,7 @@ def report():
 
 def export_traffic_json(output_path="traffic_data.json"):
     conn = get_db()
+    retencja.przygotuj(conn)
 
     segments_meta = {}
     for row in conn.execute("""
@@ -327,10 +537,11 @@ def export_traffic_json(output_path="traffic_data.json"):
                s.distance, s.avg_grade, s.elev_difference,
                sn.effort_count, sn.athlete_count, sn.captured_at
         FROM segments s
-        JOIN snapshots sn ON s.id = sn.segment_id
-        WHERE sn.captured_at = (
-            SELECT MAX(captured_at) FROM snapshots WHERE segment_id = s.id
-        )
+        JOIN (
+            -- SQLite: kolumny obok MAX() pochodzą z wiersza z maksimum
+            SELECT segment_id, effort_count, athlete_count, MAX(captured_at) AS captured_at
+            FROM snapshots_all GROUP BY segment_id
+        ) sn ON s.id = sn.segment_id
     """):
         segments_meta[row["id"]] = {
             "name":                    row["name"],
@@ -347,7 +558,7 @@ def export_traffic_json(output_path="traffic_data.json"):
 
     rows = conn.execute("""
         SELECT segment_id, captured_at, effort_count
-        FROM snapshots
+        FROM snapshots_all
         ORDER BY segment_id, captured_at
     """).fetchall()
 
@@ -372,6 +583,12 @@ def main():
     parser.add_argument("--init",   action="store_true")
     parser.add_argument("--report", action="store_true")
     parser.add_argument("--export", action="store_true")
+    parser.add_argument("--force-discovery", action="store_true",
+                        help="Etap 1 nawet jesli odkrywanie segmentow juz dzis bylo")
+    parser.add_argument("--reparse", action="store_true",
+                        help="Odbuduj segments/snapshots z archiwum surowych odpowiedzi")
+    parser.add_argument("--rollup", action="store_true",
+                        help="Zwin snapshoty starsze niz SNAPSHOT_DAILY_MONTHS (retencja)")
     args = parser.parse_args()
 
     if args.init:
@@ -380,11 +597,15 @@ def main():
         report(); return
     if args.export:
         export_traffic_json(); return
+    if args.reparse:
+        init_db(); reparse(); rollup(); export_traffic_json(); return
+    if args.rollup:
+        init_db(); rollup(); return
 
     init_db()
     try:
-        token = get_access_token()
-        collect(token)
+        token, expires_at = get_access_token()
+        collect(token, expires_at, args.force_discovery)
     except KeyboardInterrupt:
         log.info("Przerwano.")
     except Exception as e:
@@ -1,66 +1,37 @@
-import requests
 import folium
 import folium.plugins
+import os
+import base64
 import time
 import math
 import json
+from bisect import bisect_right
+from collections import defaultdict
+import numpy as np
 from shapely.geometry import Point, LineString, MultiLineString, mapping
 from shapely.ops import unary_union, linemerge, polygonize
+from overpass import DaneOsm, pobierz_dane
+from geometria import dlugosci_wayow, douglas_peucker, tolerancja_m
+from graf import GrafSzlakow
+from kafelki import generuj_kafelki
+from popupy import TabelaPopupow
+from profil import RaportBudowy
+import przestrzen
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
 
-def uprość_geometrie(punkty, co_n=2):
-    return punkty[::co_n]
-
-def pobierz_dane(query, opis):
-    serwery = [
-        "https://overpass-api.de/api/interpreter",
-        "https://overpass.kumi.systems/api/interpreter",
-        "https://maps.mail.ru/osm/tools/overpass/api/interpreter",
-        "https://overpass.openstreetmap.ru/api/interpreter",
-    ]
-    for serwer in serwery:
-        try:
-            print(f"Pobieram: {opis} ({serwer})...")
-            response = requests.post(serwer, data=query, timeout=180)
-            if response.status_code == 200 and response.text.strip():
-                print(f"  OK!")
-                return response.json()
-            else:
-                print(f"  Błąd HTTP {response.status_code}, próbuję kolejny serwer...")
-        except requests.exceptions.SSLError as e:
-            print(f"  SSL error: {e} — próbuję kolejny serwer...")
-        except requests.exceptions.Timeout:
-            print(f"  Timeout — próbuję kolejny serwer...")
-        except requests.exceptions.ConnectionError as e:
-            print(f"  Błąd połączenia: {e} — próbuję kolejny serwer...")
-        except requests.exceptions.JSONDecodeError:
-            print(f"  Błąd parsowania JSON — próbuję kolejny serwer...")
-        except Exception as e:
-            print(f"  Nieoczekiwany błąd: {e} — próbuję kolejny serwer...")
-    print(f"  Wszystkie serwery zawiodły dla: {opis}")
-    return {"elements": []}
-
-def oblicz_dlugosc(punkty):
-    dlugosc = 0
-    for i in range(len(punkty) - 1):
-        lat1, lon1 = punkty[i]
-        lat2, lon2 = punkty[i+1]
-        dlat = (lat2 - lat1) * 111
-        dlon = (lon2 - lon1) * 111 * math.cos(math.radians((lat1 + lat2) / 2))
-        dlugosc += math.sqrt(dlat**2 + dlon**2)
-    return round(dlugosc, 2)
+def uprość_geometrie(punkty, zoom=14):
+    """Douglas-Peucker z tolerancją pół piksela na danym zoomie; końce waya zostają."""
+    return douglas_peucker(punkty, tolerancja_m(zoom))
 
 def zbuduj_poligon(data):
     """Zbiera linie ze WSZYSTKICH relacji w odpowiedzi i buduje jeden unary_union poligon."""
     wszystkie_linie = []
-    for element in data["elements"]:
-        if element["type"] == "relation" and "members" in element:
-            for member in element["members"]:
-                if member["type"] == "way" and "geometry" in member:
-                    punkty = [(p["lon"], p["lat"]) for p in member["geometry"]]
-                    if len(punkty) >= 2:
-                        wszystkie_linie.append(LineString(punkty))
+    for _, way_refs in data.relacje.values():
+        for wid in way_refs:
+            punkty = data.punkty(wid)
+            if len(punkty) >= 2:
+                wszystkie_linie.append(LineString(punkty[:, ::-1]))
 
     if not wszystkie_linie:
         print("  Brak linii do zbudowania poligonu")
@@ -86,17 +57,17 @@ obszar_parki = None  # inicjalizowany poniżej
 def procent_w_parku(punkty_latlon):
     """
     Zwraca jaki procent długości waya leży wewnątrz obszaru parków.
-    Punkty w formacie [(lat, lon), ...]
+    Punkty jako tablica (k, 2) [lat, lon] z magazynu geometrii.
     Używa Shapely intersection() — precyzyjne cięcie linii poligonem.
     """
-    if not punkty_latlon or len(punkty_latlon) < 2:
+    if len(punkty_latlon) < 2:
         return 0.0
     if obszar_parki is None:
         return 100.0  # brak danych o parkach — przepuść wszystko
 
     try:
         # Shapely używa (lon, lat)
-        line = LineString([(lon, lat) for lat, lon in punkty_latlon])
+        line = LineString(punkty_latlon[:, ::-1])
         total_len = line.length
         if total_len == 0:
             return 0.0
@@ -214,27 +185,32 @@ def znajdz_najblizszy_segment_punkt(lat, lon, segmenty, promien_km=0.55):
             najblizszy  = seg
     return najblizszy if min_dystans <= promien_km else None
 
-def znajdz_segment_dla_way(punkty, segmenty):
-    if not punkty or not segmenty:
-        return None
-    n = len(punkty)
+def indeksy_probek(n):
     indeksy = set([0, n//4, n//2, 3*n//4, n-1])
     indeksy |= set(range(0, n, max(1, n//8)))
-    trafienia = []
-    for i in indeksy:
-        lat, lon = punkty[i]
-        seg = znajdz_najblizszy_segment_punkt(lat, lon, segmenty)
+    return indeksy
+
+def dopasuj_segmenty_wayom(indeks, punkty_wayow, segmenty, promien_km=0.55):
+    """
+    Segment Strava dla każdego waya: punkty próbek (indeksy_probek) wszystkich
+    wayów idą w jednym złączeniu z R*Tree (przestrzen.py), które daje kandydatów
+    w promieniu; dla każdej próbki najbliższy kandydat (znajdz_najblizszy_segment_punkt),
+    a wayowi przypada trafiony segment z największym effort_count. {way_id: segment}.
+    """
+    kolejnosc = {s["id"]: i for i, s in enumerate(segmenty)}
+    probki    = [(way_id, punkty[i]) for way_id, punkty in punkty_wayow.items()
+                 if len(punkty) for i in indeksy_probek(len(punkty))]
+    kandydaci = przestrzen.kandydaci_dla_punktow(indeks, [pt for _, pt in probki], promien_km)
+    trafienia = defaultdict(list)
+    for (way_id, (lat, lon)), ids in zip(probki, kandydaci):
+        # Kandydaci w kolejności listy segmentów - remisy jak przy pełnym skanie
+        lista = [segmenty[k] for k in sorted(kolejnosc[i] for i in ids if i in kolejnosc)]
+        seg = znajdz_najblizszy_segment_punkt(lat, lon, lista, promien_km)
         if seg:
-            trafienia.append(seg)
-    if not trafienia:
-        return None
-    return max(trafienia, key=lambda s: s["effort_count"])
+            trafienia[way_id].append(seg)
+    return {way_id: max(t, key=lambda s: s["effort_count"]) for way_id, t in trafienia.items()}
 
-def effort_do_koloru(effort, max_effort):
-    if max_effort <= 0 or effort <= 0:
-        return None
-    t = math.log(1 + effort) / math.log(1 + max_effort)
-    t = min(1.0, max(0.0, t))
+def _kolor_rampy(t):
     if t < 0.25:
         tt = t / 0.25
         r = int(20  + tt * 40);  g = int(60  + tt * 80);  b = int(180 + tt * 40)
@@ -249,11 +225,34 @@ def effort_do_koloru(effort, max_effort):
         r  = int(250 - tt * 20); g = int(100 - tt * 100); b = 0
     return f"#{r:02x}{g:02x}{b:02x}"
 
+# Paleta 256 kolorów rampy (niebieski → czerwony), liczona raz; strona dostaje ją w TD
+N_KOLOROW = 256
+PALETA    = [_kolor_rampy(i / (N_KOLOROW - 1)) for i in range(N_KOLOROW)]
+
+def progi_effortu(max_effort):
+    """
+    Progi kubełków palety w skali log(1 + effort) / log(1 + max_effort):
+    effort >= progi[k - 1]  <=>  kubełek >= k. Pusta lista gdy brak ruchu.
+    """
+    if max_effort <= 0:
+        return []
+    log_max = math.log(1 + max_effort)
+    return [math.exp((k - 0.5) / (N_KOLOROW - 1) * log_max) - 1 for k in range(1, N_KOLOROW)]
+
+def effort_do_koloru(effort, progi):
+    if not progi or effort <= 0:
+        return None
+    return PALETA[bisect_right(progi, effort)]
+
 # ── Stałe ──────────────────────────────────────────────────────────────────────
 
 BBOX = "(49.10, 19.60, 49.35, 20.25)"
+DB_PATH = os.environ.get("DB_PATH", "tatry_segments.db")
 STALA_GRUBOSC = 3
 PROG_W_PARKU = 90.0  # % długości waya który musi leżeć w parku
+# Szlaki jako kafelki GeoJSON ładowane wg widoku; KAFELKI=0 = wszystko inline (np. podgląd z file://)
+KAFELKI          = os.environ.get("KAFELKI", "1") != "0"
+KATALOG_KAFELKOW = "kafelki"
 
 STYL = {
     "path":        {"color": "#888888", "weight": 2, "grupa": "Szlaki górskie"},
@@ -314,32 +313,32 @@ out geom;
 
 # ── Pobieranie danych ──────────────────────────────────────────────────────────
 
-dane1      = pobierz_dane(query1,      "relacje hiking (oznakowane)")
+raport = RaportBudowy()
+raport.etap("overpass")
+
+# Oba zapytania hiking trafiają do jednego zbioru (duplikaty pomijane),
+# parki osobno - każdy park to osobny poligon.
+osm        = DaneOsm()
+relacje1   = pobierz_dane(query1,      "relacje hiking (oznakowane)", osm)
 time.sleep(5)
-dane2      = pobierz_dane(query2,      "wszystkie relacje hiking")
+relacje2   = pobierz_dane(query2,      "wszystkie relacje hiking",    osm)
 time.sleep(5)
-tpn_data   = pobierz_dane(query_tpn,   "granice TPN")
+tpn_data   = DaneOsm()
+pobierz_dane(query_tpn,   "granice TPN",   tpn_data)
 time.sleep(5)
-tanap_data = pobierz_dane(query_tanap, "granice TANAP")
-
-elementy_all = {}
-for el in dane1["elements"] + dane2["elements"]:
-    eid = (el['type'], el.get('id'))
-    if eid not in elementy_all:
-        elementy_all[eid] = el
-wszystkie = list(elementy_all.values())
+tanap_data = DaneOsm()
+pobierz_dane(query_tanap, "granice TANAP", tanap_data)
 
 way_ids_w_relacjach = set()
-for el in wszystkie:
-    if el['type'] == 'relation' and 'members' in el:
-        for m in el['members']:
-            if m['type'] == 'way':
-                way_ids_w_relacjach.add(m['ref'])
+for _, way_refs in osm.relacje.values():
+    way_ids_w_relacjach.update(way_refs)
 
-print(f"Łącznie: {len(wszystkie)} elementów | Wayów w relacjach: {len(way_ids_w_relacjach)}")
+print(f"Łącznie: {len(osm.tagi_wayow)} wayów, {len(osm.relacje)} relacji | Wayów w relacjach: {len(way_ids_w_relacjach)}")
 
 # ── Poligony parków ────────────────────────────────────────────────────────────
 
+raport.etap("poligony")
+
 obszar_tpn   = zbuduj_poligon(tpn_data)
 obszar_tanap = zbuduj_poligon(tanap_data)
 
@@ -363,51 +362,40 @@ if obszar_parki:
 
 # ── Strava ─────────────────────────────────────────────────────────────────────
 
+raport.etap("dane_i_relacje")
 strava_segmenty = wczytaj_strava("traffic_data.json")
 max_effort      = max((s["effort_count"] for s in strava_segmenty), default=1)
 strava_dostepna = len(strava_segmenty) > 0
 print(f"Max effort_count: {max_effort}")
+progi_mapy      = progi_effortu(max_effort)
 pogoda_dane     = wczytaj_pogode("weather_data.json")
 lawiny_dane     = wczytaj_lawiny("avalanche_data.json")
 
 # ── Geometria wayów ────────────────────────────────────────────────────────────
 
-way_geometry = {}
-for element in wszystkie:
-    if element['type'] == 'way' and 'geometry' in element:
-        wid = element['id']
-        if wid not in way_geometry:
-            way_geometry[wid] = [(p['lat'], p['lon']) for p in element['geometry']]
-
-for element in dane2["elements"]:
-    if element['type'] == 'relation' and 'members' in element:
-        for member in element['members']:
-            if member['type'] == 'way' and 'geometry' in member:
-                wid = member['ref']
-                if wid not in way_geometry:
-                    way_geometry[wid] = [(p['lat'], p['lon']) for p in member['geometry']]
+# Jeden magazyn (ciągła tablica float64 + offsety) - wszystkie etapy niżej
+# dostają widoki way_geometry.punkty(wid) zamiast list krotek.
+way_geometry = osm.geometria
 
 print(f"Zebrano geometrię dla {len(way_geometry)} wayów")
 
+# Długość każdego waya liczona raz (wektorowo) - relacje sumują wartości z cache,
+# waye wspólne dla kilku relacji nie są mierzone ponownie.
+dlugosc_way = dlugosci_wayow(way_geometry)
+
 # ── Relacje ────────────────────────────────────────────────────────────────────
 
 relacje_dla_way  = {}
 relacja_do_wayow = {}
 
-for element in dane2["elements"]:
-    if element['type'] != 'relation' or 'members' not in element:
-        continue
-    nazwa_rel  = sanitize(element.get('tags', {}).get('name', 'Brak nazwy'))
-    relacja_id = element['id']
+for relacja_id in relacje2:
+    tags_rel, way_refs = osm.relacje[relacja_id]
+    nazwa_rel  = sanitize(tags_rel.get('name', 'Brak nazwy'))
     total   = 0
     way_ids = []
-    for member in element['members']:
-        if member['type'] == 'way':
-            wid = member['ref']
-            way_ids.append(wid)
-            pts = way_geometry.get(wid, [])
-            if pts:
-                total += oblicz_dlugosc(pts)
+    for wid in way_refs:
+        way_ids.append(wid)
+        total += dlugosc_way.get(wid, 0)
     dlugosc_rel = round(total, 2)
     relacja_do_wayow[relacja_id] = way_ids
     for wid in way_ids:
@@ -417,81 +405,57 @@ for element in dane2["elements"]:
 print(f"Relacji: {len(relacja_do_wayow)} | Wayów z relacją: {len(relacje_dla_way)}")
 
 # ── Filtr: >= 90% długości waya musi leżeć w parku ────────────────────────────
+raport.etap("filtr_parku")
 print(f"Filtrowanie wayów (próg: {PROG_W_PARKU}% w parku)...")
 ways_w_parku = set()
 if obszar_parki is not None:
-    for way_id, pts_raw in way_geometry.items():
-        pct = procent_w_parku(pts_raw)
+    for way_id in way_geometry:
+        pct = procent_w_parku(way_geometry.punkty(way_id))
         if pct >= PROG_W_PARKU:
             ways_w_parku.add(way_id)
     print(f"Wayów spełniających próg {PROG_W_PARKU}%: {len(ways_w_parku)}")
 else:
-    ways_w_parku = set(way_geometry.keys())
+    ways_w_parku = set(way_geometry)
     print("Brak poligonów parków — pokazuję wszystkie waye")
 
-# ── Filtr topologiczny: usuń izolowane waye (min. 2 sąsiadów w sieci) ─────────
-# Buduje graf połączeń: waye dzielące węzeł (punkt końcowy) są sąsiadami.
-# Waye z 0 sąsiadów w ways_w_parku to odcięte "kikuty" — usuwamy je.
-# Powtarzamy w pętli aż sieć się ustabilizuje (cascade removal).
+# ── Filtr topologiczny: usuń izolowane waye ───────────────────────────────────
+raport.etap("filtr_topologiczny")
+# Graf połączeń: waye dzielące węzeł (punkt końcowy) są sąsiadami.
+# Waye z 0 sąsiadów w ways_w_parku to odcięte "kikuty" — usuwamy je
+# (graf.py: obieranie z kolejką, kaskadowo aż sieć się ustabilizuje).
+# graf_szlakow zostaje po filtrze do dalszej analizy sieci.
+graf_szlakow = GrafSzlakow.z_magazynu(way_geometry, ways_w_parku)
 if ways_w_parku:
     print("Filtr topologiczny — usuwanie izolowanych fragmentów...")
-
-    # Indeks: punkt (zaokrąglony) → zbiór way_id które przez niego przechodzą
-    punkt_do_wayow = {}
-    for wid in ways_w_parku:
-        pts = way_geometry.get(wid, [])
-        if not pts:
-            continue
-        # Rejestruj tylko punkty końcowe (węzły sieci)
-        for pt in [pts[0], pts[-1]]:
-            key = (round(pt[0], 5), round(pt[1], 5))
-            punkt_do_wayow.setdefault(key, set()).add(wid)
-
-    def sasiedzi(wid):
-        """Zwraca zbiór wayów sąsiadujących z wid przez węzły końcowe."""
-        pts = way_geometry.get(wid, [])
-        if not pts:
-            return set()
-        s = set()
-        for pt in [pts[0], pts[-1]]:
-            key = (round(pt[0], 5), round(pt[1], 5))
-            s |= punkt_do_wayow.get(key, set())
-        s.discard(wid)
-        return s & ways_w_parku
-
-    iteracja = 0
-    while True:
-        iteracja += 1
-        do_usuniecia = set()
-        for wid in ways_w_parku:
-            if len(sasiedzi(wid)) == 0:
-                do_usuniecia.add(wid)
-        if not do_usuniecia:
-            break
-        # Usuń z indeksu punkt→way
-        for wid in do_usuniecia:
-            pts = way_geometry.get(wid, [])
-            for pt in ([pts[0], pts[-1]] if pts else []):
-                key = (round(pt[0], 5), round(pt[1], 5))
-                punkt_do_wayow.get(key, set()).discard(wid)
-        ways_w_parku -= do_usuniecia
-        print(f"  Iteracja {iteracja}: usunięto {len(do_usuniecia)} izolowanych wayów, pozostało {len(ways_w_parku)}")
-
+    usuniete = graf_szlakow.przytnij(min_sasiadow=1)
+    ways_w_parku = set(graf_szlakow.krawedzie)
+    print(f"  Usunięto {len(usuniete)} izolowanych wayów, węzłów w sieci: {len(graf_szlakow.wezly)}")
     print(f"Po filtrze topologicznym: {len(ways_w_parku)} wayów")
 
 # ── Spatial join + propagacja (tylko waye w parku) ────────────────────────────
+raport.etap("spatial_join")
 
 kolory_wayow   = {}
 kolory_relacji = {}
 
 if strava_dostepna:
     print("Przebieg 1: spatial join...")
+    # Indeks R*Tree segmentów z bazy (albo w pamięci z traffic_data.json) i bboxy
+    # wayów - waye bez żadnego segmentu w pobliżu odpadają przed próbkowaniem
+    indeks = przestrzen.otworz_indeks(DB_PATH, strava_segmenty)
+    przestrzen.zapisz_bbox_wayow(indeks, way_geometry)
+    indeks.commit()
+    przy_segmentach = przestrzen.waye_przy_segmentach(indeks)
+    # Próbki z pełnej geometrii - po Douglas-Peucker prosty way to same końce
+    # i starty segmentów w jego środku nie byłyby trafiane (DP tylko do rysowania)
+    dopasowanie = dopasuj_segmenty_wayom(
+        indeks,
+        {way_id: way_geometry.punkty(way_id)
+         for way_id in ways_w_parku if way_id in przy_segmentach},
+        strava_segmenty)
+    indeks.close()
     for way_id in ways_w_parku:
-        pts_raw = way_geometry.get(way_id, [])
-        if not pts_raw:
-            continue
-        pts_skr = uprość_geometrie(pts_raw)
-        seg = znajdz_segment_dla_way(pts_skr, strava_segmenty)
+        seg = dopasowanie.get(way_id)
         if not seg:
             continue
         kolory_wayow[way_id] = seg
@@ -525,8 +489,28 @@ if strava_dostepna:
             propagowane_ff += 1
     print(f"Flood fill relacji: +{propagowane_ff} | Łącznie: {len(kolory_wayow)}")
 
+# ── Graf sieci: długość + ruch Strava na krawędziach ─────────────────────────
+# Zapisywany do graf_szlakow.json — analizy sieci (obciążenie węzłów,
+# najkrótsze ścieżki) wczytują go bez ponownego przetwarzania OSM.
+
+for way_id in graf_szlakow.krawedzie:
+    seg = kolory_wayow.get(way_id)
+    if seg is None and way_id in relacje_dla_way:
+        seg = kolory_relacji.get(relacje_dla_way[way_id][2])
+    graf_szlakow.ustaw_krawedz(way_id, dlugosc_way.get(way_id, 0),
+                               seg["effort_count"] if seg else 0,
+                               seg["id"] if seg else None)
+graf_szlakow.relacje = {
+    relacja_id: [w for w in way_ids if w in graf_szlakow.krawedzie]
+    for relacja_id, way_ids in relacja_do_wayow.items()
+}
+graf_szlakow.zapisz("graf_szlakow.json")
+print(f"Graf sieci: {len(graf_szlakow.krawedzie)} krawędzi, zapisano graf_szlakow.json")
+
 # ── Mapa ───────────────────────────────────────────────────────────────────────
 
+raport.etap("render")
+
 mapa = folium.Map(
     location=[49.23, 19.98],
     zoom_start=11,
@@ -551,15 +535,12 @@ grupy = {
 # ── Rysowanie ──────────────────────────────────────────────────────────────────
 
 print("Przebieg 2: rysowanie...")
-popupy_relacji = {}
+popupy_relacji = TabelaPopupow()
 kolory_bazowe  = {}
 odfiltrowane   = 0
+obiekty_kafelkow = []   # (punkty, właściwości) gdy KAFELKI
 
-for element in wszystkie:
-    if element['type'] != 'way' or 'geometry' not in element:
-        continue
-
-    way_id = element.get('id')
+for way_id, tags in osm.tagi_wayow.items():
     if way_id not in way_ids_w_relacjach:
         continue
 
@@ -568,10 +549,10 @@ for element in wszystkie:
         odfiltrowane += 1
         continue
 
-    highway   = element.get('tags', {}).get('highway', '')
+    element   = {'tags': tags}
+    highway   = tags.get('highway', '')
     styl      = STYL.get(highway, {"color": "#888888", "weight": 2, "grupa": "Szlaki górskie"})
-    pts_pelne = [(p['lat'], p['lon']) for p in element['geometry']]
-    punkty    = uprość_geometrie(pts_pelne)
+    pts_pelne = way_geometry.punkty(way_id)
 
     kolor_oryginalny = kolor_szlaku(element)
     typ_nazwa        = nazwa_koloru(element)
@@ -579,11 +560,11 @@ for element in wszystkie:
     if way_id in relacje_dla_way:
         nazwa_rel, dlugosc_total, relacja_id = relacje_dla_way[way_id]
         nazwa        = sanitize(nazwa_rel)
-        info_dlugosc = f"Długość całkowita: {dlugosc_total} km"
+        dlugosc_km   = dlugosc_total
         klasa_css    = f"trasa-{relacja_id}"
     else:
         nazwa        = sanitize(element.get('tags', {}).get('name', 'Brak nazwy'))
-        info_dlugosc = f"Długość odcinka: {oblicz_dlugosc(punkty)} km"
+        dlugosc_km   = dlugosc_way.get(way_id, 0)
         klasa_css    = f"trasa-way-{way_id}"
         relacja_id   = None
 
@@ -598,38 +579,59 @@ for element in wszystkie:
     weight_finalny = styl["weight"]
 
     if seg:
-        kolor_heat = effort_do_koloru(seg["effort_count"], max_effort)
+        kolor_heat = effort_do_koloru(seg["effort_count"], progi_mapy)
         if kolor_heat:
             kolor_finalny  = kolor_heat
             weight_finalny = STALA_GRUBOSC
 
+    if klasa_css not in popupy_relacji:
+        mid = pts_pelne[len(pts_pelne)//2]
+        wiersz = popupy_relacji.dodaj(
+            klasa_css,
+            nazwa    = nazwa,
+            typ      = typ_nazwa,
+            km       = dlugosc_km,
+            calosc   = 1 if relacja_id is not None else 0,
+            effort   = seg["effort_count"]   if seg else 0,
+            atleci   = seg["athlete_count"]  if seg else 0,
+            seg_name = sanitize(seg["name"]) if seg else "",
+            snapshot = seg["last_snapshot"]  if seg else "",
+            lat      = round(float(mid[0]), 5),
+            lon      = round(float(mid[1]), 5),
+        )
+    else:
+        wiersz = popupy_relacji.wiersze[klasa_css]
+
+    if KAFELKI:
+        obiekty_kafelkow.append((pts_pelne, {
+            "k": klasa_css, "p": wiersz, "g": styl["grupa"], "h": kolor_finalny,
+            "w": weight_finalny, "e": seg["effort_count"] if seg else 0, "way": way_id,
+        }))
+        continue
+
     linia = folium.PolyLine(
-        punkty,
+        uprość_geometrie(pts_pelne).tolist(),  # folium potrzebuje list
         color=kolor_finalny,
         weight=weight_finalny,
         opacity=0.8,
         tooltip=sanitize(nazwa),
     )
-    linia.options['className'] = klasa_css
-
-    if klasa_css not in popupy_relacji:
-        mid = punkty[len(punkty)//2]
-        popupy_relacji[klasa_css] = {
-            "nazwa":    nazwa,
-            "typ":      typ_nazwa,
-            "dlugosc":  info_dlugosc,
-            "effort":   seg["effort_count"]   if seg else 0,
-            "atleci":   seg["athlete_count"]  if seg else 0,
-            "seg_name": sanitize(seg["name"]) if seg else "",
-            "snapshot": seg["last_snapshot"]  if seg else "",
-            "lat":      mid[0],
-            "lon":      mid[1],
-        }
-
+    linia.options['className'] = f"{klasa_css} pp-{wiersz}"
     grupy[styl["grupa"]].add_child(linia)
 
 print(f"Odfiltrowano: {odfiltrowane} | Narysowano mapę")
 
+kafelki_info = None
+if KAFELKI:
+    indeks = generuj_kafelki(obiekty_kafelkow, KATALOG_KAFELKOW)
+    kafelki_info = {
+        "url":    KATALOG_KAFELKOW,
+        "zmin":   indeks["zmin"],
+        "zmax":   indeks["zmax"],
+        "indeks": indeks["kafelki"],
+        "grupy":  {nazwa_grupy: g.get_name() for nazwa_grupy, g in grupy.items()},
+    }
+
 for grupa in grupy.values():
     grupa.add_to(mapa)
 
@@ -669,12 +671,11 @@ if obszar_tanap:
         interactive=False
     ).add_to(grupy["Granice TANAP"])
 else:
-    for element in tanap_data["elements"]:
-        if element["type"] == "relation" and "members" in element:
-            for member in element["members"]:
-                if member["type"] == "way" and "geometry" in member:
-                    pts = [(p["lat"], p["lon"]) for p in member["geometry"]]
-                    folium.PolyLine(pts, color="#1a6b1a", weight=3, opacity=1.0).add_to(grupy["Granice TANAP"])
+    for _, way_refs in tanap_data.relacje.values():
+        for wid in way_refs:
+            pts = tanap_data.punkty(wid)
+            if len(pts):
+                folium.PolyLine(pts.tolist(), color="#1a6b1a", weight=3, opacity=1.0).add_to(grupy["Granice TANAP"])
 grupy["Granice TANAP"].add_to(mapa)
 
 # ── Waymarked Trails ───────────────────────────────────────────────────────────
@@ -725,6 +726,23 @@ if strava_dostepna:
 wszystkie_daty_raw = sorted(set(d for v in relacja_serie.values() for d in v["dates"]))
 wszystkie_daty = wszystkie_daty_raw[1:] if len(wszystkie_daty_raw) > 1 else wszystkie_daty_raw
 
+# Wspólna oś dat + macierz relacja × dzień (Uint32, little-endian, base64).
+# Pierwsza surowa data odpada z osi - delta pierwszego dnia każdej serii i tak jest 0.
+kolumna_daty = {d: i for i, d in enumerate(wszystkie_daty)}
+relacje_osi  = list(relacja_serie)
+macierz_ruchu = np.zeros((len(relacje_osi), len(wszystkie_daty)), dtype="<u4")
+for r, rid in enumerate(relacje_osi):
+    for d, e in zip(relacja_serie[rid]["dates"], relacja_serie[rid]["efforts"]):
+        c = kolumna_daty.get(d)
+        if c is not None:
+            macierz_ruchu[r, c] = min(e, 0xFFFFFFFF)
+os_czasu = {
+    "daty":    wszystkie_daty,
+    "relacje": relacje_osi,
+    "maxEff":  [relacja_serie[rid]["max_eff"] for rid in relacje_osi],
+    "efforty": base64.b64encode(macierz_ruchu.tobytes()).decode("ascii"),
+}
+
 # ── Legenda ────────────────────────────────────────────────────────────────────
 
 if strava_dostepna:
@@ -809,13 +827,15 @@ mapa.get_root().html.add_child(folium.Element("""
 # ── Wstrzyknij dane inline jako window.TD ─────────────────────────────────────
 
 td = {
-    "popupy":       popupy_relacji,
-    "relSerie":     relacja_serie,
-    "allDates":     wszystkie_daty,
+    "popupy":       popupy_relacji.do_json(),
+    "osCzasu":      os_czasu,
+    "mapa":         mapa.get_name(),
     "koloryBazowe": kolory_bazowe,
     "maxEffort":    max_effort,
+    "paleta":       PALETA,
     "weatherData":  pogoda_dane,
     "avalancheData": lawiny_dane,
+    "kafelki":      kafelki_info,
 }
 td_json = json.dumps(td, ensure_ascii=False)
 print(f"window.TD rozmiar: {len(td_json)//1024} KB")
@@ -828,15 +848,27 @@ mapa.get_root().html.add_child(folium.Element(
 JS = """
 document.addEventListener("DOMContentLoaded", function() {
     var TD  = window.TD || {};
-    var popupy        = TD.popupy        || {};
-    var relSerie      = TD.relSerie      || {};
-    var allDates      = TD.allDates      || [];
+    var popupy        = TD.popupy        || {klasa: []};
+    var osCzasu       = TD.osCzasu       || {daty: [], relacje: [], maxEff: [], efforty: ''};
+    var allDates      = osCzasu.daty;
     var koloryBazowe  = TD.koloryBazowe  || {};
     var maxEffort     = TD.maxEffort     || 1;
+    var paleta        = TD.paleta        || [];
     var weatherData   = TD.weatherData   || {};
     var avalancheData = TD.avalancheData || {};
 
-    var aktywnaKlasa = null;
+    var aktywnaKlasa  = null;
+    var aktywnyWiersz = null;
+
+    // Macierz ruchu: efforty[wiersz * nDni + dzie\u0144], wiersz z wierszRelacji[rid]
+    var nDni = allDates.length, nRel = osCzasu.relacje.length;
+    var wierszRelacji = {};
+    osCzasu.relacje.forEach(function(rid, r) { wierszRelacji[rid] = r; });
+    var efforty = (function(b64) {
+        var bin = atob(b64), bajty = new Uint8Array(bin.length);
+        for (var i = 0; i < bin.length; i++) bajty[i] = bin.charCodeAt(i);
+        return new Uint32Array(bajty.buffer);
+    })(osCzasu.efforty);
 
     var mapaL        = null;
     var playTimer    = null;
@@ -983,11 +1015,28 @@ document.addEventListener("DOMContentLoaded", function() {
     ].join(';');
     document.body.appendChild(panel);
 
-    function budujPanel(kl, idx) {
-        if (!popupy[kl]) return '';
-        var p   = popupy[kl];
-        var rid = kl.replace('trasa-', '');
-        var s   = relSerie[rid];
+    // Popup z kolumn tabeli (napisy przez s\u0142ownik) - sk\u0142adany dopiero przy klikni\u0119ciu
+    function wierszPopupu(w) {
+        if (w == null || w >= popupy.klasa.length) return null;
+        var N = popupy.napisy;
+        return {
+            klasa:    popupy.klasa[w],
+            nazwa:    N[popupy.nazwa[w]],
+            typ:      N[popupy.typ[w]],
+            dlugosc:  (popupy.calosc[w] ? 'D\u0142ugo\u015B\u0107 ca\u0142kowita: ' : 'D\u0142ugo\u015B\u0107 odcinka: ') + popupy.km[w] + ' km',
+            effort:   popupy.effort[w],
+            atleci:   popupy.atleci[w],
+            seg_name: N[popupy.seg_name[w]],
+            snapshot: N[popupy.snapshot[w]],
+            lat:      popupy.lat[w],
+            lon:      popupy.lon[w]
+        };
+    }
+
+    function budujPanel(w, idx) {
+        var p = wierszPopupu(w);
+        if (!p) return '';
+        var r = wierszRelacji[p.klasa.replace('trasa-', '')];
 
         // Nag\u0142\u00F3wek
         var html = '<div style="font-weight:bold;font-size:14px;margin-bottom:4px;color:#fff">' + p.nazwa + '</div>' +
@@ -1013,7 +1062,7 @@ document.addEventListener("DOMContentLoaded", function() {
             } else {
                 var dt = allDates[idx - 1];
                 var dzienne = 0;
-                if (s) { var di = s.dates.indexOf(dt); dzienne = di >= 0 ? (s.efforts[di] || 0) : 0; }
+                if (r != null) dzienne = efforty[r * nDni + idx - 1];
                 var dp = dt.split('-');
                 html += '<table style="font-size:11px;border-collapse:collapse;width:100%">' +
                         '<tr><td style="color:#8ab4f8;padding-right:8px">Dzie\u0144</td>' +
@@ -1157,33 +1206,84 @@ document.addEventListener("DOMContentLoaded", function() {
         (noData ? ' disabled style="opacity:0.3"' : '') + '></div>' +
         '<button id="tl-play"' + (noData ? ' disabled style="opacity:0.3"' : '') + '>&#9654;</button>';
     document.body.appendChild(tlPanel);
+    var etykietyDni = document.querySelectorAll('#tl-lbls span'), prevIdx = 0;
+
+    // Kolor = paleta[kube\u0142ek]; kube\u0142ek z prog\u00F3w (log-skala jak w Pythonie) wyszukiwaniem binarnym.
+    // Progi licz\u0105 si\u0119 raz na max (klatk\u0119), nie raz na \u015Bcie\u017Ck\u0119.
+    function progiDla(mx) {
+        var n = Math.max(paleta.length - 1, 0), progi = new Float64Array(n), logMax = Math.log(1 + mx);
+        for (var k = 1; k <= n; k++) progi[k - 1] = Math.exp((k - 0.5) / n * logMax) - 1;
+        return progi;
+    }
 
-    function eff2col(eff, mx) {
-        if (!eff || !mx) return null;
-        var t = Math.log(1 + eff) / Math.log(1 + mx);
-        t = Math.min(1, Math.max(0, t));
-        var r, g, b, tt;
-        if (t < 0.25) { tt=t/0.25; r=Math.round(20+tt*40); g=Math.round(60+tt*80); b=Math.round(180+tt*40); }
-        else if (t < 0.5) { tt=(t-0.25)/0.25; r=Math.round(60+tt*190); g=Math.round(140+tt*100); b=Math.round(220-tt*200); }
-        else if (t < 0.75) { tt=(t-0.5)/0.25; r=250; g=Math.round(240-tt*140); b=Math.round(20-tt*20); }
-        else { tt=(t-0.75)/0.25; r=Math.round(250-tt*20); g=Math.round(100-tt*100); b=0; }
-        return 'rgb('+r+','+g+','+b+')';
+    function kolorZProgow(eff, progi) {
+        if (!eff || !progi.length) return null;
+        var lo = 0, hi = progi.length;
+        while (lo < hi) { var m = (lo + hi) >> 1; if (progi[m] <= eff) lo = m + 1; else hi = m; }
+        return paleta[lo];
     }
 
-    function recolor(idx) {
-        var date = idx === 0 ? null : allDates[idx - 1];
-        var dayMax = 0;
-        if (date) Object.values(relSerie).forEach(function(s) {
-            var i = s.dates.indexOf(date);
-            if (i >= 0 && s.efforts[i] > dayMax) dayMax = s.efforts[i];
-        });
-        document.querySelectorAll('path[class]').forEach(function(el) {
-            var kl = Array.from(el.classList).find(function(c) { return c.startsWith('trasa-'); });
+    var progiOgolem = progiDla(maxEffort);
+
+    // Kolor relacji w bie\u017C\u0105cej klatce (null = kolor bazowy szlaku)
+    var kolorRelacji = new Array(nRel).fill(null);
+
+    // Cache \u015Bcie\u017Cek: element + wiersz relacji (-1 = brak serii) + kolor bazowy.
+    // Uniewa\u017Cniany gdy Leaflet dodaje/usuwa warstwy (kafelki, prze\u0142\u0105czanie grup).
+    var sciezki = null;
+
+    function klasaTrasy(el) {
+        return Array.from(el.classList).find(function(c) { return c.startsWith('trasa-'); });
+    }
+
+    function wierszSciezki(el) {
+        var c = Array.from(el.classList).find(function(c) { return c.startsWith('pp-'); });
+        return c ? parseInt(c.slice(3)) : null;
+    }
+
+    function zbierzSciezki() {
+        var el = [], wiersz = [], baz = [];
+        document.querySelectorAll('path[class]').forEach(function(p) {
+            var kl = klasaTrasy(p);
             if (!kl) return;
-            var rid = kl.replace('trasa-', ''), s = relSerie[rid], baz = koloryBazowe[kl] || '#888888';
-            if (!s) { el.style.stroke = baz; return; }
-            if (!date) { el.style.stroke = eff2col(s.max_eff, maxEffort) || baz; }
-            else { var i = s.dates.indexOf(date); var e = i >= 0 ? s.efforts[i] : 0; el.style.stroke = e > 0 ? eff2col(e, dayMax||1) : baz; }
+            var r = wierszRelacji[kl.replace('trasa-', '')];
+            el.push(p); wiersz.push(r == null ? -1 : r); baz.push(koloryBazowe[kl] || '#888888');
+        });
+        sciezki = {el: el, wiersz: Int32Array.from(wiersz), baz: baz};
+    }
+    if (window[TD.mapa]) window[TD.mapa].on('layeradd layerremove', function() { sciezki = null; });
+
+    function policzKlatke(idx) {
+        var r, e;
+        if (idx === 0) {
+            for (r = 0; r < nRel; r++) kolorRelacji[r] = kolorZProgow(osCzasu.maxEff[r], progiOgolem);
+            return;
+        }
+        var c = idx - 1, dayMax = 0;
+        for (r = 0; r < nRel; r++) { e = efforty[r * nDni + c]; if (e > dayMax) dayMax = e; }
+        var progi = progiDla(dayMax || 1);
+        for (r = 0; r < nRel; r++) kolorRelacji[r] = kolorZProgow(efforty[r * nDni + c], progi);
+    }
+
+    function kolorujSciezke(el, kl) {
+        var r = wierszRelacji[kl.replace('trasa-', '')];
+        el.style.stroke = (r != null && kolorRelacji[r]) || koloryBazowe[kl] || '#888888';
+    }
+
+    // Przerysowanie najwy\u017Cej raz na klatk\u0119 - kilka setIdx w jednej klatce daje jedno malowanie
+    var ramka = null, idxDoNarysowania = 0;
+    function recolor(idx) {
+        idxDoNarysowania = idx;
+        if (ramka !== null) return;
+        ramka = requestAnimationFrame(function() {
+            ramka = null;
+            policzKlatke(idxDoNarysowania);
+            if (!sciezki) zbierzSciezki();
+            var el = sciezki.el, wiersz = sciezki.wiersz, baz = sciezki.baz;
+            for (var i = 0; i < el.length; i++) {
+                var r = wiersz[i];
+                el[i].style.stroke = (r >= 0 && kolorRelacji[r]) || baz[i];
+            }
         });
     }
 
@@ -1193,12 +1293,12 @@ document.addEventListener("DOMContentLoaded", function() {
         var date = idx === 0 ? null : allDates[idx - 1];
         document.getElementById('tl-date').textContent =
             date ? date.slice(5).split('-').reverse().join('.') : 'OG\u00D3\u0141EM';
-        document.querySelectorAll('#tl-lbls span').forEach(function(el, i) {
-            el.className = i === idx ? 'act' : '';
-        });
+        if (etykietyDni[prevIdx]) etykietyDni[prevIdx].className = '';
+        if (etykietyDni[idx])     etykietyDni[idx].className = 'act';
+        prevIdx = idx;
         recolor(idx);
         if (aktywnaKlasa && panel.style.display !== 'none')
-            panel.innerHTML = budujPanel(aktywnaKlasa, idx);
+            panel.innerHTML = budujPanel(aktywnyWiersz, idx);
         updateAvalancheBtn(idx);
     }
 
@@ -1242,31 +1342,98 @@ document.addEventListener("DOMContentLoaded", function() {
         });
     }
 
-    setTimeout(function() {
-        document.querySelectorAll('path[class]').forEach(function(el) {
-            var kl = Array.from(el.classList).find(function(c) { return c.startsWith('trasa-'); });
-            if (!kl) return;
-            el.style.cursor = 'pointer';
-            el.addEventListener('mouseenter', function() { if (!aktywnaKlasa || aktywnaKlasa !== kl) podswietl(kl, true); });
-            el.addEventListener('mouseleave', function() { if (aktywnaKlasa !== kl) podswietl(kl, false); });
-            el.addEventListener('click', function(e) {
+    function podlaczSciezke(el, kl, w) {
+        el.style.cursor = 'pointer';
+        el.addEventListener('mouseenter', function() { if (!aktywnaKlasa || aktywnaKlasa !== kl) podswietl(kl, true); });
+        el.addEventListener('mouseleave', function() { if (aktywnaKlasa !== kl) podswietl(kl, false); });
+        el.addEventListener('click', function(e) {
+            e.stopPropagation();
+            if (aktywnaKlasa && aktywnaKlasa !== kl) podswietl(aktywnaKlasa, false);
+            aktywnaKlasa = kl; aktywnyWiersz = w; podswietl(kl, true);
+            panel.innerHTML = budujPanel(w, currentIdx);
+            panel.style.display = 'block';
+            var closeBtn = document.getElementById('panel-close');
+            if (closeBtn) closeBtn.addEventListener('click', function(e) {
                 e.stopPropagation();
-                if (aktywnaKlasa && aktywnaKlasa !== kl) podswietl(aktywnaKlasa, false);
-                aktywnaKlasa = kl; podswietl(kl, true);
-                panel.innerHTML = budujPanel(kl, currentIdx);
-                panel.style.display = 'block';
-                var closeBtn = document.getElementById('panel-close');
-                if (closeBtn) closeBtn.addEventListener('click', function(e) {
-                    e.stopPropagation();
-                    podswietl(aktywnaKlasa, false); aktywnaKlasa = null; panel.style.display = 'none';
-                });
+                podswietl(aktywnaKlasa, false); aktywnaKlasa = null; panel.style.display = 'none';
             });
         });
+    }
+
+    setTimeout(function() {
+        document.querySelectorAll('path[class]').forEach(function(el) {
+            var kl = klasaTrasy(el);
+            if (kl) podlaczSciezke(el, kl, wierszSciezki(el));
+        });
         document.querySelector('.leaflet-container').addEventListener('click', function() {
             if (aktywnaKlasa) { podswietl(aktywnaKlasa, false); aktywnaKlasa = null; panel.style.display = 'none'; }
         });
     }, 1500);
 
+    // \u2500\u2500 Kafelki szlak\u00F3w (tylko widoczne, na bie\u017C\u0105cym zoomie) \u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500\u2500
+    (function() {
+        var K = TD.kafelki, mapaK = K && window[TD.mapa];
+        if (!mapaK) return;
+        var istnieja = {};
+        K.indeks.forEach(function(k) { istnieja[k] = true; });
+        var zaladowane = {};   // "z/x/y" -> [[warstwa, grupa], ...]
+
+        function kafelekXY(lat, lon, z) {
+            var n = Math.pow(2, z), r = lat * Math.PI / 180;
+            var x = Math.floor((lon + 180) / 360 * n);
+            var y = Math.floor((1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * n);
+            return [Math.min(Math.max(x, 0), n - 1), Math.min(Math.max(y, 0), n - 1)];
+        }
+
+        function wczytaj(k) {
+            var bilet = zaladowane[k] = [];   // to wczytanie - kafelek mo\u017Ce wr\u00F3ci\u0107 do widoku przed odpowiedzi\u0105
+            fetch(K.url + '/' + k + '.json').then(function(r) { return r.json(); }).then(function(fc) {
+                if (zaladowane[k] !== bilet) return;   // kafelek wyszed\u0142 z widoku albo wczytywany jest od nowa
+                fc.features.forEach(function(f) {
+                    var p = f.properties, g = f.geometry;
+                    var linie = g.type === 'LineString' ? [g.coordinates] : g.coordinates;
+                    var warstwa = L.polyline(linie.map(function(l) {
+                        return l.map(function(c) { return [c[1], c[0]]; });
+                    }), {color: p.h, weight: p.w, opacity: 0.8, className: p.k});
+                    warstwa.bindTooltip(popupy.napisy[popupy.nazwa[p.p]], {sticky: true});
+                    warstwa.on('add', function() {
+                        var el = warstwa.getElement();
+                        if (!el) return;
+                        podlaczSciezke(el, p.k, p.p);
+                        kolorujSciezke(el, p.k);
+                        if (aktywnaKlasa === p.k) podswietl(p.k, true);
+                    });
+                    var grupa = window[K.grupy[p.g]] || mapaK;
+                    grupa.addLayer(warstwa);
+                    bilet.push([warstwa, grupa]);
+                });
+            }).catch(function() { if (zaladowane[k] === bilet) delete zaladowane[k]; });
+        }
+
+        function odswiez() {
+            var z = Math.max(K.zmin, Math.min(K.zmax, mapaK.getZoom()));
+            var b = mapaK.getBounds();
+            var a = kafelekXY(b.getNorth(), b.getWest(), z), c = kafelekXY(b.getSouth(), b.getEast(), z);
+            var widoczne = {};
+            for (var x = a[0]; x <= c[0]; x++) {
+                for (var y = a[1]; y <= c[1]; y++) {
+                    var k = z + '/' + x + '/' + y;
+                    if (!istnieja[k]) continue;
+                    widoczne[k] = true;
+                    if (!zaladowane[k]) wczytaj(k);
+                }
+            }
+            Object.keys(zaladowane).forEach(function(k) {
+                if (widoczne[k]) return;
+                zaladowane[k].forEach(function(wg) { wg[1].removeLayer(wg[0]); });
+                delete zaladowane[k];
+            });
+        }
+
+        mapaK.on('moveend', odswiez);
+        odswiez();
+    })();
+
     setTimeout(function() {
         mapaL = Object.values(window).find(function(v) { return v && v._leaflet_id && v.getCenter; });
         if (!mapaL) return;
@@ -1431,6 +1598,7 @@ document.addEventListener("DOMContentLoaded", function() {
 """
 mapa.get_root().script.add_child(folium.Element(JS))
 
+raport.etap("zapis")
 try:
     mapa.save("index.html")
 except UnicodeEncodeError:
@@ -1443,4 +1611,6 @@ else:
         html_out = f.read()
     with open("index.html", "w", encoding="utf-8") as f:
         f.write(html_out)
-    print("Gotowe! Zapisano index.html")
\ No newline at end of file
+    print("Gotowe! Zapisano index.html")
+
+raport.zapisz()
@@ -0,0 +1,371 @@
+"""
+TATRY FLOW - API tylko do odczytu nad tatry_segments.db (asyncio, bez zależności)
+
+Dashboard zamiast pobierać całe traffic_data.json / weather_data.json pyta
+o to, czego potrzebuje (odpowiedzi JSON, daty YYYY-MM-DD, od/do włącznie):
+
+  GET /segmenty/top?n=10&od=...&do=...   segmenty z największą liczbą efortów w zakresie
+                                         (domyślnie ostatnie 30 dni z danymi)
+  GET /segmenty/<id>?od=...&do=...       seria segmentu ze wszystkich warstw retencji
+  GET /pogoda                            stacje z zakresem dat
+  GET /pogoda/<stacja>?od=...&do=...     pogoda stacji
+  GET /lawiny                            źródła komunikatów z zakresem dat
+  GET /lawiny/<zrodlo>?od=...&do=...     historia komunikatów lawinowych
+
+Serwer HTTP/1.1 na asyncio.start_server (keep-alive, gzip przy
+Accept-Encoding: gzip, ETag / 304). Zapytania idą w wątkach na połączeniach
+z puli otwartych jako mode=ro - rozmiar puli ogranicza równoległość,
+kolektory mogą w tym czasie pisać (WAL). Gotowe odpowiedzi trzyma LRU
+w pamięci. Przed każdym żądaniem sprawdzana jest wersja bazy: PRAGMA
+data_version połączenia-strażnika i mtime / rozmiar plików bazy i -wal.
+Zmiana (commit kolektora) czyści cache; inny i-węzeł pliku (podmiana przez
+odbudowa.py) dodatkowo otwiera pulę od nowa.
+
+Uzycie:
+  python api.py                                   # 127.0.0.1:8765
+  python api.py --host 0.0.0.0 --port 8080 --pula 8 --cache 1024
+"""
+
+import os
+import re
+import json
+import gzip
+import zlib
+import asyncio
+import sqlite3
+import logging
+import argparse
+from collections import OrderedDict
+from datetime import date, timedelta
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import retencja
+
+DB_PATH   = os.getenv("DB_PATH", "tatry_segments.db")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+POLACZENIA   = 4
+CACHE_WPISOW = 512
+TOP_DNI      = 30       # domyślny zakres /segmenty/top
+TOP_MAX      = 500
+KEEPALIVE_S  = 30
+GZIP_OD      = 1024     # mniejszych odpowiedzi nie kompresujemy
+
+log = logging.getLogger("api")
+
+DATA = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+class BladZapytania(Exception):
+    def __init__(self, status, komunikat):
+        super().__init__(komunikat)
+        self.status = status
+
+
+# -- Zapytania (w wątku, na połączeniu z puli) ----------------------------------
+
+def _zakres(param, od="", do="9999-12-31"):
+    od, do = param.get("od", od), param.get("do", do)
+    for d in (od, do):
+        if d not in ("", "9999-12-31") and not DATA.match(d):
+            raise BladZapytania(400, f"zla data: {d!r} (YYYY-MM-DD)")
+    return od, do
+
+
+def segmenty_top(conn, param):
+    try:
+        n = int(param.get("n", 10))
+    except ValueError:
+        raise BladZapytania(400, "n musi byc liczba")
+    n = max(1, min(n, TOP_MAX))
+    ostatni = conn.execute("SELECT MAX(captured_at) FROM snapshots").fetchone()[0] or date.today().isoformat()
+    domyslny_od = (date.fromisoformat(ostatni) - timedelta(days=TOP_DNI - 1)).isoformat()
+    od, do = _zakres(param, domyslny_od, ostatni)
+    # Przyrost w zakresie = licznik na koniec zakresu minus licznik sprzed zakresu,
+    # bez liczenia LAG z widoku traffic dla całej historii. Jak suwak mapy: pierwszy
+    # snapshot segmentu nie jest przyrostem (bez wcześniejszego - baza to pierwszy w zakresie).
+    # SQLite: kolumny obok MAX() / MIN() pochodzą z wiersza z maksimum / minimum
+    wiersze = conn.execute("""
+        WITH koniec AS (
+            SELECT segment_id, effort_count, MAX(captured_at) AS captured_at
+            FROM snapshots_all WHERE captured_at <= :do GROUP BY segment_id
+        ), pierwszy AS (
+            SELECT segment_id, effort_count, MIN(captured_at) AS captured_at
+            FROM snapshots_all WHERE captured_at BETWEEN :od AND :do GROUP BY segment_id
+        ), przed AS (
+            SELECT segment_id, effort_count, MAX(captured_at) AS captured_at
+            FROM snapshots_all WHERE captured_at < :od GROUP BY segment_id
+        )
+        SELECT k.segment_id, s.name, s.activity_type, s.start_lat, s.start_lng,
+               k.effort_count - COALESCE(p.effort_count, f.effort_count) AS efforts,
+               k.effort_count AS effort_count_cumulative
+        FROM koniec k
+        JOIN pierwszy f ON f.segment_id = k.segment_id
+        JOIN segments s ON s.id = k.segment_id
+        LEFT JOIN przed p ON p.segment_id = k.segment_id
+        ORDER BY efforts DESC, k.segment_id
+        LIMIT :n
+    """, {"od": od, "do": do, "n": n}).fetchall()
+    return {"od": od, "do": do, "segmenty": [dict(w) for w in wiersze]}
+
+
+def segment(conn, segment_id, param):
+    if not segment_id.isdigit():
+        raise BladZapytania(404, "nieznany segment")
+    od, do = _zakres(param)
+    meta = conn.execute("""
+        SELECT id, name, activity_type, start_lat, start_lng, end_lat, end_lng,
+               distance, avg_grade, elev_difference, first_seen, last_seen
+        FROM segments WHERE id = ?
+    """, (int(segment_id),)).fetchone()
+    if meta is None:
+        raise BladZapytania(404, "nieznany segment")
+    seria = conn.execute("""
+        SELECT date, effort_count_cumulative, daily_efforts, athlete_count, resolution
+        FROM traffic WHERE segment_id = ? AND date BETWEEN ? AND ?
+        ORDER BY date
+    """, (int(segment_id), od, do)).fetchall()
+    return {"meta": dict(meta), "series": [dict(w) for w in seria]}
+
+
+def lista(conn, tabela, kolumna):
+    return {w[0]: {"od": w[1], "do": w[2], "wierszy": w[3]} for w in conn.execute(f"""
+        SELECT {kolumna}, MIN(captured_at), MAX(captured_at), COUNT(*)
+        FROM {tabela} GROUP BY {kolumna} ORDER BY {kolumna}
+    """)}
+
+
+def pogoda(conn, stacja, param):
+    od, do = _zakres(param)
+    wiersze = conn.execute("""
+        SELECT captured_at AS date, temperatura, predkosc_wiatru, kierunek_wiatru,
+               wilgotnosc, suma_opadu, cisnienie, godzina_pomiaru
+        FROM weather_snapshots WHERE station_key = ? AND captured_at BETWEEN ? AND ?
+        ORDER BY captured_at
+    """, (stacja, od, do)).fetchall()
+    if not wiersze and not conn.execute("SELECT 1 FROM weather_snapshots WHERE station_key = ? LIMIT 1",
+                                        (stacja,)).fetchone():
+        raise BladZapytania(404, "nieznana stacja")
+    return {"stacja": stacja, "series": [dict(w) for w in wiersze]}
+
+
+def lawiny(conn, zrodlo, param):
+    od, do = _zakres(param)
+    wiersze = conn.execute("""
+        SELECT captured_at AS date, stopien, stopien_nazwa, tendencja, wazne_do, opis, last_updated
+        FROM avalanche_bulletins WHERE source_key = ? AND captured_at BETWEEN ? AND ?
+        ORDER BY captured_at
+    """, (zrodlo, od, do)).fetchall()
+    if not wiersze and not conn.execute("SELECT 1 FROM avalanche_bulletins WHERE source_key = ? LIMIT 1",
+                                        (zrodlo,)).fetchone():
+        raise BladZapytania(404, "nieznane zrodlo")
+    return {"zrodlo": zrodlo, "series": [dict(w) for w in wiersze]}
+
+
+def trasa(czesci):
+    """Ścieżka (lista segmentów) -> funkcja(conn, param) albo BladZapytania 404."""
+    match czesci:
+        case ["segmenty", "top"]:
+            return segmenty_top
+        case ["segmenty", segment_id]:
+            return lambda conn, p: segment(conn, segment_id, p)
+        case ["pogoda"]:
+            return lambda conn, p: lista(conn, "weather_snapshots", "station_key")
+        case ["pogoda", stacja]:
+            return lambda conn, p: pogoda(conn, stacja, p)
+        case ["lawiny"]:
+            return lambda conn, p: lista(conn, "avalanche_bulletins", "source_key")
+        case ["lawiny", zrodlo]:
+            return lambda conn, p: lawiny(conn, zrodlo, p)
+    raise BladZapytania(404, "nieznany adres")
+
+
+# -- Pula połączeń i cache ----------------------------------------------------
+
+def _polacz(sciezka):
+    conn = sqlite3.connect(f"file:{sciezka}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # Baza sprzed retencji (np. bez przebiegu kolektora po aktualizacji) nie ma
+    # snapshots_all / nowego traffic - mode=ro jej nie naprawi, widoki idą do TEMP
+    retencja.widoki_tymczasowe(conn)
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+def _stat(sciezka):
+    try:
+        st = os.stat(sciezka)
+        return st.st_ino, st.st_mtime_ns, st.st_size
+    except FileNotFoundError:
+        return None
+
+
+class Baza:
+    """Pula połączeń mode=ro + LRU odpowiedzi unieważniany przy zmianie wersji bazy."""
+
+    def __init__(self, sciezka=DB_PATH, polaczenia=POLACZENIA, wpisow=CACHE_WPISOW):
+        self.sciezka, self.polaczenia, self.wpisow = sciezka, polaczenia, wpisow
+        self.cache  = OrderedDict()
+        self.wersja = None
+        self.inode  = None
+        self.schemat = None
+        self.pula   = None
+        self.trafienia = self.chybienia = 0
+
+    def _otworz(self, inode):
+        if self.pula is not None:
+            while not self.pula.empty():
+                self.pula.get_nowait().close()
+            self.straznik.close()
+        self.pula = asyncio.Queue()
+        for _ in range(self.polaczenia):
+            self.pula.put_nowait(_polacz(self.sciezka))
+        self.straznik = _polacz(self.sciezka)
+        self.inode  = inode
+        self.schemat = self._schemat()
+        log.info(f"Pula: {self.polaczenia} polaczen do {self.sciezka}")
+
+    def _schemat(self):
+        return self.straznik.execute("PRAGMA schema_version").fetchone()[0]
+
+    def sprawdz_wersje(self):
+        baza = _stat(self.sciezka)
+        if baza is None:
+            raise BladZapytania(503, "brak bazy")
+        # Zmiana schematu (np. kolektor założył warstwy retencji) - widoki TEMP
+        # połączeń mogą być nieaktualne, pula od nowa jak po podmianie pliku
+        if baza[0] != self.inode or self._schemat() != self.schemat:
+            self._otworz(baza[0])
+        wal = _stat(self.sciezka + "-wal")
+        wersja = (self.straznik.execute("PRAGMA data_version").fetchone()[0], baza, wal)
+        if wersja != self.wersja:
+            if self.cache:
+                log.info(f"Nowe dane - czyszcze cache ({len(self.cache)} wpisow)")
+            self.cache.clear()
+            self.wersja = wersja
+
+    async def odpowiedz(self, klucz, funkcja, param):
+        """(status, body, etag) dla klucza; z cache albo z zapytania w wątku."""
+        self.sprawdz_wersje()
+        if klucz in self.cache:
+            self.cache.move_to_end(klucz)
+            self.trafienia += 1
+            return self.cache[klucz]
+        self.chybienia += 1
+        pula = self.pula
+        conn = await pula.get()
+        try:
+            wynik = await asyncio.to_thread(funkcja, conn, param)
+        finally:
+            if pula is self.pula:
+                pula.put_nowait(conn)
+            else:
+                conn.close()     # pula wymieniona w trakcie zapytania
+        body = json.dumps(wynik, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        wpis = (200, body, f'"{zlib.crc32(body):08x}-{len(body):x}"', {})
+        self.cache[klucz] = wpis
+        if len(self.cache) > self.wpisow:
+            self.cache.popitem(last=False)
+        return wpis
+
+
+# -- HTTP ---------------------------------------------------------------------
+
+STATUSY = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+async def _zapytanie(baza, metoda, cel, naglowki):
+    if metoda not in ("GET", "HEAD"):
+        return 405, b'{"blad":"tylko GET"}', None
+    url = urlsplit(cel)
+    czesci = [unquote(c) for c in url.path.split("/") if c]
+    param = {k: v[-1] for k, v in parse_qs(url.query).items()}
+    try:
+        funkcja = trasa(czesci)
+        status, body, etag, gz = await baza.odpowiedz((tuple(czesci), tuple(sorted(param.items()))),
+                                                      funkcja, param)
+    except BladZapytania as e:
+        return e.status, json.dumps({"blad": str(e)}, ensure_ascii=False).encode("utf-8"), None
+    except sqlite3.Error as e:
+        log.error(f"{cel}: {e}")
+        return 500, json.dumps({"blad": "blad bazy"}).encode("utf-8"), None
+    if etag and etag in naglowki.get("if-none-match", ""):
+        return 304, b"", etag
+    if len(body) >= GZIP_OD and "gzip" in naglowki.get("accept-encoding", ""):
+        if "gzip" not in gz:
+            gz["gzip"] = gzip.compress(body, compresslevel=6, mtime=0)
+        return 200, gz["gzip"], etag, "gzip"
+    return status, body, etag
+
+
+async def obsluz(baza, reader, writer):
+    try:
+        while True:
+            try:
+                linia = await asyncio.wait_for(reader.readline(), KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                break
+            if not linia:
+                break
+            metoda, cel, wersja_http = linia.decode("latin-1").split()
+            naglowki = {}
+            while (wiersz := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                k, _, v = wiersz.decode("latin-1").partition(":")
+                naglowki[k.strip().lower()] = v.strip()
+
+            status, body, etag, *kodowanie = await _zapytanie(baza, metoda, cel, naglowki)
+            zamknij = naglowki.get("connection", "").lower() == "close" or wersja_http == "HTTP/1.0"
+            glowa = [f"HTTP/1.1 {status} {STATUSY.get(status, '')}",
+                     "Content-Type: application/json; charset=utf-8",
+                     f"Content-Length: {len(body)}",
+                     "Access-Control-Allow-Origin: *",
+                     "Vary: Accept-Encoding"]
+            if etag:
+                glowa.append(f"ETag: {etag}")
+            if kodowanie:
+                glowa.append(f"Content-Encoding: {kodowanie[0]}")
+            if zamknij:
+                glowa.append("Connection: close")
+            writer.write(("\r\n".join(glowa) + "\r\n\r\n").encode("latin-1"))
+            if metoda != "HEAD":
+                writer.write(body)
+            await writer.drain()
+            log.debug(f"{metoda} {cel} {status} {len(body)}")
+            if zamknij:
+                break
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serwuj(host, port, baza):
+    baza.sprawdz_wersje()
+    serwer = await asyncio.start_server(lambda r, w: obsluz(baza, r, w), host, port)
+    log.info(f"API: http://{host}:{port}/segmenty/top  (baza {baza.sciezka})")
+    async with serwer:
+        await serwer.serve_forever()
+
+
+def main():
+    logging.basicConfig(level=getattr(logging, LOG_LEVEL),
+                        format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    p = argparse.ArgumentParser(description="Tatry Flow — API tylko do odczytu")
+    p.add_argument("--host",  default="127.0.0.1")
+    p.add_argument("--port",  type=int, default=8765)
+    p.add_argument("--pula",  type=int, default=POLACZENIA, help="Polaczen do bazy (rownolegle zapytania)")
+    p.add_argument("--cache", type=int, default=CACHE_WPISOW, help="Wpisow w LRU odpowiedzi")
+    args = p.parse_args()
+    try:
+        asyncio.run(serwuj(args.host, args.port, Baza(DB_PATH, args.pula, args.cache)))
+    except (sqlite3.Error, BladZapytania) as e:
+        log.error(f"Nie mozna otworzyc {DB_PATH}: {e} - zbuduj baze: "
+                  f"python odbudowa.py --zmiany zmiany albo uruchom fetcher Strava")
+        raise SystemExit(1)
+    except KeyboardInterrupt:
+        log.info("Zatrzymano.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+TATRY FLOW - archiwum surowych odpowiedzi (Strava, IMGW, Open-Meteo, TOPR, laviny.sk)
+
+Treść odpowiedzi trafia do paczki dnia źródła, ARCHIWUM_DIR/<źródło>/<dzień>.pak -
+w git jeden plik na źródło i dzień zamiast obiektu na każdą odpowiedź. Paczka
+to ciąg rekordów dopisywanych na końcu: linia "sha256 kodek długość\n" i treść
+skompresowana zstd (gdy dostępny jest pakiet zstandard), inaczej gzip. Ta sama
+treść jest w paczce raz; ucięty ostatni rekord (przerwany zapis) jest odcinany
+przy następnym dopisaniu. Po 304 (sam sha256) zapisywany jest tylko wiersz
+raw_responses - treść zostaje w paczce dnia, w którym przyszła, a odczyt
+szuka jej po sha256 w paczkach źródła. Starszy układ - plik na treść
+adresowany sha256 (archiwum/ab/abcd....gz) - jest nadal czytany.
+
+Tabela raw_responses w bazie wiąże treść ze źródłem, kluczem (stacja, komunikat,
+segment, kafelek) i dniem, którego dotyczy - --reparse w fetcherach odbudowuje
+z niej tabele pochodne bez sieci, np. po poprawce parsera. Kolumna encoding
+trzyma kodowanie, którym zbieranie zdekodowało tekst odpowiedzi (nagłówek
+charset albo zgadywanie requests) - reparse dekoduje tak samo.
+"""
+
+import os
+import gzip
+import hashlib
+import logging
+from datetime import datetime, timezone
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIWUM_DIR = os.getenv("RAW_ARCHIVE_DIR", "archiwum")
+
+log = logging.getLogger("archiwum")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS raw_responses (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    source      TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    captured_at TEXT NOT NULL,
+    fetched_at  TEXT NOT NULL,
+    url         TEXT,
+    sha256      TEXT NOT NULL,
+    size        INTEGER,
+    codec       TEXT,
+    encoding    TEXT,
+    UNIQUE(source, key, captured_at, sha256)
+);
+CREATE INDEX IF NOT EXISTS idx_raw_responses_source ON raw_responses(source, captured_at);
+"""
+
+_ROZSZERZENIA = {"zstd": ".zst", "gzip": ".gz"}
+_PACZKA       = ".pak"
+
+_w_paczkach = {}             # ścieżka paczki -> (rozmiar pliku, {sha256: kodek}) przy dopisywaniu
+_odczyt     = (None, None)   # ostatnio czytana paczka: ((ścieżka, mtime, rozmiar), rekordy)
+
+
+def przygotuj(conn):
+    conn.executescript(SCHEMA)
+    istniejace = {row[1] for row in conn.execute("PRAGMA table_info(raw_responses)")}
+    if "encoding" not in istniejace:
+        conn.execute("ALTER TABLE raw_responses ADD COLUMN encoding TEXT")
+        conn.commit()
+        log.info("Migracja: dodano kolumnę encoding do raw_responses")
+
+
+def _paczka(zrodlo, dzien):
+    return os.path.abspath(os.path.join(ARCHIWUM_DIR, zrodlo, dzien + _PACZKA))
+
+
+def _sciezka(sha, kodek):
+    """Starszy układ: plik na treść adresowany sha256."""
+    return os.path.join(ARCHIWUM_DIR, sha[:2], sha + _ROZSZERZENIA[kodek])
+
+
+def _kompresuj(tresc):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=19).compress(tresc)
+    # mtime=0 - ta sama treść daje te same bajty (bez zbędnych zmian w git)
+    return "gzip", gzip.compress(tresc, compresslevel=9, mtime=0)
+
+
+def _rozpakuj(kodek, dane, skad):
+    if kodek == "gzip":
+        return gzip.decompress(dane)
+    if zstandard is None:
+        raise RuntimeError(f"{skad}: do odczytu potrzebny pakiet zstandard")
+    return zstandard.ZstdDecompressor().decompress(dane)
+
+
+def _rekordy(sciezka):
+    """
+    Rekordy paczki {sha256: (kodek, dane skompresowane)} i długość jej poprawnej
+    części (bez uciętego ostatniego rekordu).
+    """
+    with open(sciezka, "rb") as f:
+        dane = f.read()
+    rekordy, poz = {}, 0
+    while poz < len(dane):
+        koniec = dane.find(b"\n", poz)
+        if koniec < 0:
+            break
+        try:
+            sha, kodek, dlugosc = dane[poz:koniec].decode("ascii").split()
+            dlugosc = int(dlugosc)
+        except ValueError:
+            break
+        if koniec + 1 + dlugosc > len(dane):
+            break
+        rekordy.setdefault(sha, (kodek, dane[koniec + 1:koniec + 1 + dlugosc]))
+        poz = koniec + 1 + dlugosc
+    return rekordy, poz
+
+
+def _czytaj_paczke(sciezka):
+    global _odczyt
+    st = os.stat(sciezka)
+    klucz = (sciezka, st.st_mtime_ns, st.st_size)
+    if _odczyt[0] != klucz:
+        _odczyt = (klucz, _rekordy(sciezka)[0])
+    return _odczyt[1]
+
+
+def _dopisz(sciezka, sha, tresc):
+    """Dopisuje treść do paczki, jeśli jeszcze jej tam nie ma; zwraca kodek rekordu."""
+    rozmiar = os.path.getsize(sciezka) if os.path.exists(sciezka) else 0
+    znany_rozmiar, znane = _w_paczkach.get(sciezka, (None, None))
+    if znany_rozmiar != rozmiar:   # pierwszy zapis w procesie albo plik zmieniony z zewnątrz
+        znane = {}
+        if rozmiar:
+            rekordy, poprawne = _rekordy(sciezka)
+            znane = {s: k for s, (k, _) in rekordy.items()}
+            if poprawne < rozmiar:
+                log.warning(f"Archiwum: {sciezka} - ucięty ostatni rekord, odcinam")
+                os.truncate(sciezka, poprawne)
+                rozmiar = poprawne
+    if sha not in znane:
+        kodek, dane = _kompresuj(tresc)
+        rekord = f"{sha} {kodek} {len(dane)}\n".encode("ascii") + dane
+        os.makedirs(os.path.dirname(sciezka), exist_ok=True)
+        with open(sciezka, "ab") as f:
+            f.write(rekord)
+        znane[sha] = kodek
+        rozmiar += len(rekord)
+    _w_paczkach[sciezka] = (rozmiar, znane)
+    return znane[sha]
+
+
+def zapisz_tresc(tresc, zrodlo, dzien):
+    """Dopisuje treść (bytes) do paczki dnia źródła, jeśli jej tam nie ma; zwraca (sha256, kodek)."""
+    sha = hashlib.sha256(tresc).hexdigest()
+    return sha, _dopisz(_paczka(zrodlo, dzien), sha, tresc)
+
+
+def _dni_paczek(conn, zrodlo, sha, dzien):
+    """Dni paczek do przeszukania: dzien, dni z raw_responses z tym sha256, reszta od najnowszej."""
+    yield dzien
+    yield from (r[0] for r in conn.execute(
+        "SELECT DISTINCT captured_at FROM raw_responses WHERE source = ? AND sha256 = ? "
+        "ORDER BY captured_at DESC", (zrodlo, sha)))
+    katalog = os.path.join(ARCHIWUM_DIR, zrodlo)
+    if os.path.isdir(katalog):
+        yield from sorted((p[:-len(_PACZKA)] for p in os.listdir(katalog) if p.endswith(_PACZKA)),
+                          reverse=True)
+
+
+def _znajdz(conn, zrodlo, sha, dzien):
+    """
+    (kodek, treść) o danym sha256: z paczki dnia, z paczek dni, w których
+    raw_responses ją notuje, z pozostałych paczek źródła (np. z --live bez
+    bazy) albo ze starszego układu. None, gdy nigdzie jej nie ma.
+    """
+    sprawdzone = set()
+    for d in _dni_paczek(conn, zrodlo, sha, dzien):
+        if d in sprawdzone:
+            continue
+        sprawdzone.add(d)
+        znalezione = _z_paczki(sha, zrodlo, d)
+        if znalezione:
+            return znalezione
+    for kodek in _ROZSZERZENIA:
+        try:
+            return kodek, wczytaj(sha, kodek)
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def zapisz(conn, zrodlo, klucz, dzien, tresc=None, url=None, sha256=None, kodowanie=None):
+    """
+    Archiwizuje odpowiedź i dopisuje wiersz raw_responses (bez commit - razem
+    z danymi). Bez treści, z samym sha256 (np. po 304), wiersz wskazuje na
+    treść obecną już w którejś paczce źródła (nie jest kopiowana do paczki
+    dnia); gdy jej nie ma - None i bez wiersza. kodowanie: jak zbieranie
+    zdekodowało tekst (None dla JSON). Błędy archiwum nie przerywają zbierania.
+    """
+    try:
+        if tresc is None:
+            znalezione = _znajdz(conn, zrodlo, sha256, dzien) if sha256 else None
+            if znalezione is None:
+                return None
+            kodek, tresc = znalezione
+        else:
+            if isinstance(tresc, str):
+                tresc = tresc.encode("utf-8")
+            sha256, kodek = zapisz_tresc(tresc, zrodlo, dzien)
+        conn.execute("""
+            INSERT INTO raw_responses
+                (source, key, captured_at, fetched_at, url, sha256, size, codec, encoding)
+            VALUES (?,?,?,?,?,?,?,?,?)
+            ON CONFLICT(source, key, captured_at, sha256) DO UPDATE SET
+                fetched_at=excluded.fetched_at, encoding=COALESCE(excluded.encoding, encoding)
+        """, (zrodlo, klucz, dzien, datetime.now(timezone.utc).isoformat(timespec="seconds"),
+              url, sha256, len(tresc), kodek, kodowanie))
+        return sha256
+    except Exception as e:
+        log.warning(f"Archiwum: nie zapisano {zrodlo}/{klucz}: {e}")
+        return None
+
+
+def _z_paczki(sha, zrodlo, dzien):
+    """(kodek, treść) z paczki dnia źródła albo None."""
+    sciezka = _paczka(zrodlo, dzien)
+    rekord = _czytaj_paczke(sciezka).get(sha) if os.path.exists(sciezka) else None
+    return (rekord[0], _rozpakuj(*rekord, sciezka)) if rekord else None
+
+
+def wczytaj(sha, kodek=None, zrodlo=None, dzien=None):
+    """Zwraca treść (bytes) o danym sha256 - z paczki (zrodlo, dzien), potem ze starszego układu."""
+    if zrodlo and dzien:
+        znalezione = _z_paczki(sha, zrodlo, dzien)
+        if znalezione:
+            return znalezione[1]
+    for k in ([kodek] if kodek else list(_ROZSZERZENIA)):
+        sciezka = _sciezka(sha, k)
+        if not os.path.exists(sciezka):
+            continue
+        with open(sciezka, "rb") as f:
+            return _rozpakuj(k, f.read(), sciezka)
+    raise FileNotFoundError(f"Brak w archiwum: {sha}")
+
+
+def _najnowsze(conn, zrodlo, od, do):
+    # SQLite: kolumny obok MAX() pochodzą z wiersza z maksimum (ostatnio pobranego)
+    wiersze = conn.execute("""
+        SELECT key, captured_at, sha256, encoding, MAX(fetched_at) FROM raw_responses
+        WHERE source = ? AND captured_at >= ? AND captured_at <= ?
+        GROUP BY key, captured_at
+        ORDER BY captured_at, key
+    """, (zrodlo, od or "", do or "9999")).fetchall()
+    for klucz, dzien, sha, kodowanie, _ in wiersze:
+        # Wiersz po 304 wskazuje na treść z paczki innego dnia - szukanie po sha256
+        try:
+            znalezione = _znajdz(conn, zrodlo, sha, dzien)
+        except (OSError, RuntimeError) as e:
+            log.warning(f"Archiwum: {zrodlo}/{klucz} {dzien}: {e}")
+            continue
+        if znalezione is None:
+            log.warning(f"Archiwum: {zrodlo}/{klucz} {dzien}: brak treści {sha}")
+            continue
+        yield klucz, dzien, znalezione[1], kodowanie
+
+
+def odpowiedzi(conn, zrodlo, od=None, do=None):
+    """
+    Najnowsza zarchiwizowana odpowiedź dla każdej pary (klucz, dzień) źródła:
+    generator (klucz, dzień, bytes) w kolejności dni.
+    """
+    for klucz, dzien, tresc, _ in _najnowsze(conn, zrodlo, od, do):
+        yield klucz, dzien, tresc
+
+
+def teksty(conn, zrodlo, od=None, do=None, domyslne="utf-8"):
+    """
+    Jak odpowiedzi(), ale treść zdekodowana tak jak przy zbieraniu (kolumna
+    encoding, dla wierszy bez niej - domyslne): generator (klucz, dzień, str).
+    """
+    for klucz, dzien, tresc, kodowanie in _najnowsze(conn, zrodlo, od, do):
+        try:
+            yield klucz, dzien, tresc.decode(kodowanie or domyslne, errors="replace")
+        except LookupError:
+            yield klucz, dzien, tresc.decode(domyslne, errors="replace")
@@ -11,11 +11,23 @@ Uzycie:
   python "avalanche fetcher.py" --export   # eksport z DB
   python "avalanche fetcher.py" --report   # podglad
   python "avalanche fetcher.py" --test     # debug parsera
+  python "avalanche fetcher.py" --backfill 2023-11-01 2024-05-31   # archiwum laviny.sk do DB
+  python "avalanche fetcher.py" --reparse  # odbuduj DB z archiwum surowych odpowiedzi (bez sieci)
+
+Stan pobran (ETag/Last-Modified, sha256, sparsowane dane) w avalanche_cache.json -
+przy braku zmian komunikatow --live nie parsuje i nie przepisuje avalanche_data.json.
+Surowe komunikaty (kazda odpowiedz 200, takze z --live) i --backfill trafiaja
+do archiwum (archiwum.py); wiersze raw_responses dopisuje kolekcja do DB.
 """
 
-import os, re, json, sqlite3, logging, argparse, requests, time
-from datetime import date, datetime, timezone
+import os, json, sqlite3, logging, argparse, requests, time, hashlib
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import archiwum
+from parsery_lawinowe import KOLORY, parse_topr, parse_hzs, parsuj, parsuj_plik
 
 try:
     from dotenv import load_dotenv; load_dotenv()
@@ -25,22 +37,24 @@ except ImportError:
 DB_PATH   = os.getenv("DB_PATH", "tatry_segments.db")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
-KOLORY = {1: "#8BC34A", 2: "#FFC107", 3: "#FF9800", 4: "#F44336", 5: "#7B1FA2"}
+# Adresy nadpisywalne zmiennymi srodowiska (np. bench/mock_serwer.py)
+TOPR_URL      = os.getenv("TOPR_URL",      "https://lawiny.topr.pl/getwidget")
+LAVINY_SK_URL = os.getenv("LAVINY_SK_URL", "https://static.laviny.sk/simple/{date}/SK_sk.html")
 
 ZRODLA = {
     "topr_tatry_polskie": {
         "nazwa":  "Tatry Polskie (TOPR)",
-        "url":    "https://lawiny.topr.pl/getwidget",
+        "url":    TOPR_URL,
         "region": "PL", "parser": "topr",
     },
     "hzs_wysokie_tatry": {
         "nazwa":  "Wysokie Tatry (HZS)",
-        "url":    "https://static.laviny.sk/simple/{date}/SK_sk.html",
+        "url":    LAVINY_SK_URL,
         "region": "SK", "parser": "laviny_sk", "region_key": "tatry",
     },
     "hzs_zachodnie_tatry": {
         "nazwa":  "Zachodnie Tatry (HZS)",
-        "url":    "https://static.laviny.sk/simple/{date}/SK_sk.html",
+        "url":    LAVINY_SK_URL,
         "region": "SK", "parser": "laviny_sk", "region_key": "tatry",
     },
 }
@@ -75,6 +89,7 @@ def get_db():
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.executescript(SCHEMA)
+    archiwum.przygotuj(conn)
     conn.commit()
     # Migracja: dodaj kolumny których może nie być w starej bazie
     # Sprawdzamy przez PRAGMA table_info zamiast polegać na wyjątku
@@ -87,291 +102,275 @@ def get_db():
     return conn
 
 
-def _ascii(s):
-    return (s.lower()
-             .replace("\u0105","a").replace("\u0107","c").replace("\u0119","e")
-             .replace("\u0142","l").replace("\u0144","n").replace("\u00f3","o")
-             .replace("\u015b","s").replace("\u017a","z").replace("\u017c","z")
-             .replace("\u010d","c").replace("\u013e","l").replace("\u0148","n")
-             .replace("\u0161","s").replace("\u017e","z"))
+# -- Cache warunkowego GET (avalanche_cache.json) ---------------------------------
+# Komunikaty zmieniaja sie ~raz dziennie, a --live chodzi co godzine. Dla kazdego
+# URL-a trzymamy ETag/Last-Modified, sha256 tresci i sparsowane dane per zrodlo:
+# 304 albo ta sama tresc = brak parsowania, dane z cache. Plik commitowany przez workflow,
+# wiec bez czasu ostatniego sprawdzenia - przebieg bez zmian go nie przepisuje.
+#   url -> {"etag", "last_modified", "sha256", "kodowanie", "zmiana", "dane": {key: dane}}
 
+CACHE_PATH  = os.getenv("AVALANCHE_CACHE", "avalanche_cache.json")
+_http_cache = None
+_pobrane    = {}   # url -> (zmiana, html) w tym przebiegu (2 klucze HZS = 1 URL laviny.sk)
+_surowe     = {}   # url -> (bytes, kodowanie) odpowiedzi 200 w tym przebiegu (do raw_responses)
 
-MAPA_NAZW = [
-    (5, ["bardzo duze", "bardzo duzy", "bardzo vysokie", "very high"]),
-    (4, ["duze", "duzy", "vysokie", "velke", "velky", "high"]),
-    (3, ["znaczne", "znaczny", "zvysene", "considerable"]),
-    (2, ["umiarkowane", "umiarkowany", "mierne", "moderate"]),
-    (1, ["male", "maly", "niskie", "low", "gering", "niske"]),
-]
 
-
-def nazwa_do_stopnia(s):
-    if not s: return None
-    a = _ascii(s)
-    for nr, slowa in MAPA_NAZW:
-        for slowo in slowa:
-            if slowo in a:
-                return nr
-    return None
+def url_zrodla(meta):
+    return meta["url"].replace("{date}", date.today().isoformat())
 
 
-# -- Parser TOPR ----------------------------------------------------------------
-# UWAGA: lawiny.topr.pl/getwidget zwraca document.write('...')
-# Regex [\"'] zatrzymuje sie na pierwszym " wewnatrz tresci (np. w alt="...")
-# Dlatego NIE uzywamy regex do wyciagania - usuwamy wrapper bezposrednio.
-
-def parse_topr(raw):
-    # Usun document.write wrapper - szukaj od pierwszego ( do ostatniego )
-    tekst = raw
-    # Usun "document.write( '" z poczatku i "' );" z konca
-    tekst = re.sub(r"^\s*document\.write\s*\(\s*'", "", tekst, flags=re.DOTALL)
-    tekst = re.sub(r"'\s*\)\s*;?\s*$", "", tekst, flags=re.DOTALL)
-
-    log.debug("TOPR raw tekst (pierwsze 400): " + tekst[:400])
-
-    # Usun HTML tagi
-    tekst = re.sub(r"<[^>]+>", " ", tekst)
-    # Usun Markdown bold
-    tekst = re.sub(r"\*+([^*]+)\*+", r"\1", tekst)
-    # Usun Markdown linki
-    tekst = re.sub(r"\[([^\]]+)\]\([^\)]+\)", r"\1", tekst)
-    # Uprosz whitespace
-    tekst = re.sub(r"[ \t]+", " ", tekst)
-
-    log.debug("TOPR oczyszczony (pierwsze 400): " + tekst[:400])
-
-    # -- Stopien: "Zagrozenie okreslono jako: Umiarkowane" --
-    stopien, stopien_nazwa = None, None
-    m = re.search(
-        r"okre[s\u015b]lono\s+jako\s*:?\s*"
-        r"(Bardzo\s+du[z\u017c]e|Du[z\u017c]e|Znaczne|Umiarkowane|Ma[l\u0142]e"
-        r"|Bardzo\s+du[z\u017c]y|Du[z\u017c]y|Znaczny|Umiarkowany|Ma[l\u0142]y"
-        r"|Niskie|Wysokie|Bardzo\s+[Ww]ysokie)",
-        tekst, re.IGNORECASE
-    )
-    if m:
-        stopien_nazwa = m.group(1).strip()
-        stopien       = nazwa_do_stopnia(stopien_nazwa)
-
-    # Fallback: cyfra po "stopien zagrozen"
-    if stopien is None:
-        m = re.search(r"stopie[n\u0144][^0-9]{0,30}([1-5])", tekst, re.IGNORECASE)
-        if m:
-            stopien = int(m.group(1))
-
-    # Fallback: szukaj slowa kluczowego w calosci
-    if stopien is None:
-        for nr, slowa_pl in [(5,["Bardzo du\u017ce"]),(4,["Du\u017ce"]),(3,["Znaczne"]),
-                             (2,["Umiarkowane"]),(1,["Ma\u0142e","Niskie"])]:
-            for s in slowa_pl:
-                if re.search(s, tekst, re.IGNORECASE):
-                    stopien = nr; stopien_nazwa = s; break
-            if stopien: break
-
-    # -- Waznosc --
-    wazne_do = None
-    m = re.search(r"Obowi[a\u0105]zuje\s+do\s*:?\s*([\d\.\: ]+)", tekst, re.IGNORECASE)
-    if m:
-        wazne_do = m.group(1).strip()
-
-    # -- Tendencja -- wyciągaj konkretną frazę ze zdania
-    tendencja = None
-    m = re.search(
-        r"(Stopie[n\u0144]\s+zagro[z\u017c]enia\s+"
-        r"(?:nie\s+powinien\s+ulec\s+zmianie"
-        r"|mo[z\u017c]e\s+rosn[a\u0105][c\u0107]"
-        r"|mo[z\u017c]e\s+male[c\u0107]"
-        r"|pozostanie\s+bez\s+zmian))",
-        tekst, re.IGNORECASE
-    )
-    if m:
-        tendencja = m.group(1).strip()[:120]
-
-    # -- Opis --
-    opis = None
-    skip = [r"Komunikat", r"Obowi[a\u0105]zuje", r"okre[s\u015b]lono", r"Stopie[n\u0144]",
-            r"Szczeg", r"TURYSTO", r"Twoje bezpiecze", r"TOPR\b", r"^\s*$"]
-    for line in tekst.split("\n"):
-        l = line.strip()
-        if len(l) < 40: continue
-        if any(re.search(p, l, re.IGNORECASE) for p in skip): continue
-        opis = l[:300]
-        break
-
-    log.info(f"TOPR: stopien={stopien} ({stopien_nazwa}), tendencja={tendencja}")
-    return {"stopien": stopien, "stopien_nazwa": stopien_nazwa,
-            "tendencja": tendencja, "wazne_do": wazne_do,
-            "opis": opis, "kolor": KOLORY.get(stopien)}
-
-
-# -- Parser HZS -----------------------------------------------------------------
-
-def parse_hzs(html):
-    stopien, stopien_nazwa = None, None
-    STOPNIE_SK = {1:"Malé", 2:"Mierne", 3:"Zvýšené", 4:"Veľké", 5:"Veľmi veľké"}
-
-    m = re.search(r"danger_rating_(\d)\.svg", html, re.IGNORECASE)
-    if m:
-        stopien       = int(m.group(1))
-        stopien_nazwa = STOPNIE_SK.get(stopien)
-
-    if not stopien:
-        # Fallback: alt text
-        m = re.search(r'alt=["\']([^"\']+stupen[^"\']+)["\']', html, re.IGNORECASE)
-        if m:
-            stopien_nazwa = m.group(1)
-            stopien = nazwa_do_stopnia(stopien_nazwa)
-
-    # Waznosc
-    wazne_do = None
-    m = re.search(r"platnost[^:]*:\s*([^\n<]{5,40})", html, re.IGNORECASE)
-    if not m:
-        m = re.search(r"(\d{1,2}\.\d{1,2}\.\d{4}[^\n<]{0,20})", html)
-    if m: wazne_do = m.group(1).strip()[:60]
-
-    # Opis z sekcji Vystrazenia / ostrzezenia
-    opis = None
-    m = re.search(r"V[yý]strahy?[^<]{0,20}</[^>]+>(.*?)</", html, re.IGNORECASE | re.DOTALL)
-    if m:
-        opis_raw = re.sub(r"<[^>]+>", " ", m.group(1)).strip()
-        opis = re.sub(r"\s+", " ", opis_raw)[:300] if len(opis_raw) > 5 else None
-
-    log.info(f"HZS: stopien={stopien} ({stopien_nazwa})")
-    return {"stopien": stopien, "stopien_nazwa": stopien_nazwa,
-            "tendencja": None, "wazne_do": wazne_do,
-            "opis": opis, "kolor": KOLORY.get(stopien)}
-
-
-# -- Parser laviny.sk (static.laviny.sk/simple/YYYY-MM-DD/SK_sk.html) ----------
-# Jedna strona zawiera dane dla wszystkich regionów SK.
-# Sekcja "Tatry" (Vysoké, Západné, Nízke Tatry) - pierwsza sekcja bulletinu.
-
-_laviny_sk_cache = {}  # cache: date -> html (żeby nie pobierać 2x dla 2 kluczy)
-
-def parse_laviny_sk(html, region_key="tatry"):
-    if isinstance(html, bytes):
-        html = html.decode("utf-8", errors="replace")
-
-    # Usuń style/script, potem tagi HTML
-    tekst = re.sub(r"<style[^>]*>.*?</style>", " ", html, flags=re.DOTALL | re.IGNORECASE)
-    tekst = re.sub(r"<script[^>]*>.*?</script>", " ", tekst, flags=re.DOTALL | re.IGNORECASE)
-    tekst = re.sub(r"<[^>]+>", " ", tekst)
-    tekst = re.sub(r"[ \t]+", " ", tekst)
-    tekst_ascii = _ascii(tekst)
-
-    log.info(f"laviny.sk tekst_ascii (pierwsze 800): {tekst_ascii[:800]}")
-
-    stopien = None
-    stopien_nazwa = None
-
-    # Próba 1: "t.j 2. stupe" w tekście
-    m = re.search(r"t\.j\.?\s*(\d)\.\s*stupe", tekst, re.IGNORECASE)
-    if m:
-        stopien = int(m.group(1))
-
-    # Próba 2: cyfra po "stupe" w ascii
-    if stopien is None:
-        m = re.search(r"stupe[^\d]{0,30}(\d)", tekst_ascii, re.IGNORECASE)
-        if m:
-            stopien = int(m.group(1))
-
-    # Próba 3: alt obrazka w oryginalnym HTML
-    if stopien is None:
-        m = re.search(r'alt="[^"]*stupe[^"]*(\d)[^"]*"', html, re.IGNORECASE)
-        if not m:
-            m = re.search(r'alt="[^"]*(\d)[^"]*stupe[^"]*"', html, re.IGNORECASE)
-        if m:
-            stopien = int(m.group(1))
-
-    # Próba 4: nazwa słowna w ascii
-    NAZWY_ASCII = [
-        (5, "velmi velke", "Veľmi veľké"),
-        (4, "velke", "Veľké"),
-        (3, "zvysene", "Zvýšené"),
-        (2, "mierne", "Mierne"),
-        (1, "male", "Malé"),
-    ]
-    for nr, slowo, nazwa in NAZWY_ASCII:
-        if re.search(slowo + r".{0,30}lavinove nebezpecenstvo", tekst_ascii, re.IGNORECASE):
-            if stopien is None:
-                stopien = nr
-            stopien_nazwa = nazwa
+def wczytaj_cache(path=CACHE_PATH):
+    global _http_cache
+    if _http_cache is None:
+        try:
+            with open(path, encoding="utf-8") as f:
+                _http_cache = json.load(f)
+        except Exception:
+            _http_cache = {}
+        for wpis in _http_cache.values():
+            wpis.pop("sprawdzono", None)   # pole starszych wersji
+    return _http_cache
+
+
+def zapisz_cache(path=CACHE_PATH):
+    """
+    Zapisuje cache, gdy sie zmienil; wpisy nieaktualnych URL-i (laviny.sk
+    z innych dni) sa usuwane.
+    """
+    if _http_cache is None:
+        return
+    aktualne = {url_zrodla(meta) for meta in ZRODLA.values()}
+    for url in list(_http_cache):
+        if url not in aktualne:
+            del _http_cache[url]
+    tresc = json.dumps(_http_cache, ensure_ascii=False, indent=1, sort_keys=True)
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == tresc:
+                return
+    except OSError:
+        pass
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(tresc)
+
+
+def pobierz_warunkowo(key, url, proby=1, kodowanie=None, warunkowo=True):
+    """
+    Zwraca (zmiana, html): (False, None) dla 304, (False, html) gdy tresc ma ten sam
+    sha256, (True, html) gdy nowa, (None, None) gdy wszystkie proby nieudane.
+    """
+    memo = _pobrane.get(url)
+    if memo and (memo[1] is not None or warunkowo):
+        return memo
+    wpis     = wczytaj_cache().setdefault(url, {})
+    naglowki = dict(HEADERS)
+    if warunkowo and wpis.get("etag"):
+        naglowki["If-None-Match"] = wpis["etag"]
+    if warunkowo and wpis.get("last_modified"):
+        naglowki["If-Modified-Since"] = wpis["last_modified"]
+    teraz = datetime.now(timezone.utc).isoformat(timespec="minutes")
+
+    for attempt in range(proby):
+        try:
+            r = requests.get(url, headers=naglowki, timeout=30)
+            if r.status_code == 304:
+                log.info(f"{key}: bez zmian (304)")
+                wynik = (False, None)
+                break
+            r.raise_for_status()
+            for pole, naglowek in (("etag", "ETag"), ("last_modified", "Last-Modified")):
+                if r.headers.get(naglowek):
+                    wpis[pole] = r.headers[naglowek]
+            html = r.content.decode(kodowanie, errors="replace") if kodowanie else r.text
+            # r.text dekoduje charsetem z naglowkow, a bez niego zgadywanym - zapamietane
+            # dla --reparse z archiwum (i dla wiersza archiwum po pozniejszym 304)
+            wpis["kodowanie"] = kodowanie or r.encoding or r.apparent_encoding
+            _surowe[url] = (r.content, wpis["kodowanie"])
+            # Kazda 200 (takze --live bez DB) do paczki archiwum - pozniejsze 304
+            # w kolekcji do DB bierze stamtad tresc po sha256
+            try:
+                archiwum.zapisz_tresc(r.content, "lawiny", date.today().isoformat())
+            except Exception as e:
+                log.warning(f"{key}: nie zapisano tresci w archiwum: {e}")
+            sha  = hashlib.sha256(r.content).hexdigest()
+            if sha == wpis.get("sha256"):
+                log.info(f"{key}: bez zmian (sha256), {len(r.content)} bajtów")
+                wynik = (False, html)
+            else:
+                log.info(f"{key}: nowa treść, {len(r.content)} bajtów")
+                wpis.update(sha256=sha, zmiana=teraz, dane={})
+                wynik = (True, html)
             break
+        except Exception as e:
+            log.warning(f"{key}: próba {attempt+1}/{proby} nieudana: {e}")
+            if attempt < proby - 1:
+                time.sleep(10)
+    else:
+        log.error(f"{key}: wszystkie próby nieudane")
+        return None, None
 
-    if stopien and not stopien_nazwa:
-        stopien_nazwa = {1:"Malé",2:"Mierne",3:"Zvýšené",4:"Veľké",5:"Veľmi veľké"}.get(stopien)
-
-    # Tendencja - szukaj "Tendencia" i bierz następne słowo/frazę do kropki lub końca
-    tendencja = None
-    m3 = re.search(r"tendencia\s*[:\.]?\s*([a-z][a-záéíóúýäöüčďěľňřšťžů ]{3,60}?)(?:\s*\.|$|\s{2})", tekst_ascii, re.IGNORECASE)
-    if m3:
-        tendencja = m3.group(1).strip()[:120]
-
-    log.info(f"laviny.sk: stopien={stopien} ({stopien_nazwa}), tendencja={tendencja}")
-    return {"stopien": stopien, "stopien_nazwa": stopien_nazwa,
-            "tendencja": tendencja, "wazne_do": None,
-            "opis": None, "kolor": KOLORY.get(stopien)}
+    _pobrane[url] = wynik
+    return wynik
 
 
 # -- Pobierz + parsuj -----------------------------------------------------------
 
 def pobierz_biuletyn(key, meta):
-    today_str = date.today().isoformat()
+    """Zwraca (dane, zmiana) - gdy tresc sie nie zmienila, dane z cache bez parsowania."""
+    url   = url_zrodla(meta)
+    wpis  = wczytaj_cache().get(url, {})
+    znane = wpis.get("dane", {}).get(key)
 
     if meta["parser"] == "laviny_sk":
-        url = meta["url"].replace("{date}", today_str)
-        if url not in _laviny_sk_cache:
-            try:
-                r = requests.get(url, headers=HEADERS, timeout=30)
-                r.raise_for_status()
-                html_bytes = r.content
-                _laviny_sk_cache[url] = html_bytes.decode("utf-8", errors="replace")
-                log.info(f"laviny.sk: pobrano {len(r.text)} bajtów")
-            except Exception as e:
-                log.error(f"{key}: blad pobierania laviny.sk: {e}"); return None
-        return parse_laviny_sk(_laviny_sk_cache[url], meta.get("region_key", "tatry"))
-
-    try:
-        html = None
-        for attempt in range(3):
-            try:
-                r = requests.get(meta["url"], headers=HEADERS, timeout=30)
-                r.raise_for_status()
-                html = r.text
-                break
-            except Exception as e:
-                log.warning(f"{key}: próba {attempt+1}/3 nieudana: {e}")
-                if attempt < 2:
-                    time.sleep(10)
+        zmiana, html = pobierz_warunkowo(key, url, kodowanie="utf-8", warunkowo=znane is not None)
+    else:
+        zmiana, html = pobierz_warunkowo(key, url, proby=3, warunkowo=znane is not None)
+    if zmiana is None:
+        return None, False
+    if not zmiana and znane is not None:
+        return znane, False
+    if html is None:   # 304 dla klucza bez danych w cache (drugi klucz tego samego URL-a)
+        zmiana, html = pobierz_warunkowo(key, url, warunkowo=False)
         if html is None:
-            log.error(f"{key}: wszystkie próby nieudane"); return None
-    except Exception as e:
-        log.error(f"{key}: blad pobierania: {e}"); return None
-
-    if meta["parser"] == "topr":
-        return parse_topr(html)
-    elif meta["parser"] == "hzs":
-        return parse_hzs(html)
-    return None
+            return None, False
+
+    dane = parsuj(meta["parser"], html, meta.get("region_key", "tatry"))
+    if dane:
+        wczytaj_cache()[url].setdefault("dane", {})[key] = dane
+    return dane, True
 
 
 # -- Zapis do DB ----------------------------------------------------------------
 
+def archiwizuj(conn, key, meta, today):
+    """
+    Surowa tresc komunikatu do archiwum; po 304 wiersz wskazuje na tresc o znanym
+    sha256 z wczesniejszej paczki. Gdy jej tam nie ma (np. pobrana przed
+    archiwum), pobiera komunikat jeszcze raz bez naglowkow warunkowych.
+    """
+    url = url_zrodla(meta)
+    if url not in _surowe:
+        wpis = wczytaj_cache().get(url, {})
+        if archiwum.zapisz(conn, "lawiny", key, today, url=url, sha256=wpis.get("sha256"),
+                           kodowanie=wpis.get("kodowanie")):
+            return
+        log.info(f"{key}: brak tresci w archiwum - pobieram bez 304")
+        pobierz_warunkowo(key, url, kodowanie="utf-8" if meta["parser"] == "laviny_sk" else None,
+                          warunkowo=False)
+    if url in _surowe:
+        tresc, kodowanie = _surowe[url]
+        archiwum.zapisz(conn, "lawiny", key, today, tresc, url, kodowanie=kodowanie)
+
+
+UPSERT_SQL = """
+    INSERT INTO avalanche_bulletins
+        (source_key, captured_at, stopien, stopien_nazwa, tendencja, wazne_do, opis, last_updated)
+    VALUES (?,?,?,?,?,?,?,?)
+    ON CONFLICT(source_key,captured_at) DO UPDATE SET
+        stopien=excluded.stopien, stopien_nazwa=excluded.stopien_nazwa,
+        tendencja=excluded.tendencja, wazne_do=excluded.wazne_do,
+        opis=excluded.opis, last_updated=excluded.last_updated
+"""
+
+
+def _wiersz(key, dzien, dane, now_iso):
+    return (key, dzien, dane.get("stopien"), dane.get("stopien_nazwa"),
+            dane.get("tendencja"), dane.get("wazne_do"), dane.get("opis"), now_iso)
+
+
 def upsert_biuletyn(conn, key, today, dane):
     now_iso = datetime.now(timezone.utc).isoformat(timespec="minutes")
-    conn.execute("""
-        INSERT INTO avalanche_bulletins
-            (source_key, captured_at, stopien, stopien_nazwa, tendencja, wazne_do, opis, last_updated)
-        VALUES (?,?,?,?,?,?,?,?)
-        ON CONFLICT(source_key,captured_at) DO UPDATE SET
-            stopien=excluded.stopien, stopien_nazwa=excluded.stopien_nazwa,
-            tendencja=excluded.tendencja, wazne_do=excluded.wazne_do,
-            opis=excluded.opis, last_updated=excluded.last_updated
-    """, (key, today, dane.get("stopien"), dane.get("stopien_nazwa"),
-          dane.get("tendencja"), dane.get("wazne_do"), dane.get("opis"), now_iso))
+    conn.execute(UPSERT_SQL, _wiersz(key, today, dane, now_iso))
     conn.commit()
 
 
+# -- Backfill archiwum laviny.sk --------------------------------------------------
+# static.laviny.sk/simple/{date}/ trzyma komunikaty z poprzednich dni. Pobieranie
+# w puli watkow (ograniczona rownoleglosc), surowy HTML zapisywany w katalogu na
+# dysku (ponowny backfill nie pobiera go drugi raz, brak komunikatu = plik .404),
+# parsowanie w puli procesow, zapis jedna transakcja executemany dla kluczy HZS.
+
+HTML_CACHE = os.getenv("AVALANCHE_HTML_CACHE", "avalanche_html")
+
+
+def pobierz_archiwum(dzien, katalog=HTML_CACHE, proby=3):
+    """Zwraca sciezke pliku z HTML komunikatu z danego dnia albo None (brak / blad)."""
+    sciezka = os.path.join(katalog, f"SK_sk_{dzien}.html")
+    if os.path.exists(sciezka):
+        return sciezka
+    if os.path.exists(sciezka + ".404"):
+        return None
+    url = LAVINY_SK_URL.replace("{date}", dzien)
+    for attempt in range(proby):
+        try:
+            r = requests.get(url, headers=HEADERS, timeout=30)
+            if r.status_code == 404:
+                open(sciezka + ".404", "w").close()
+                return None
+            r.raise_for_status()
+            # Zapis przez plik tymczasowy - przerwany backfill nie zostawia ucietych plikow
+            with open(sciezka + ".tmp", "wb") as f:
+                f.write(r.content)
+            os.replace(sciezka + ".tmp", sciezka)
+            return sciezka
+        except Exception as e:
+            log.warning(f"laviny.sk {dzien}: próba {attempt+1}/{proby} nieudana: {e}")
+            if attempt < proby - 1:
+                time.sleep(5 * (attempt + 1))
+    return None
+
+
+def backfill(od, do, watki=8, procesy=None, katalog=HTML_CACHE):
+    dni = []
+    d = date.fromisoformat(od)
+    while d <= date.fromisoformat(do):
+        dni.append(d.isoformat())
+        d += timedelta(days=1)
+    os.makedirs(katalog, exist_ok=True)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=watki) as pula:
+        sciezki = list(pula.map(partial(pobierz_archiwum, katalog=katalog), dni))
+    pliki = [(dzien, sc) for dzien, sc in zip(dni, sciezki) if sc]
+    t1 = time.perf_counter()
+    log.info(f"Backfill {od}..{do}: {len(pliki)}/{len(dni)} dni z komunikatem, pobieranie {t1-t0:.1f}s")
+
+    # Klucze HZS dziela jeden URL laviny.sk - parsujemy raz na region_key
+    regiony = defaultdict(list)
+    for key, meta in ZRODLA.items():
+        if meta["parser"] == "laviny_sk":
+            regiony[meta.get("region_key", "tatry")].append(key)
+
+    now_iso = datetime.now(timezone.utc).isoformat(timespec="minutes")
+    wiersze = []
+    procesy = procesy or os.cpu_count() or 1
+    # Robotnicy tylko na WARNING - inaczej linia logu na kazdy sparsowany dzien
+    with ProcessPoolExecutor(max_workers=procesy, initializer=log.setLevel,
+                             initargs=(logging.WARNING,)) as pula:
+        for region_key, klucze in regiony.items():
+            wyniki = pula.map(partial(parsuj_plik, region_key=region_key),
+                              [sc for _, sc in pliki],
+                              chunksize=max(1, len(pliki) // (4 * procesy)))
+            for (dzien, _), dane in zip(pliki, wyniki):
+                if dane and dane.get("stopien"):
+                    wiersze.extend(_wiersz(key, dzien, dane, now_iso) for key in klucze)
+    t2 = time.perf_counter()
+
+    conn = get_db()
+    with conn:
+        for dzien, sciezka in pliki:
+            with open(sciezka, "rb") as f:
+                tresc = f.read()
+            for key in (k for klucze in regiony.values() for k in klucze):
+                archiwum.zapisz(conn, "lawiny", key, dzien, tresc, LAVINY_SK_URL.replace("{date}", dzien),
+                                kodowanie="utf-8")   # jak parsuj_plik
+        conn.executemany(UPSERT_SQL, wiersze)
+    conn.close()
+    log.info(f"Backfill: {len(wiersze)} wierszy w avalanche_bulletins "
+             f"(parsowanie {t2-t1:.1f}s, zapis {time.perf_counter()-t2:.2f}s)")
+    return len(wiersze)
+
+
 # -- Live JSON (bez DB) ---------------------------------------------------------
 
 def fetch_live_json(output_path="avalanche_data.json"):
@@ -386,6 +385,7 @@ def fetch_live_json(output_path="avalanche_data.json"):
     except Exception:
         result = {}
 
+    zmienione = False
     for key, meta in ZRODLA.items():
         if key not in result:
             result[key] = {
@@ -393,11 +393,17 @@ def fetch_live_json(output_path="avalanche_data.json"):
                 "series": {},
                 "last_updated": None,
             }
-        dane = pobierz_biuletyn(key, meta)
-        if dane and dane.get("stopien"):
+            zmienione = True
+        dane, _ = pobierz_biuletyn(key, meta)
+        if dane and dane.get("stopien") and result[key]["series"].get(today) != dane:
             result[key]["series"][today] = dane
             result[key]["last_updated"]  = now_iso
+            zmienione = True
+    zapisz_cache()
 
+    if not zmienione:
+        log.info(f"Komunikaty bez zmian - {output_path} nie jest przepisywany")
+        return result
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(result, f, ensure_ascii=False, indent=2)
     log.info(f"Live avalanche JSON zapisany: {output_path}")
@@ -411,11 +417,36 @@ def collect_and_export(output_path="avalanche_data.json"):
     conn  = get_db()
 
     for key, meta in ZRODLA.items():
-        dane = pobierz_biuletyn(key, meta)
+        dane, _ = pobierz_biuletyn(key, meta)
         if dane:
+            archiwizuj(conn, key, meta, today)
             upsert_biuletyn(conn, key, today, dane)
+    zapisz_cache()
+    conn.close()
+    export_json(output_path)
+
+
+def reparse():
+    """Odbudowuje avalanche_bulletins z archiwum surowych komunikatow - bez sieci."""
+    conn    = get_db()
+    now_iso = datetime.now(timezone.utc).isoformat(timespec="minutes")
+    wiersze = []
+    # Tekst zdekodowany tym samym kodowaniem co przy zbieraniu (raw_responses.encoding)
+    for key, dzien, html in archiwum.teksty(conn, "lawiny"):
+        meta = ZRODLA.get(key)
+        if not meta: continue
+        dane = parsuj(meta["parser"], html, meta.get("region_key", "tatry"))
+        # Jak w --backfill: komunikat bez stopnia nie nadpisuje wiersza w DB
+        if dane and dane.get("stopien"):
+            wiersze.append(_wiersz(key, dzien, dane, now_iso))
+    with conn:
+        conn.executemany(UPSERT_SQL, wiersze)
+    conn.close()
+    log.info(f"Reparse: {len(wiersze)} wierszy avalanche_bulletins z archiwum")
+
 
-    # Eksport
+def export_json(output_path="avalanche_data.json"):
+    conn    = get_db()
     series  = defaultdict(dict)
     updated = {}
     for row in conn.execute(
@@ -485,11 +516,22 @@ def main():
     p.add_argument("--report", action="store_true", help="Podglad DB")
     p.add_argument("--live",   action="store_true", help="Live JSON bez DB")
     p.add_argument("--test",   action="store_true", help="Debug parsera")
+    p.add_argument("--backfill", nargs=2, metavar=("OD", "DO"),
+                   help="Archiwum laviny.sk z zakresu dat (YYYY-MM-DD) do DB")
+    p.add_argument("--reparse", action="store_true", help="Odbuduj DB z archiwum surowych odpowiedzi")
+    p.add_argument("--watki",   type=int, default=8, help="Równoległe pobierania przy --backfill")
+    p.add_argument("--procesy", type=int, default=None, help="Procesy parsujące przy --backfill")
     args = p.parse_args()
 
     if args.report: report();         return
     if args.test:   test_parsers();   return
     if args.live:   fetch_live_json(); return
+    if args.export: export_json();     return
+    if args.reparse:
+        reparse(); export_json(); return
+    if args.backfill:
+        backfill(*args.backfill, watki=args.watki, procesy=args.procesy)
+        return
 
     collect_and_export()
 
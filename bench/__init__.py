@@ -0,0 +1 @@
+"""TATRY FLOW - benchmark offline (python bench/uruchom.py)"""
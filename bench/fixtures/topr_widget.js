@@ -0,0 +1,7 @@
+document.write( '<div class="widget-lawiny"><h3>Komunikat lawinowy TOPR</h3>
+<p><img src="https://lawiny.topr.pl/img/2.png" alt="stopień 2"/></p>
+<p>Zagrożenie określono jako: <b>Umiarkowane</b></p>
+<p>Obowiązuje do: 12.03.2026 20:00</p>
+<p>Stopień zagrożenia nie powinien ulec zmianie.</p>
+<p>Głównym problemem jest świeży śnieg nawiany przez silny wiatr z zachodu w żlebach i na stokach północnych powyżej 1800 m.</p>
+<p>TURYSTO! Twoje bezpieczeństwo zależy od Ciebie.</p></div>' );
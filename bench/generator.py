@@ -0,0 +1,378 @@
+"""
+TATRY FLOW - syntetyczne dane do testów skali
+
+Uzycie:
+  python bench/generator.py --segmenty 10000 --dni 730 --siatka 60 --wyjscie /tmp/tatry-10k
+  python bench/uruchom.py mapa eksport --dane /tmp/tatry-10k --skale 1
+
+Katalog wynikowy:
+  tatry_segments.db    kopia bazy z repo (albo pusty schemat, --pusta) + syntetyczne
+                       segmenty (id od ID_SEGMENTOW) z dzienną historią snapshotów
+  traffic_data.json    eksport z tej bazy (export_traffic_json z kolektora Strava)
+  weather_data.json,   kopie z repo - mapa potrzebuje kompletu plików
+  avalanche_data.json
+  fixtures/            komplet fixture'ów Odtwarzacza; overpass_*.json zastąpione
+                       syntetyczną siecią szlaków (siatka x siatka węzłów w parkach)
+
+Sieć: węzły siatki z losowym przesunięciem, waye między sąsiednimi węzłami
+(wspólne końcówki - filtr topologiczny widzi połączenia), kilka procent
+krawędzi usuniętych i kilka izolowanych "kikutów". Każdy wiersz i kolumna
+siatki to relacja hiking (część z osmc:symbol/network - trafia też do
+zapytania o szlaki oznakowane). Parki to dwa prostokąty: TPN na zachód
+od POLUDNIK_GRANICY, TANAP na wschód.
+
+Segmenty leżą na wayach sieci (polilinia Google z odcinka 1-3 kolejnych
+krawędzi relacji), więc złączenie przestrzenne w mapie je znajduje.
+Historia: liczba wejść dziennie z rozkładu Poissona z popularnością
+log-normalną, sezonem (szczyt w sierpniu) i weekendami; część dni
+bez zbioru (luki) i rzadkie korekty w dół, jak w prawdziwych danych.
+
+Ten sam --ziarno daje te same dane.
+"""
+
+import os
+import sys
+import json
+import time
+import runpy
+import shutil
+import sqlite3
+import argparse
+import contextlib
+from datetime import date, timedelta
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from bench.odtwarzacz import FIXTURES   # noqa: E402
+
+ID_SEGMENTOW = 10 ** 8     # syntetyczne segmenty nie kolidują z id Strava z bazy
+ID_WAYOW     = 10 ** 7
+ID_WEZLOW    = 10 ** 7
+ID_RELACJI   = 2 * 10 ** 7
+
+OBSZAR           = (49.15, 19.72, 49.30, 20.20)   # lat0, lon0, lat1, lon1 - siatka szlaków
+POLUDNIK_GRANICY = 19.96
+PARKI            = {"tpn": (91, "Tatrzański Park Narodowy"), "tanap": (92, "Tatranský národný park")}
+MARGINES_PARKU   = 0.01
+
+TYPY_DROG  = ["path", "path", "path", "footway", "track", "steps", "via_ferrata"]
+KOLORY     = ["red", "blue", "green", "yellow", "black"]
+NAZWY_KOL  = {"red": "czerwony", "blue": "niebieski", "green": "zielony",
+              "yellow": "żółty", "black": "czarny"}
+AKTYWNOSCI = (["hiking", "running", "walking"], [0.49, 0.50, 0.01])
+
+
+# ── Polilinia ─────────────────────────────────────────────────────────────────
+
+def _koduj_liczbe(v):
+    v = ~(v << 1) if v < 0 else v << 1
+    znaki = []
+    while v >= 0x20:
+        znaki.append(chr((0x20 | (v & 0x1f)) + 63))
+        v >>= 5
+    znaki.append(chr(v + 63))
+    return "".join(znaki)
+
+
+def koduj_polilinie(punkty, precyzja=5):
+    """Kodowanie Google (jak pole `points` ze Strava) z listy (lat, lon)."""
+    skala, wynik = 10 ** precyzja, []
+    poprz_lat = poprz_lon = 0
+    for lat, lon in punkty:
+        ilat, ilon = int(round(lat * skala)), int(round(lon * skala))
+        wynik.append(_koduj_liczbe(ilat - poprz_lat))
+        wynik.append(_koduj_liczbe(ilon - poprz_lon))
+        poprz_lat, poprz_lon = ilat, ilon
+    return "".join(wynik)
+
+
+def _dlugosc_m(punkty):
+    p = np.radians(np.asarray(punkty, dtype=float))
+    dlat, dlon = np.diff(p[:, 0]), np.diff(p[:, 1])
+    a = np.sin(dlat / 2) ** 2 + np.cos(p[:-1, 0]) * np.cos(p[1:, 0]) * np.sin(dlon / 2) ** 2
+    return float(np.sum(2 * 6371000 * np.arcsin(np.sqrt(a))))
+
+
+# ── Sieć szlaków ──────────────────────────────────────────────────────────────
+
+def _geom(punkty):
+    return [{"lat": round(float(a), 6), "lon": round(float(b), 6)} for a, b in punkty]
+
+
+def generuj_siec(rng, siatka=20, punktow_na_way=8, braki=0.05, kikuty=0.02):
+    """
+    Zwraca (waye, relacje): waye - {way_id: (punkty (k, 2), tagi)},
+    relacje - lista (rel_id, tagi, [way_id, ...]) w kolejności przebiegu.
+    """
+    lat0, lon0, lat1, lon1 = OBSZAR
+    dlat, dlon = (lat1 - lat0) / (siatka - 1), (lon1 - lon0) / (siatka - 1)
+    wezly = np.stack(np.meshgrid(np.linspace(lat0, lat1, siatka),
+                                 np.linspace(lon0, lon1, siatka), indexing="ij"), axis=-1)
+    wezly[..., 0] += rng.uniform(-0.25, 0.25, (siatka, siatka)) * dlat
+    wezly[..., 1] += rng.uniform(-0.25, 0.25, (siatka, siatka)) * dlon
+
+    waye, nr = {}, [0]
+
+    def nowy_way(a, b):
+        t = np.linspace(0, 1, punktow_na_way)[:, None]
+        punkty = a + (b - a) * t
+        # Zakosy: przesunięcie w poprzek odcinka, zerowe na końcach
+        wektor = np.array([-(b - a)[1], (b - a)[0]])
+        wektor /= max(np.linalg.norm(wektor), 1e-12)
+        amp = rng.uniform(0.02, 0.12) * np.linalg.norm(b - a)
+        fala = np.sin(np.pi * t * rng.integers(1, 4)) * amp + rng.normal(0, amp / 6, t.shape) * np.sin(np.pi * t)
+        punkty = punkty + fala * wektor
+        wid = ID_WAYOW + nr[0]
+        nr[0] += 1
+        tagi = {"highway": str(rng.choice(TYPY_DROG))}
+        if rng.random() < 0.3:
+            tagi["name"] = f"Ścieżka {wid - ID_WAYOW}"
+        waye[wid] = (punkty, tagi)
+        return wid
+
+    relacje = []
+    przebiegi = ([[wezly[i, j] for j in range(siatka)] for i in range(siatka)] +
+                 [[wezly[i, j] for i in range(siatka)] for j in range(siatka)])
+    for k, przebieg in enumerate(przebiegi):
+        way_ids = [nowy_way(a, b) for a, b in zip(przebieg, przebieg[1:]) if rng.random() >= braki]
+        if not way_ids:
+            continue
+        kolor = KOLORY[k % len(KOLORY)]
+        tagi = {"route": "hiking", "name": f"Szlak {NAZWY_KOL[kolor]} {k + 1}"}
+        los = rng.random()
+        if los < 0.5:
+            tagi["osmc:symbol"] = f"{kolor}:white:{kolor}_bar"
+        elif los < 0.7:
+            tagi["network"] = "lwn"
+        relacje.append((ID_RELACJI + k, tagi, way_ids))
+
+    # Izolowane kikuty (odcięte od sieci) w osobnej relacji - do usunięcia przez filtr topologiczny
+    stuby = []
+    for _ in range(int(len(waye) * kikuty)):
+        a = np.array([rng.uniform(lat0, lat1), rng.uniform(lon0, lon1)])
+        stuby.append(nowy_way(a, a + np.array([dlat, dlon]) * rng.uniform(0.1, 0.3, 2)))
+    if stuby:
+        relacje.append((ID_RELACJI + len(przebiegi), {"route": "hiking", "name": "Dojścia"}, stuby))
+    return waye, relacje
+
+
+def odpowiedz_overpass(waye, relacje):
+    elementy, wezel = [], ID_WEZLOW
+    for wid in dict.fromkeys(w for _, _, way_ids in relacje for w in way_ids):
+        punkty, tagi = waye[wid]
+        elementy.append({"type": "way", "id": wid, "nodes": list(range(wezel, wezel + len(punkty))),
+                         "geometry": _geom(punkty), "tags": tagi})
+        wezel += len(punkty)
+    for rid, tagi, way_ids in relacje:
+        elementy.append({"type": "relation", "id": rid, "tags": tagi,
+                         "members": [{"type": "way", "ref": w, "role": "", "geometry": _geom(waye[w][0])}
+                                     for w in way_ids]})
+    return {"version": 0.6, "generator": "bench/generator.py", "elements": elementy}
+
+
+def odpowiedz_parku(klucz):
+    rid, nazwa = PARKI[klucz]
+    lat0, lon0, lat1, lon1 = OBSZAR
+    lat0, lat1 = lat0 - MARGINES_PARKU, lat1 + MARGINES_PARKU
+    if klucz == "tpn":
+        lon0, lon1 = lon0 - MARGINES_PARKU, POLUDNIK_GRANICY
+    else:
+        lon0, lon1 = POLUDNIK_GRANICY, lon1 + MARGINES_PARKU
+    rogi = [(lat0, lon0), (lat0, lon1), (lat1, lon1), (lat1, lon0), (lat0, lon0)]
+    waye = [{"type": "way", "id": rid * 10 + i, "geometry": _geom(rogi[i:i + 2]), "tags": {}}
+            for i in range(4)]
+    relacja = {"type": "relation", "id": rid, "tags": {"name": nazwa, "boundary": "national_park"},
+               "members": [{"type": "way", "ref": w["id"], "role": "outer", "geometry": w["geometry"]}
+                           for w in waye]}
+    return {"version": 0.6, "elements": waye + [relacja]}
+
+
+def zapisz_fixtures(katalog, waye, relacje):
+    """Kopiuje fixture'y z repo i podmienia odpowiedzi Overpass na syntetyczne."""
+    os.makedirs(katalog, exist_ok=True)
+    for nazwa in os.listdir(FIXTURES):
+        if not nazwa.startswith("overpass"):
+            shutil.copy(os.path.join(FIXTURES, nazwa), katalog)
+    oznakowane = [r for r in relacje if "osmc:symbol" in r[1] or "network" in r[1]]
+    pliki = {
+        "overpass_hiking.json":     odpowiedz_overpass(waye, relacje),
+        "overpass_oznakowane.json": odpowiedz_overpass(waye, oznakowane),
+        "overpass_tpn.json":        odpowiedz_parku("tpn"),
+        "overpass_tanap.json":      odpowiedz_parku("tanap"),
+    }
+    for nazwa, dane in pliki.items():
+        with open(os.path.join(katalog, nazwa), "w", encoding="utf-8") as f:
+            json.dump(dane, f, ensure_ascii=False, separators=(",", ":"))
+
+
+# ── Segmenty i historia ───────────────────────────────────────────────────────
+
+def generuj_segmenty(rng, n, waye, relacje, dzien):
+    """Lista krotek do INSERT INTO segments (kolumny jak w upsert_segment kolektora)."""
+    przebiegi = [way_ids for _, tagi, way_ids in relacje if tagi.get("name") != "Dojścia"]
+    aktywnosci = rng.choice(AKTYWNOSCI[0], size=n, p=AKTYWNOSCI[1])
+    wiersze = []
+    for i in range(n):
+        way_ids = przebiegi[rng.integers(len(przebiegi))]
+        start   = int(rng.integers(len(way_ids)))
+        odcinek = way_ids[start:start + int(rng.integers(1, 4))]
+        punkty  = np.concatenate([waye[w][0] if k == 0 else waye[w][0][1:]
+                                  for k, w in enumerate(odcinek)])
+        a = int(rng.integers(0, len(punkty) // 2))
+        b = int(rng.integers(max(a + 2, len(punkty) // 2), len(punkty) + 1))
+        punkty    = punkty[a:b]
+        dystans   = round(_dlugosc_m(punkty), 1)
+        przewyzsz = round(float(rng.gamma(2.0, 40.0)), 1)
+        nachylenie = round(100 * przewyzsz / max(dystans, 1), 1)
+        wiersze.append((
+            ID_SEGMENTOW + i, f"Syntetyczny {aktywnosci[i]} {i + 1}", str(aktywnosci[i]),
+            float(punkty[0, 0]), float(punkty[0, 1]), float(punkty[-1, 0]), float(punkty[-1, 1]),
+            int(min(5, przewyzsz // 60)), nachylenie, przewyzsz, dystans,
+            json.dumps(koduj_polilinie(punkty)), None, dzien, dzien,
+        ))
+    return wiersze
+
+
+def historia_segmentu(rng, dni, sezon, luki=0.1, korekty=0.01):
+    """
+    (indeksy dni ze snapshotem, effort_count, athlete_count) - liczniki narastające
+    od losowego dnia pierwszego zbioru do końca okresu.
+    """
+    n = len(sezon)
+    pierwszy = 0 if rng.random() < 0.6 else int(rng.integers(0, n - 1))
+    popularnosc = rng.lognormal(mean=1.0, sigma=1.2)
+    dziennie = rng.poisson(popularnosc * sezon[pierwszy:])
+    korekta  = np.where(rng.random(n - pierwszy) < korekty, -rng.integers(1, 4, n - pierwszy), 0)
+    start    = int(rng.lognormal(mean=7.0, sigma=1.3))
+    efforty  = start + np.cumsum(dziennie + korekta)
+    atleci   = int(start * rng.uniform(0.3, 0.7)) + np.cumsum(rng.binomial(dziennie, 0.6))
+    zbior    = rng.random(n - pierwszy) >= luki
+    zbior[-1] = True   # ostatni dzień zawsze zebrany - eksport bierze ostatni snapshot
+    idx = np.nonzero(zbior)[0]
+    return idx + pierwszy, np.maximum(efforty[idx], 0), atleci[idx]
+
+
+def krzywa_sezonu(daty):
+    """Mnożnik ruchu na dzień: szczyt w sierpniu, zima ~0.2, weekend x1.8."""
+    doy = np.array([d.timetuple().tm_yday for d in daty])
+    sezon = 0.2 + 0.8 * (0.5 + 0.5 * np.cos(2 * np.pi * (doy - 220) / 365.25)) ** 2
+    weekend = np.array([d.weekday() >= 5 for d in daty])
+    return sezon * np.where(weekend, 1.8, 1.0)
+
+
+# ── Baza ──────────────────────────────────────────────────────────────────────
+
+def przygotuj_baze(zrodlo, cel, pusta=False):
+    """Kopia bazy przez backup API (uwzględnia WAL) albo sam schemat źródła."""
+    if os.path.exists(cel):
+        os.remove(cel)
+    src = sqlite3.connect(zrodlo)
+    dst = sqlite3.connect(cel)
+    if pusta:
+        for (sql,) in src.execute("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL "
+                                  "AND name NOT LIKE 'sqlite_%' ORDER BY type = 'view', rowid"):
+            dst.execute(sql)
+        dst.commit()
+    else:
+        src.backup(dst)
+    src.close()
+    return dst
+
+
+def wypelnij_baze(conn, rng, segmenty, dni, koniec, luki):
+    daty  = [koniec - timedelta(days=dni - 1 - k) for k in range(dni)]
+    iso   = [d.isoformat() for d in daty]
+    sezon = krzywa_sezonu(daty)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    n_snap = 0
+    with conn:
+        conn.executemany("""
+            INSERT INTO segments
+                (id, name, activity_type, start_lat, start_lng,
+                 end_lat, end_lng, climb_category, avg_grade,
+                 elev_difference, distance, polyline, osm_way_id, first_seen, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, segmenty)
+        for seg in segmenty:
+            idx, efforty, atleci = historia_segmentu(rng, dni, sezon, luki)
+            conn.execute("UPDATE segments SET first_seen = ?, last_seen = ? WHERE id = ?",
+                         (iso[idx[0]], iso[idx[-1]], seg[0]))
+            conn.executemany("""
+                INSERT INTO snapshots (segment_id, captured_at, effort_count, athlete_count)
+                VALUES (?, ?, ?, ?)
+            """, zip([seg[0]] * len(idx), [iso[i] for i in idx], efforty.tolist(), atleci.tolist()))
+            n_snap += len(idx)
+    conn.execute("PRAGMA journal_mode=WAL")   # jak baza kolektora
+    return n_snap
+
+
+def eksportuj_traffic(katalog):
+    """export_traffic_json kolektora Strava na wygenerowanej bazie."""
+    stary_cwd, stary_argv, stare_db = os.getcwd(), list(sys.argv), os.environ.get("DB_PATH")
+    os.chdir(katalog)
+    os.environ["DB_PATH"] = os.path.join(katalog, "tatry_segments.db")
+    sys.argv = ["Strava API fetcher.py", "--export"]
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            runpy.run_path(os.path.join(REPO, "Strava API fetcher.py"), run_name="__main__")
+    finally:
+        os.chdir(stary_cwd)
+        sys.argv = stary_argv
+        if stare_db is None:
+            os.environ.pop("DB_PATH", None)
+        else:
+            os.environ["DB_PATH"] = stare_db
+
+
+def main():
+    p = argparse.ArgumentParser(description="Tatry Flow — generator danych syntetycznych")
+    p.add_argument("--wyjscie",   required=True, help="Katalog wynikowy")
+    p.add_argument("--segmenty",  type=int, default=10000, help="Liczba syntetycznych segmentów")
+    p.add_argument("--dni",       type=int, default=365, help="Długość historii snapshotów")
+    p.add_argument("--siatka",    type=int, default=40, help="Węzłów na bok siatki szlaków")
+    p.add_argument("--punkty",    type=int, default=8, help="Punktów geometrii na way")
+    p.add_argument("--luki",      type=float, default=0.1, help="Ułamek dni bez zbioru")
+    p.add_argument("--koniec",    help="Ostatni dzień historii (YYYY-MM-DD, domyślnie ostatni snapshot bazy)")
+    p.add_argument("--baza",      default=os.path.join(REPO, "tatry_segments.db"), help="Baza źródłowa")
+    p.add_argument("--pusta",     action="store_true", help="Tylko schemat bazy źródłowej, bez jej danych")
+    p.add_argument("--bez-eksportu", action="store_true", help="Nie generuj traffic_data.json")
+    p.add_argument("--ziarno",    type=int, default=1)
+    args = p.parse_args()
+
+    rng = np.random.default_rng(args.ziarno)
+    os.makedirs(args.wyjscie, exist_ok=True)
+    t0 = time.perf_counter()
+
+    waye, relacje = generuj_siec(rng, args.siatka, args.punkty)
+    zapisz_fixtures(os.path.join(args.wyjscie, "fixtures"), waye, relacje)
+    print(f"Sieć: {len(waye)} wayów, {len(relacje)} relacji ({time.perf_counter() - t0:.1f} s)")
+
+    conn = przygotuj_baze(args.baza, os.path.join(args.wyjscie, "tatry_segments.db"), args.pusta)
+    if args.koniec:
+        koniec = date.fromisoformat(args.koniec)
+    else:
+        ostatni = conn.execute("SELECT MAX(captured_at) FROM snapshots").fetchone()[0]
+        koniec  = date.fromisoformat(ostatni) if ostatni else date.today()
+    segmenty = generuj_segmenty(rng, args.segmenty, waye, relacje, koniec.isoformat())
+    n_snap = wypelnij_baze(conn, rng, segmenty, args.dni, koniec, args.luki)
+    conn.close()
+    rozmiar = os.path.getsize(os.path.join(args.wyjscie, "tatry_segments.db")) // (1024 * 1024)
+    print(f"Baza: {len(segmenty)} segmentów, {n_snap} snapshotów do {koniec}, {rozmiar} MB "
+          f"({time.perf_counter() - t0:.1f} s)")
+
+    for nazwa in ("weather_data.json", "avalanche_data.json"):
+        if os.path.exists(os.path.join(REPO, nazwa)):
+            shutil.copy(os.path.join(REPO, nazwa), args.wyjscie)
+    if not args.bez_eksportu:
+        t1 = time.perf_counter()
+        eksportuj_traffic(os.path.abspath(args.wyjscie))
+        print(f"traffic_data.json: {os.path.getsize(os.path.join(args.wyjscie, 'traffic_data.json')) // 1024} KB "
+              f"({time.perf_counter() - t1:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
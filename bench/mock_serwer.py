@@ -0,0 +1,277 @@
+"""
+TATRY FLOW - lokalny serwer zastępujący Strava, IMGW, Open-Meteo, TOPR, laviny.sk i Overpass
+
+Uzycie:
+  python bench/mock_serwer.py                           # 127.0.0.1:8787, fixture'y z bench/fixtures
+  python bench/mock_serwer.py --port 9000 --skala 10 --bledy 0.05 --tempo 0.1
+  eval "$(python bench/mock_serwer.py --tylko-env)"     # ustaw zmienne *_URL w powłoce
+
+Serwer odpowiada pod ścieżką /<host oryginału>/<ścieżka oryginału>, np.
+http://127.0.0.1:8787/danepubliczne.imgw.pl/api/data/synop - trasy i treść
+(w tym skalowanie) są te same co w Odtwarzaczu (bench/odtwarzacz.py).
+Przy starcie drukuje zmienne środowiska, które przestawiają skrypty na serwer:
+STRAVA_API_URL, STRAVA_TOKEN_URL, IMGW_URL, OM_FORECAST_URL, OM_ARCHIVE_URL,
+TOPR_URL, LAVINY_SK_URL, OVERPASS_URL.
+
+Symulowane zachowanie serwisów:
+  limity    - Strava: okno --okno s z limitem --limit żądań (nagłówki
+              X-RateLimit-Limit/Usage/Reset jak w API), po przekroczeniu 429;
+              Overpass: --sloty równoczesnych zapytań, nadmiarowe dostają 429
+  opóźnienia - rozkład log-normalny na trasę (p50/p95 w OPOZNIENIA_MS),
+              mnożone przez --tempo (0 = bez opóźnień)
+  błędy     - z prawdopodobieństwem --bledy: 500/502/503, zerwane połączenie
+              albo ucięte ciało odpowiedzi
+  ETag      - każda odpowiedź 200 ma ETag z treści; If-None-Match z tym
+              samym ETagiem dostaje 304 bez ciała
+
+Losowanie jest deterministyczne: zależy od --ziarno, trasy i numeru żądania
+na tej trasie, nie od przeplotu wątków. GET /_statystyki zwraca liczniki.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, unquote_plus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from bench.odtwarzacz import Odtwarzacz, trasa_dla, FIXTURES, TRASY   # noqa: E402
+
+# Zmienna środowiska -> oryginalny adres (serwer wystawia go pod /<host>/<ścieżka>)
+ADRESY = {
+    "STRAVA_API_URL":   "https://www.strava.com/api/v3",
+    "STRAVA_TOKEN_URL": "https://www.strava.com/oauth/token",
+    "IMGW_URL":         "https://danepubliczne.imgw.pl/api/data/synop",
+    "OM_FORECAST_URL":  "https://api.open-meteo.com/v1/forecast",
+    "OM_ARCHIVE_URL":   "https://archive-api.open-meteo.com/v1/archive",
+    "TOPR_URL":         "https://lawiny.topr.pl/getwidget",
+    "LAVINY_SK_URL":    "https://static.laviny.sk/simple/{date}/SK_sk.html",
+    "OVERPASS_URL":     "https://overpass-api.de/api/interpreter",
+}
+
+# trasa (prefiks) -> (p50 ms, p95 ms)
+OPOZNIENIA_MS = {
+    "strava":    (150, 600),
+    "imgw":      (80, 300),
+    "openmeteo": (60, 250),
+    "topr":      (100, 400),
+    "laviny":    (120, 500),
+    "overpass":  (1500, 6000),
+}
+
+BLEDY = ("500", "502", "503", "zerwane", "uciete")
+
+
+def zmienne_srodowiska(baza):
+    baza = baza.rstrip("/")
+    return {k: baza + "/" + v.split("://", 1)[1] for k, v in ADRESY.items()}
+
+
+def _grupa(trasa):
+    return trasa.split("_")[0]
+
+
+class StanSerwera:
+    """Konfiguracja i liczniki współdzielone przez wątki serwera."""
+
+    def __init__(self, skala=1, katalog=FIXTURES, ziarno=1, tempo=1.0, bledy=0.0,
+                 limit=100, okno=900, sloty=2):
+        self.odt    = Odtwarzacz(skala, katalog)   # tylko treść odpowiedzi, bez podmiany requests
+        self.ziarno = ziarno
+        self.tempo  = tempo
+        self.bledy  = bledy
+        self.limit  = limit
+        self.okno   = okno
+        self.sloty  = sloty
+        self.lock   = threading.Lock()
+        self.numery = {}        # trasa -> liczba żądań (do deterministycznego losowania)
+        self.staty  = {"zadania": {}, "429": 0, "304": 0, "bledy": {}, "bajty": 0}
+        self._okno_start = time.time()
+        self._w_oknie    = 0
+        self._overpass   = 0    # zajęte sloty Overpass
+
+    def los(self, trasa):
+        with self.lock:
+            n = self.numery[trasa] = self.numery.get(trasa, 0) + 1
+            self.staty["zadania"][trasa] = n
+        return random.Random(zlib.crc32(f"{self.ziarno}:{trasa}:{n}".encode()))
+
+    def licz(self, klucz, podklucz=None, ile=1):
+        with self.lock:
+            if podklucz is None:
+                self.staty[klucz] += ile
+            else:
+                self.staty[klucz][podklucz] = self.staty[klucz].get(podklucz, 0) + ile
+
+    def limit_strava(self):
+        """(przekroczony, nagłówki) dla żądania Strava w bieżącym oknie."""
+        with self.lock:
+            teraz = time.time()
+            if teraz - self._okno_start >= self.okno:
+                self._okno_start, self._w_oknie = teraz, 0
+            self._w_oknie += 1
+            uzycie = self._w_oknie
+            reset  = int(self._okno_start + self.okno)
+        naglowki = {
+            "X-RateLimit-Limit": f"{self.limit},{self.limit * 10}",
+            "X-RateLimit-Usage": f"{uzycie},{uzycie}",
+            "X-RateLimit-Reset": str(reset),
+        }
+        if uzycie > self.limit:
+            naglowki["Retry-After"] = str(max(0, reset - int(time.time())))
+            return True, naglowki
+        return False, naglowki
+
+    def zajmij_slot(self):
+        with self.lock:
+            if self._overpass >= self.sloty:
+                return False
+            self._overpass += 1
+            return True
+
+    def zwolnij_slot(self):
+        with self.lock:
+            self._overpass -= 1
+
+    def opoznienie_s(self, trasa, rng):
+        p50, p95 = OPOZNIENIA_MS.get(_grupa(trasa), (50, 200))
+        if self.tempo <= 0:
+            return 0.0
+        sigma = math.log(p95 / p50) / 1.645
+        return rng.lognormvariate(math.log(p50), sigma) / 1000 * self.tempo
+
+
+class Obsluga(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stan = None   # StanSerwera, ustawiany w uruchom()
+
+    def log_message(self, fmt, *args):   # bez logu każdego żądania na stderr
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/_statystyki"):
+            with self.stan.lock:
+                tresc = json.dumps(self.stan.staty, ensure_ascii=False).encode("utf-8")
+            return self._wyslij(200, tresc, "application/json")
+        self._obsluz(None)
+
+    def do_POST(self):
+        dlugosc = int(self.headers.get("Content-Length") or 0)
+        cialo   = self.rfile.read(dlugosc).decode("utf-8", errors="replace") if dlugosc else ""
+        self._obsluz(unquote_plus(cialo))
+
+    def _wyslij(self, status, tresc, typ, naglowki=None, uciete=False):
+        self.send_response(status)
+        self.send_header("Content-Type", typ)
+        self.send_header("Content-Length", str(len(tresc)))
+        for k, v in (naglowki or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if uciete:
+            self.wfile.write(tresc[:len(tresc) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(tresc)
+
+    def _obsluz(self, cialo):
+        sciezka = urlsplit(self.path).path
+        trasa   = trasa_dla(sciezka, cialo)
+        if trasa is None:
+            return self._wyslij(404, b"nieznana trasa", "text/plain")
+        stan, rng = self.stan, self.stan.los(trasa)
+        naglowki  = {}
+        slot      = False
+
+        if trasa.startswith("strava") and trasa != "strava_token":
+            przekroczony, naglowki = stan.limit_strava()
+            if przekroczony:
+                stan.licz("429")
+                return self._wyslij(429, b'{"message":"Rate Limit Exceeded"}', "application/json", naglowki)
+        if trasa.startswith("overpass"):
+            slot = stan.zajmij_slot()
+            if not slot:
+                stan.licz("429")
+                return self._wyslij(429, b"Too Many Requests", "text/plain", {"Retry-After": "5"})
+        try:
+            time.sleep(stan.opoznienie_s(trasa, rng))
+            if rng.random() < stan.bledy:
+                blad = rng.choice(BLEDY)
+                stan.licz("bledy", blad)
+                if blad == "zerwane":
+                    self.close_connection = True
+                    return
+                if blad != "uciete":
+                    return self._wyslij(int(blad), b"Server Error", "text/plain", naglowki)
+            else:
+                blad = None
+            if trasa == "strava_segment":
+                tresc = stan.odt._segment(int(TRASY[2][1].search(sciezka).group(1)))
+            else:
+                tresc = stan.odt.tresc(trasa)
+            etag = '"' + hashlib.sha256(tresc).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == etag and blad is None:
+                stan.licz("304")
+                return self._wyslij(304, b"", "text/plain", dict(naglowki, ETag=etag))
+            stan.licz("bajty", ile=len(tresc))
+            typ = "text/html; charset=utf-8" if trasa in ("laviny_sk", "topr_widget") else "application/json"
+            self._wyslij(200, tresc, typ, dict(naglowki, ETag=etag), uciete=(blad == "uciete"))
+        finally:
+            if slot:
+                stan.zwolnij_slot()
+
+
+def uruchom(host="127.0.0.1", port=8787, **konfig):
+    """Startuje serwer w wątku tła; zwraca (serwer, zmienne środowiska). serwer.shutdown() kończy."""
+    obsluga = type("ObslugaZStanem", (Obsluga,), {"stan": StanSerwera(**konfig)})
+    serwer  = ThreadingHTTPServer((host, port), obsluga)
+    serwer.daemon_threads = True
+    threading.Thread(target=serwer.serve_forever, daemon=True).start()
+    host, port = serwer.server_address[:2]
+    return serwer, zmienne_srodowiska(f"http://{host}:{port}")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Tatry Flow — lokalny serwer zastępczy API")
+    p.add_argument("--host",   default="127.0.0.1")
+    p.add_argument("--port",   type=int, default=8787)
+    p.add_argument("--skala",  type=int, default=1, help="Mnożnik danych jak w bench/uruchom.py")
+    p.add_argument("--fixtures", default=FIXTURES, help="Katalog fixture'ów (np. z bench/generator.py)")
+    p.add_argument("--ziarno", type=int, default=1)
+    p.add_argument("--tempo",  type=float, default=1.0, help="Mnożnik opóźnień (0 = bez)")
+    p.add_argument("--bledy",  type=float, default=0.0, help="Prawdopodobieństwo błędu na żądanie")
+    p.add_argument("--limit",  type=int, default=100, help="Limit żądań Strava na okno")
+    p.add_argument("--okno",   type=int, default=900, help="Okno limitu Strava w sekundach")
+    p.add_argument("--sloty",  type=int, default=2, help="Równoczesne zapytania Overpass")
+    p.add_argument("--tylko-env", action="store_true", help="Wypisz zmienne środowiska i zakończ")
+    args = p.parse_args()
+
+    if args.tylko_env:
+        for k, v in zmienne_srodowiska(f"http://{args.host}:{args.port}").items():
+            print(f"export {k}='{v}'")
+        return
+
+    serwer, env = uruchom(args.host, args.port, skala=args.skala, katalog=args.fixtures,
+                          ziarno=args.ziarno, tempo=args.tempo, bledy=args.bledy,
+                          limit=args.limit, okno=args.okno, sloty=args.sloty)
+    print(f"Serwer zastępczy na http://{args.host}:{args.port} (Ctrl+C kończy). Zmienne środowiska:")
+    for k, v in env.items():
+        print(f"  export {k}='{v}'")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        serwer.shutdown()
+        print(json.dumps(serwer.RequestHandlerClass.stan.staty, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+TATRY FLOW - odtwarzanie nagranych odpowiedzi HTTP (bench)
+
+Odtwarzacz podmienia requests.get / requests.post (i time.sleep) w bieżącym
+procesie, więc kolektory i Tatroteka.py działają bez zmian, a odpowiedzi
+przychodzą z plików w bench/fixtures/. Trasa wybierana jest po URL-u
+(i po treści zapytania dla Overpass).
+
+Skala N mnoży dane: elementy Overpass, segmenty Strava i stacje IMGW są
+powielane N razy z przesunięciem id (SKOK_ID), a strony lawinowe mają
+N-krotnie powtórzoną treść - parsery i filtry dostają N razy więcej pracy.
+
+Tryb nagrywania (Nagrywarka) przepuszcza żądania do prawdziwych serwisów
+i zapisuje pierwszą odpowiedź każdej trasy jako fixture.
+"""
+
+import io
+import os
+import re
+import json
+import time
+import zlib
+from datetime import date
+from urllib.parse import urlencode
+
+import requests
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SKOK_ID  = 10 ** 9    # przesunięcie id kolejnych kopii przy skalowaniu
+
+# (nazwa trasy, wzorzec URL) - pierwsze dopasowanie wygrywa
+TRASY = [
+    ("strava_token",   re.compile(r"strava\.com/oauth/token")),
+    ("strava_explore", re.compile(r"/segments/explore")),
+    ("strava_segment", re.compile(r"/segments/(\d+)")),
+    ("imgw_synop",     re.compile(r"imgw\.pl/api/data/synop")),
+    ("openmeteo",      re.compile(r"open-meteo\.com")),
+    ("topr_widget",    re.compile(r"lawiny\.topr\.pl")),
+    ("laviny_sk",      re.compile(r"laviny\.sk")),
+    ("overpass",       re.compile(r"/api/interpreter")),
+]
+
+PLIKI = {
+    "strava_token":   "strava_token.json",
+    "strava_explore": "strava_explore.json",
+    "strava_segment": "strava_segment.json",
+    "imgw_synop":     "imgw_synop.json",
+    "openmeteo":      "openmeteo.json",
+    "topr_widget":    "topr_widget.js",
+    "laviny_sk":      "laviny_sk.html",
+}
+
+
+def trasa_dla(url, data=None):
+    for nazwa, wzorzec in TRASY:
+        if wzorzec.search(url):
+            if nazwa == "overpass":
+                return _trasa_overpass(data or "")
+            return nazwa
+    return None
+
+
+def _trasa_overpass(query):
+    if "Tatrzański" in query:
+        return "overpass_tpn"
+    if "Tatranský" in query:
+        return "overpass_tanap"
+    if "osmc:symbol" in query:
+        return "overpass_oznakowane"
+    return "overpass_hiking"
+
+
+def plik_trasy(trasa):
+    return PLIKI.get(trasa, trasa + ".json")
+
+
+# -- Skalowanie -------------------------------------------------------------------
+
+def skaluj_overpass(dane, n):
+    if n <= 1:
+        return dane
+    elementy = []
+    for k in range(n):
+        for el in dane.get("elements", []):
+            kopia = dict(el, id=el["id"] + k * SKOK_ID)
+            if "members" in el:
+                kopia["members"] = [dict(m, ref=m["ref"] + k * SKOK_ID) for m in el["members"]]
+            elementy.append(kopia)
+    return dict(dane, elements=elementy)
+
+
+def skaluj_liste(lista, n, klucz, jako_tekst=False):
+    wynik = []
+    for k in range(n):
+        for el in lista:
+            stare = int(el[klucz])
+            nowe  = stare + k * SKOK_ID
+            wynik.append(dict(el, **{klucz: str(nowe) if jako_tekst else nowe}))
+    return wynik
+
+
+def skaluj_html(tekst, n):
+    """Powiela treść <body> (albo całość) n razy - parser przechodzi n razy więcej tekstu."""
+    if n <= 1:
+        return tekst
+    m = re.search(r"(<body[^>]*>)(.*)(</body>)", tekst, re.DOTALL | re.IGNORECASE)
+    if not m:
+        return tekst * n
+    return tekst[:m.start(2)] + m.group(2) * n + tekst[m.end(2):]
+
+
+def skaluj_widget(tekst, n):
+    if n <= 1:
+        return tekst
+    m = re.search(r"^(\s*document\.write\s*\(\s*')(.*)('\s*\)\s*;?\s*)$", tekst, re.DOTALL)
+    if not m:
+        return tekst * n
+    return m.group(1) + m.group(2) * n + m.group(3)
+
+
+# -- Odpowiedzi -------------------------------------------------------------------
+
+def _odpowiedz(url, tresc, status=200, typ="application/json"):
+    r = requests.models.Response()
+    r.status_code = status
+    r.url         = url
+    r.raw         = io.BytesIO(tresc)
+    r.encoding    = "utf-8"
+    r.headers["Content-Type"] = typ
+    r.reason = "OK" if status == 200 else "Error"
+    return r
+
+
+class Odtwarzacz:
+    """
+    Kontekst podmieniający requests.get/post i time.sleep.
+    Statystyki: liczba żądań na trasę, bajty, suma "przespanego" czasu
+    oraz znaczniki czasu żądań (do opóźnień między kolejnymi wywołaniami).
+    """
+
+    def __init__(self, skala=1, katalog=FIXTURES):
+        self.skala    = skala
+        self.katalog  = katalog
+        self.zadania  = {}     # trasa -> liczba
+        self.bajty    = 0
+        self.sen_s    = 0.0
+        self.czasy    = []     # perf_counter każdego żądania
+        self.nieznane = []     # URL-e bez trasy
+        self._cache   = {}     # trasa -> bajty (po skalowaniu)
+        self._oryginaly = None
+
+    # -- Treść fixture'ów ---------------------------------------------------------
+
+    def _czytaj(self, trasa):
+        with open(os.path.join(self.katalog, plik_trasy(trasa)), encoding="utf-8") as f:
+            return f.read().replace("{DZIS}", date.today().isoformat())
+
+    def tresc(self, trasa):
+        if trasa in self._cache:
+            return self._cache[trasa]
+        tekst, n = self._czytaj(trasa), self.skala
+        if trasa.startswith("overpass"):
+            tekst = json.dumps(skaluj_overpass(json.loads(tekst), n), ensure_ascii=False)
+        elif trasa == "strava_explore":
+            dane = json.loads(tekst)
+            dane["segments"] = skaluj_liste(dane["segments"], n, "id")
+            tekst = json.dumps(dane, ensure_ascii=False)
+        elif trasa == "imgw_synop":
+            tekst = json.dumps(skaluj_liste(json.loads(tekst), n, "id_stacji", jako_tekst=True),
+                               ensure_ascii=False)
+        elif trasa == "laviny_sk":
+            tekst = skaluj_html(tekst, n)
+        elif trasa == "topr_widget":
+            tekst = skaluj_widget(tekst, n)
+        self._cache[trasa] = tekst.encode("utf-8")
+        return self._cache[trasa]
+
+    def _segment(self, segment_id):
+        """Szczegóły segmentu: szablon z podmienionym id i deterministycznym effort_count."""
+        dane = json.loads(self.tresc("strava_segment"))
+        los  = zlib.crc32(str(segment_id).encode())
+        dane["id"]            = segment_id
+        dane["effort_count"]  = dane.get("effort_count", 0) + los % 5000
+        dane["athlete_count"] = dane.get("athlete_count", 0) + los % 3000
+        return json.dumps(dane).encode("utf-8")
+
+    # -- Obsługa żądań ------------------------------------------------------------
+
+    def _obsluz(self, metoda, url, params=None, data=None, **kwargs):
+        self.czasy.append(time.perf_counter())
+        pelny = url + ("?" + urlencode(params) if params else "")
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", errors="replace")
+        trasa = trasa_dla(url, data if isinstance(data, str) else None)
+        if trasa is None:
+            self.nieznane.append(f"{metoda} {pelny}")
+            return _odpowiedz(pelny, b"", status=404, typ="text/plain")
+        self.zadania[trasa] = self.zadania.get(trasa, 0) + 1
+        if trasa == "strava_segment":
+            tresc = self._segment(int(TRASY[2][1].search(url).group(1)))
+        else:
+            tresc = self.tresc(trasa)
+        self.bajty += len(tresc)
+        typ = "text/html" if trasa in ("laviny_sk", "topr_widget") else "application/json"
+        return _odpowiedz(pelny, tresc, typ=typ)
+
+    def _get(self, url, params=None, **kwargs):
+        return self._obsluz("GET", url, params=params, **kwargs)
+
+    def _post(self, url, data=None, **kwargs):
+        return self._obsluz("POST", url, data=data, **kwargs)
+
+    def _spij(self, sekundy):
+        self.sen_s += sekundy
+
+    def __enter__(self):
+        self._oryginaly = (requests.get, requests.post, time.sleep)
+        requests.get, requests.post, time.sleep = self._get, self._post, self._spij
+        return self
+
+    def __exit__(self, *exc):
+        requests.get, requests.post, time.sleep = self._oryginaly
+        return False
+
+    def liczba_zadan(self):
+        return sum(self.zadania.values())
+
+
+class Nagrywarka:
+    """
+    Przepuszcza żądania do prawdziwych serwisów i zapisuje pierwszą
+    odpowiedź 200 każdej trasy do katalogu fixture'ów (bez skalowania),
+    poza tokenem Strava. Data dzisiejsza w treści zamieniana jest na {DZIS}.
+    """
+
+    def __init__(self, katalog=FIXTURES):
+        self.katalog   = katalog
+        self.zapisane  = set()
+        self._oryginaly = None
+
+    def _zapisz(self, trasa, r):
+        # Odpowiedź z tokenem OAuth nigdy nie trafia na dysk - zostaje ręczny fixture
+        if trasa in (None, "strava_token") or trasa in self.zapisane or r.status_code != 200:
+            return
+        tekst = r.content.decode("utf-8", errors="replace")
+        if trasa != "strava_token":
+            tekst = tekst.replace(date.today().isoformat(), "{DZIS}")
+        with open(os.path.join(self.katalog, plik_trasy(trasa)), "w", encoding="utf-8") as f:
+            f.write(tekst)
+        self.zapisane.add(trasa)
+        print(f"  nagrano: {trasa} ({len(tekst)} znaków)")
+
+    def _get(self, url, params=None, **kwargs):
+        r = self._oryginaly[0](url, params=params, **kwargs)
+        self._zapisz(trasa_dla(url), r)
+        return r
+
+    def _post(self, url, data=None, **kwargs):
+        kwargs.pop("stream", None)   # całe ciało potrzebne do zapisu
+        r = self._oryginaly[1](url, data=data, **kwargs)
+        self._zapisz(trasa_dla(url, data if isinstance(data, str) else None), r)
+        return r
+
+    def __enter__(self):
+        self._oryginaly = (requests.get, requests.post)
+        requests.get, requests.post = self._get, self._post
+        return self
+
+    def __exit__(self, *exc):
+        requests.get, requests.post = self._oryginaly
+        return False
@@ -0,0 +1,207 @@
+"""
+TATRY FLOW - benchmark kolektorów i budowy mapy bez sieci
+
+Uzycie:
+  python bench/uruchom.py                         # wszystkie scenariusze, skale 1, 10, 100
+  python bench/uruchom.py mapa lawiny --skale 1,10
+  python bench/uruchom.py --powtorzenia 3         # najlepszy z 3 przebiegów
+  python bench/uruchom.py strava --nagraj         # nagraj fixture'y z prawdziwych serwisów
+  python bench/uruchom.py mapa eksport --dane /tmp/tatry-10k --skale 1   # dane z bench/generator.py
+
+Każdy przebieg działa w osobnym katalogu tymczasowym (DB_PATH w nim, kopie
+bazy / *_data.json z repo albo z katalogu --dane z bench/generator.py),
+w tym samym procesie, z Odtwarzaczem zamiast sieci i bez time.sleep. Mierzone: czas ścienny i CPU, liczba żądań
+i bajtów, przepustowość (żądania/s, bajty/s), opóźnienie przetwarzania
+między kolejnymi żądaniami (p50/p95) oraz pominięty czas sleep.
+
+Wyniki dopisywane są do bench/wyniki.jsonl razem z hashem commita;
+przy każdym wyniku drukowana jest zmiana względem poprzedniego wpisu
+dla tego samego scenariusza i skali.
+"""
+
+import os
+import sys
+import json
+import time
+import runpy
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from bench.odtwarzacz import Odtwarzacz, Nagrywarka, FIXTURES   # noqa: E402
+
+WYNIKI = os.path.join(REPO, "bench", "wyniki.jsonl")
+
+# nazwa -> (skrypt, argumenty, pliki z repo / --dane kopiowane do katalogu przebiegu)
+SCENARIUSZE = {
+    "strava":   ("Strava API fetcher.py", [], []),
+    "imgw":     ("imgw fetcher.py",       [], []),
+    "lawiny":   ("avalanche fetcher.py",  [], []),
+    "archiwum": ("avalanche fetcher.py",  ["--backfill", "2025-11-01", "2026-04-30"], []),
+    "mapa":     ("Tatroteka.py",          [], ["traffic_data.json", "weather_data.json", "avalanche_data.json"]),
+    "eksport":  ("Strava API fetcher.py", ["--export"], ["tatry_segments.db"]),
+}
+
+
+def commit():
+    try:
+        return subprocess.run(["git", "-C", REPO, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _percentyl(wartosci, p):
+    if not wartosci:
+        return None
+    s = sorted(wartosci)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+
+@contextlib.contextmanager
+def katalog_przebiegu(pliki, zrodlo=REPO):
+    """Katalog tymczasowy jako cwd + DB_PATH w nim; przywraca stan po wyjściu."""
+    stary_cwd, stare_env, stary_argv = os.getcwd(), dict(os.environ), list(sys.argv)
+    katalog = tempfile.mkdtemp(prefix="tatry-bench-")
+    for nazwa in pliki:
+        if os.path.exists(os.path.join(zrodlo, nazwa)):
+            shutil.copy(os.path.join(zrodlo, nazwa), katalog)
+    os.chdir(katalog)
+    os.environ["DB_PATH"]   = os.path.join(katalog, "tatry_segments.db")
+    os.environ["LOG_LEVEL"] = os.environ.get("LOG_LEVEL", "WARNING")
+    try:
+        yield katalog
+    finally:
+        os.chdir(stary_cwd)
+        os.environ.clear()
+        os.environ.update(stare_env)
+        sys.argv = stary_argv
+        shutil.rmtree(katalog, ignore_errors=True)
+
+
+def uruchom_skrypt(skrypt, argv, gadatliwie=False):
+    """Wykonuje skrypt jak `python skrypt argv` w bieżącym procesie; zwraca kod wyjścia."""
+    sciezka  = os.path.join(REPO, skrypt)
+    sys.argv = [sciezka] + list(argv)
+    wyjscie  = contextlib.nullcontext() if gadatliwie else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with wyjscie:
+        try:
+            runpy.run_path(sciezka, run_name="__main__")
+        except SystemExit as e:
+            return e.code or 0
+    return 0
+
+
+def przebieg(nazwa, skala, gadatliwie=False, dane=None):
+    skrypt, argv, pliki = SCENARIUSZE[nazwa]
+    fixtures = os.path.join(dane, "fixtures") if dane else FIXTURES
+    with katalog_przebiegu(pliki, dane or REPO), Odtwarzacz(skala, fixtures) as odt:
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        kod = uruchom_skrypt(skrypt, argv, gadatliwie)
+        wall = time.perf_counter() - wall0
+        cpu  = time.process_time() - cpu0
+        koniec = time.perf_counter()
+    czasy = odt.czasy + [koniec]
+    przerwy_ms = [(b - a) * 1000 for a, b in zip(czasy, czasy[1:])]
+    n = odt.liczba_zadan()
+    return {
+        "scenariusz":   nazwa,
+        "skala":        skala,
+        "dane":         dane,
+        "kod":          kod,
+        "wall_s":       round(wall, 4),
+        "cpu_s":        round(cpu, 4),
+        "zadania":      n,
+        "bajty":        odt.bajty,
+        "zadania_s":    round(n / wall, 1) if wall > 0 else None,
+        "bajty_s":      round(odt.bajty / wall) if wall > 0 else None,
+        "lat_p50_ms":   round(_percentyl(przerwy_ms, 50), 3) if przerwy_ms else None,
+        "lat_p95_ms":   round(_percentyl(przerwy_ms, 95), 3) if przerwy_ms else None,
+        "sen_pominiety_s": round(odt.sen_s, 1),
+        "trasy":        odt.zadania,
+        "nieznane_url": odt.nieznane[:5],
+    }
+
+
+def poprzedni_wynik(path, nazwa, skala, dane=None):
+    if not os.path.exists(path):
+        return None
+    ostatni = None
+    with open(path, encoding="utf-8") as f:
+        for linia in f:
+            try:
+                w = json.loads(linia)
+            except ValueError:
+                continue
+            if w.get("scenariusz") == nazwa and w.get("skala") == skala and w.get("dane") == dane:
+                ostatni = w
+    return ostatni
+
+
+def nagraj(nazwy, katalog, gadatliwie=False):
+    os.makedirs(katalog, exist_ok=True)
+    for nazwa in nazwy:
+        skrypt, argv, pliki = SCENARIUSZE[nazwa]
+        print(f"Nagrywanie: {nazwa} -> {katalog}")
+        with katalog_przebiegu(pliki), Nagrywarka(katalog):
+            uruchom_skrypt(skrypt, argv, gadatliwie)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Tatry Flow — benchmark offline")
+    p.add_argument("scenariusze", nargs="*", default=[],
+                   help=f"Spośród: {', '.join(SCENARIUSZE)} (domyślnie wszystkie)")
+    p.add_argument("--skale",       default="1,10,100", help="Np. 1,10,100")
+    p.add_argument("--powtorzenia", type=int, default=1, help="Najlepszy (min wall) z N przebiegów")
+    p.add_argument("--wyniki",      default=WYNIKI, help="Plik JSONL z historią wyników")
+    p.add_argument("--bez-zapisu",  action="store_true", help="Nie dopisuj do pliku wyników")
+    p.add_argument("--nagraj",      action="store_true", help="Nagraj fixture'y z prawdziwych serwisów")
+    p.add_argument("--dane",        help="Katalog z bench/generator.py (baza, *_data.json, fixtures/)")
+    p.add_argument("--fixtures",    default=FIXTURES, help="Katalog fixture'ów dla --nagraj")
+    p.add_argument("-v", "--gadatliwie", action="store_true", help="Pokaż wyjście skryptów")
+    args = p.parse_args()
+
+    nazwy = args.scenariusze or list(SCENARIUSZE)
+    nieznane = [n for n in nazwy if n not in SCENARIUSZE]
+    if nieznane:
+        p.error(f"nieznane scenariusze: {', '.join(nieznane)}")
+    if args.nagraj:
+        nagraj(nazwy, args.fixtures, args.gadatliwie)
+        return
+
+    skale = [int(s) for s in args.skale.split(",") if s.strip()]
+    hash_ = commit()
+    print(f"{'scenariusz':<8} {'skala':>5} {'wall s':>9} {'CPU s':>8} {'żądania':>8} "
+          f"{'żąd./s':>9} {'p50 ms':>8} {'p95 ms':>8}  zmiana")
+    for nazwa in nazwy:
+        for skala in skale:
+            wyniki = [przebieg(nazwa, skala, args.gadatliwie, args.dane)
+                      for _ in range(max(1, args.powtorzenia))]
+            w = min(wyniki, key=lambda x: x["wall_s"])
+            w.update({
+                "commit": hash_,
+                "czas":   datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": sys.version.split()[0],
+                "powtorzenia": len(wyniki),
+            })
+            poprz = poprzedni_wynik(args.wyniki, nazwa, skala, args.dane)
+            zmiana = ""
+            if poprz and poprz.get("wall_s"):
+                zmiana = f"{(w['wall_s'] / poprz['wall_s'] - 1) * 100:+.1f}% vs {poprz.get('commit')}"
+            if w["kod"]:
+                zmiana += f" [kod wyjścia {w['kod']}]"
+            print(f"{nazwa:<8} {skala:>5} {w['wall_s']:>9.3f} {w['cpu_s']:>8.3f} {w['zadania']:>8} "
+                  f"{w['zadania_s'] or 0:>9.1f} {w['lat_p50_ms'] or 0:>8.2f} {w['lat_p95_ms'] or 0:>8.2f}  {zmiana}")
+            if not args.bez_zapisu:
+                with open(args.wyniki, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(w, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+TATRY FLOW - magazyn geometrii wayów
+
+Wszystkie współrzędne w jednej ciągłej tablicy float64 o kształcie (N, 2)
+(kolumny: lat, lon) + tablica offsetów: way nr i zajmuje wiersze
+offsety[i]:offsety[i+1]. punkty(way_id) zwraca widok (bez kopii) na ten
+fragment, więc filtr parków, długości, spatial join i rysowanie pracują
+na tych samych danych zamiast na listach krotek.
+
+Magazyn można zapisać do katalogu (.npy) i wczytać jako memory-map.
+
+Długości liczone są wektorowo (przybliżenie równoodległościowe, 1° = 111 km,
+poprawka cos(lat) dla długości geograficznej) - dla wszystkich wayów
+w jednym przebiegu po tablicy współrzędnych.
+
+Upraszczanie: Douglas-Peucker z tolerancją w metrach dobraną do zoomu
+(pół piksela Web Mercator), końce waya zawsze zostają - ciągłość na
+skrzyżowaniach nie jest psuta, a proste odcinki tracą zbędne punkty.
+"""
+
+import os
+import math
+from array import array
+
+import numpy as np
+
+_PUSTE = np.empty((0, 2), dtype=np.float64)
+_PUSTE.setflags(write=False)
+
+
+class MagazynGeometrii:
+
+    def __init__(self):
+        self._indeks  = {}               # way_id -> numer slotu
+        self._ids     = array("q")       # numer slotu -> way_id
+        self._offsety = array("q", [0])  # w punktach, nie w liczbach
+        self._bufor   = array("d")       # dopisywane lat, lon, lat, lon, ...
+        self._wsp     = _PUSTE           # zamrożona część (N, 2)
+
+    # -- Budowanie --------------------------------------------------------------
+
+    def dodaj(self, way_id, punkty):
+        """Dopisuje way z iterowalnej sekwencji par (lat, lon). Duplikaty pomijane."""
+        if way_id in self._indeks:
+            return
+        for lat, lon in punkty:
+            self._bufor.append(lat)
+            self._bufor.append(lon)
+        self._indeks[way_id] = len(self._ids)
+        self._ids.append(way_id)
+        self._offsety.append(len(self._wsp) + len(self._bufor) // 2)
+
+    def zamroz(self):
+        """Przenosi dopisane punkty do tablicy numpy (wołane automatycznie przy odczycie)."""
+        if not self._bufor:
+            return
+        nowe = np.frombuffer(self._bufor, dtype=np.float64).reshape(-1, 2)
+        self._wsp   = np.concatenate([self._wsp, nowe]) if len(self._wsp) else nowe.copy()
+        self._bufor = array("d")
+
+    def obetnij(self, n):
+        """Zostawia tylko n pierwszych wayów (wycofanie nieudanego pobierania)."""
+        self.zamroz()
+        for wid in self._ids[n:]:
+            del self._indeks[wid]
+        del self._ids[n:]
+        del self._offsety[n + 1:]
+        self._wsp = self._wsp[:self._offsety[-1]]
+
+    # -- Odczyt -----------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, way_id):
+        return way_id in self._indeks
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def punkty(self, way_id):
+        """Widok (k, 2) [lat, lon] na punkty waya; pusta tablica gdy brak."""
+        i = self._indeks.get(way_id)
+        if i is None:
+            return _PUSTE
+        self.zamroz()
+        return self._wsp[self._offsety[i]:self._offsety[i + 1]]
+
+    def koncowki(self, way_id):
+        """((lat, lon) początku, (lat, lon) końca) jako floaty, None dla pustego waya."""
+        pts = self.punkty(way_id)
+        if len(pts) == 0:
+            return None
+        return (float(pts[0, 0]), float(pts[0, 1])), (float(pts[-1, 0]), float(pts[-1, 1]))
+
+    @property
+    def wspolrzedne(self):
+        """Cała tablica (N, 2) - do operacji wektorowych na wszystkich wayach."""
+        self.zamroz()
+        return self._wsp
+
+    @property
+    def offsety(self):
+        return np.array(self._offsety, dtype=np.int64)
+
+    @property
+    def ids(self):
+        return np.array(self._ids, dtype=np.int64)
+
+    # -- Dysk -------------------------------------------------------------------
+
+    def zapisz(self, katalog):
+        os.makedirs(katalog, exist_ok=True)
+        np.save(os.path.join(katalog, "wspolrzedne.npy"), self.wspolrzedne)
+        np.save(os.path.join(katalog, "offsety.npy"),     self.offsety)
+        np.save(os.path.join(katalog, "ids.npy"),         self.ids)
+
+    @classmethod
+    def wczytaj(cls, katalog, mmap=True):
+        """Wczytuje magazyn zapisany przez zapisz(); współrzędne jako memory-map (tylko odczyt)."""
+        m = cls()
+        m._wsp = np.load(os.path.join(katalog, "wspolrzedne.npy"), mmap_mode="r" if mmap else None)
+        m._offsety = array("q", np.load(os.path.join(katalog, "offsety.npy")).tolist())
+        m._ids     = array("q", np.load(os.path.join(katalog, "ids.npy")).tolist())
+        m._indeks  = {wid: i for i, wid in enumerate(m._ids)}
+        return m
+
+
+# -- Długości -------------------------------------------------------------------
+
+def _odcinki_km(wsp):
+    """Długości kolejnych odcinków (N-1,) między punktami tablicy (N, 2)."""
+    lat, lon = wsp[:, 0], wsp[:, 1]
+    dlat = np.diff(lat) * 111
+    dlon = np.diff(lon) * 111 * np.cos(np.radians((lat[:-1] + lat[1:]) / 2))
+    return np.sqrt(dlat * dlat + dlon * dlon)
+
+
+def dlugosc_km(punkty):
+    """Długość linii (k, 2) [lat, lon] w km."""
+    if len(punkty) < 2:
+        return 0.0
+    return float(_odcinki_km(np.asarray(punkty, dtype=np.float64)).sum())
+
+
+def dlugosci_wayow(magazyn, miejsca=2):
+    """
+    Cache długości: way_id -> km (zaokrąglone jak w popupach) dla całego magazynu.
+    Odcinki łączące koniec jednego waya z początkiem następnego są liczone,
+    ale odpadają przy odejmowaniu sum narastających na granicach wayów.
+    """
+    wsp = magazyn.wspolrzedne
+    off = magazyn.offsety
+    if len(wsp) < 2:
+        return {int(wid): 0.0 for wid in magazyn.ids}
+    narast = np.concatenate([[0.0], np.cumsum(_odcinki_km(wsp))])
+    # pusty way na końcu magazynu ma offset == len(wsp) - przycięty daje 0.0
+    start  = np.minimum(off[:-1], len(narast) - 1)
+    stop   = np.maximum(off[1:] - 1, start)   # indeks ostatniego punktu waya
+    dl     = np.round(narast[stop] - narast[start], miejsca)
+    return dict(zip(magazyn.ids.tolist(), dl.tolist()))
+
+
+# -- Upraszczanie ---------------------------------------------------------------
+
+def tolerancja_m(zoom, piksele=0.5, lat=49.2):
+    """Rozmiar `piksele` pikseli Web Mercator na danym zoomie, w metrach."""
+    return piksele * 156543.03 * math.cos(math.radians(lat)) / 2 ** zoom
+
+
+def douglas_peucker(punkty, tolerancja):
+    """
+    Upraszcza linię (k, 2) [lat, lon] z tolerancją w metrach.
+    Odległość liczona do odcinka (nie prostej), więc zakosy i pętle
+    (początek == koniec) nie są spłaszczane. Zwraca nową tablicę.
+    """
+    n = len(punkty)
+    if n <= 2:
+        return np.array(punkty, dtype=np.float64)
+    kos = math.cos(math.radians(float(np.mean(punkty[:, 0]))))
+    xy = np.empty((n, 2))
+    xy[:, 0] = punkty[:, 1] * 111000 * kos
+    xy[:, 1] = punkty[:, 0] * 111000
+
+    zachowaj = np.zeros(n, dtype=bool)
+    zachowaj[0] = zachowaj[-1] = True
+    stos = [(0, n - 1)]
+    while stos:
+        a, b = stos.pop()
+        if b - a < 2:
+            continue
+        p, q = xy[a], xy[b]
+        wew  = xy[a + 1:b] - p
+        kier = q - p
+        l2   = float(kier @ kier)
+        if l2 > 0:
+            t = np.clip(wew @ kier / l2, 0.0, 1.0)
+            wew = wew - np.outer(t, kier)
+        odl = np.einsum("ij,ij->i", wew, wew)
+        i = int(np.argmax(odl))
+        if odl[i] > tolerancja * tolerancja:
+            k = a + 1 + i
+            zachowaj[k] = True
+            stos.append((a, k))
+            stos.append((k, b))
+    return punkty[zachowaj]
+
+
+def poziomy_szczegolowosci(punkty, zoomy):
+    """
+    zoom -> uproszczona linia; każdy poziom upraszczany z poprzedniego
+    (dokładniejszego), więc niższe zoomy pracują na coraz krótszych liniach.
+    """
+    lod = {}
+    biezace = punkty
+    for z in sorted(zoomy, reverse=True):
+        biezace = douglas_peucker(biezace, tolerancja_m(z))
+        lod[z] = biezace
+    return lod
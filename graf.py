@@ -0,0 +1,224 @@
+"""
+TATRY FLOW - graf sieci szlaków
+
+Węzły to punkty końcowe wayów (zaokrąglone do 5 miejsc, ~1 m), krawędzie
+to waye. Dwa waye są sąsiadami, gdy dzielą węzeł końcowy.
+
+Filtr topologiczny (przytnij) usuwa waye z mniej niż `min_sasiadow`
+sąsiadami metodą obierania z kolejką: utrzymuje liczbę żywych wayów
+w każdym węźle i ponownie sprawdza tylko waye przy węzłach, których
+stopień właśnie spadł - O(V+E) zamiast pełnych przebiegów w pętli.
+
+Krawędzie niosą długość (km) i dopasowany ruch Strava (effort_count,
+id segmentu), a graf razem z przynależnością do relacji zapisuje się do
+JSON (graf_szlakow.json). Wczytanie to tylko odbudowa list incydencji,
+więc analizy (obciążenie węzłów, najkrótsze ścieżki) nie muszą ponownie
+wyprowadzać topologii z surowego OSM.
+"""
+
+import json
+import heapq
+from collections import deque
+
+
+def klucz_wezla(lat, lon, precyzja=5):
+    return (round(lat, precyzja), round(lon, precyzja))
+
+
+class GrafSzlakow:
+
+    def __init__(self, precyzja=5):
+        self.precyzja   = precyzja
+        self.wezly      = {}   # (lat, lon) -> nr węzła
+        self.wsp_wezlow = []   # nr węzła -> (lat, lon)
+        self.incydencje = []   # nr węzła -> [way_id, ...] (bez powtórzeń)
+        self.krawedzie  = {}   # way_id -> (u, v)
+        self.dlugosc    = {}   # way_id -> km
+        self.ruch       = {}   # way_id -> effort_count dopasowanego segmentu (0 = brak)
+        self.segment    = {}   # way_id -> id segmentu Strava lub None
+        self.relacje    = {}   # relacja_id -> [way_id, ...] (tylko waye w grafie)
+
+    @classmethod
+    def z_magazynu(cls, magazyn, way_ids, precyzja=5):
+        """Graf z wayów `way_ids` magazynu geometrii (waye bez punktów są pomijane)."""
+        g = cls(precyzja)
+        for wid in way_ids:
+            koncowki = magazyn.koncowki(wid)
+            if koncowki:
+                g.dodaj_way(wid, *koncowki)
+        return g
+
+    def wezel(self, lat, lon):
+        klucz = klucz_wezla(lat, lon, self.precyzja)
+        nr = self.wezly.get(klucz)
+        if nr is None:
+            nr = self.wezly[klucz] = len(self.wsp_wezlow)
+            self.wsp_wezlow.append(klucz)
+            self.incydencje.append([])
+        return nr
+
+    def dodaj_way(self, wid, poczatek, koniec):
+        u = self.wezel(*poczatek)
+        v = self.wezel(*koniec)
+        self.krawedzie[wid] = (u, v)
+        self.incydencje[u].append(wid)
+        if v != u:
+            self.incydencje[v].append(wid)
+
+    def wezly_waya(self, wid):
+        u, v = self.krawedzie[wid]
+        return (u,) if u == v else (u, v)
+
+    def sasiedzi(self, wid):
+        """Zbiór wayów dzielących z `wid` węzeł końcowy."""
+        s = set()
+        for n in self.wezly_waya(wid):
+            s.update(self.incydencje[n])
+        s.discard(wid)
+        return s
+
+    def stopien(self, n):
+        return len(self.incydencje[n])
+
+    def usun_way(self, wid):
+        for n in self.wezly_waya(wid):
+            self.incydencje[n].remove(wid)
+        del self.krawedzie[wid]
+        for atrybut in (self.dlugosc, self.ruch, self.segment):
+            atrybut.pop(wid, None)
+
+    def ustaw_krawedz(self, wid, dlugosc, ruch=0, segment=None):
+        self.dlugosc[wid] = dlugosc
+        self.ruch[wid]    = ruch
+        self.segment[wid] = segment
+
+    def przytnij(self, min_sasiadow=1):
+        """
+        Usuwa (kaskadowo) waye, które mają mniej niż `min_sasiadow` sąsiadów.
+        Modyfikuje graf; zwraca listę usuniętych way_id w kolejności usuwania.
+        """
+        stopnie = [len(inc) for inc in self.incydencje]
+        zywe    = set(self.krawedzie)
+
+        def liczba_sasiadow(wid):
+            wezly = self.wezly_waya(wid)
+            gorna = sum(stopnie[n] - 1 for n in wezly)
+            # Suma stopni liczy podwójnie waye równoległe (te same oba węzły),
+            # więc dokładne liczenie tylko gdy to może zmienić wynik
+            if gorna < min_sasiadow or min_sasiadow <= 1:
+                return gorna
+            s = {w for n in wezly for w in self.incydencje[n] if w in zywe}
+            return len(s) - 1
+
+        kolejka   = deque(self.krawedzie)
+        w_kolejce = set(kolejka)
+        usuniete  = []
+        while kolejka:
+            wid = kolejka.popleft()
+            w_kolejce.discard(wid)
+            if wid not in zywe or liczba_sasiadow(wid) >= min_sasiadow:
+                continue
+            zywe.discard(wid)
+            usuniete.append(wid)
+            for n in self.wezly_waya(wid):
+                stopnie[n] -= 1
+                # Status sąsiada może się zmienić tylko gdy węzeł stał się "rzadki"
+                if stopnie[n] > min_sasiadow:
+                    continue
+                for w in self.incydencje[n]:
+                    if w in zywe and w not in w_kolejce:
+                        kolejka.append(w)
+                        w_kolejce.add(w)
+
+        for wid in usuniete:
+            self.usun_way(wid)
+        return usuniete
+
+    # -- Analizy ----------------------------------------------------------------
+
+    def obciazenie_wezlow(self):
+        """nr węzła -> suma ruchu (effort_count) na wszystkich krawędziach przy węźle."""
+        return {n: sum(self.ruch.get(w, 0) for w in inc)
+                for n, inc in enumerate(self.incydencje) if inc}
+
+    def dlugosc_relacji(self, relacja_id):
+        return round(sum(self.dlugosc.get(w, 0) for w in self.relacje.get(relacja_id, [])), 2)
+
+    def najblizszy_wezel(self, lat, lon):
+        """Najbliższy węzeł z co najmniej jedną krawędzią (przybliżenie płaskie)."""
+        najlepszy, min_d = None, float("inf")
+        for n, (nlat, nlon) in enumerate(self.wsp_wezlow):
+            if not self.incydencje[n]:
+                continue
+            d = (nlat - lat) ** 2 + (nlon - lon) ** 2
+            if d < min_d:
+                najlepszy, min_d = n, d
+        return najlepszy
+
+    def najkrotsza_sciezka(self, start, cel):
+        """
+        Dijkstra po długościach krawędzi między numerami węzłów.
+        Zwraca (km, [way_id, ...]) albo (None, []) gdy brak połączenia.
+        """
+        odl, skad = {start: 0.0}, {}
+        kopiec = [(0.0, start)]
+        while kopiec:
+            d, n = heapq.heappop(kopiec)
+            if n == cel:
+                break
+            if d > odl[n]:
+                continue
+            for wid in self.incydencje[n]:
+                u, v = self.krawedzie[wid]
+                m  = v if u == n else u
+                nd = d + self.dlugosc.get(wid, 0)
+                if nd < odl.get(m, float("inf")):
+                    odl[m], skad[m] = nd, (n, wid)
+                    heapq.heappush(kopiec, (nd, m))
+        if cel not in odl:
+            return None, []
+        sciezka, n = [], cel
+        while n != start:
+            n, wid = skad[n]
+            sciezka.append(wid)
+        return round(odl[cel], 2), sciezka[::-1]
+
+    # -- Dysk -------------------------------------------------------------------
+
+    def zapisz(self, path):
+        """Zapis kolumnowy; węzły bez krawędzi (po przycinaniu) są pomijane."""
+        nowy_nr, wezly = {}, []
+        for n, inc in enumerate(self.incydencje):
+            if inc:
+                nowy_nr[n] = len(wezly)
+                wezly.append(self.wsp_wezlow[n])
+        way_ids = list(self.krawedzie)
+        dane = {
+            "precyzja": self.precyzja,
+            "wezly":    wezly,
+            "krawedzie": {
+                "way":     way_ids,
+                "u":       [nowy_nr[self.krawedzie[w][0]] for w in way_ids],
+                "v":       [nowy_nr[self.krawedzie[w][1]] for w in way_ids],
+                "km":      [self.dlugosc.get(w, 0) for w in way_ids],
+                "ruch":    [self.ruch.get(w, 0) for w in way_ids],
+                "segment": [self.segment.get(w) for w in way_ids],
+            },
+            "relacje": {str(r): ws for r, ws in self.relacje.items()},
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(dane, f, separators=(",", ":"))
+
+    @classmethod
+    def wczytaj(cls, path):
+        with open(path, encoding="utf-8") as f:
+            dane = json.load(f)
+        g = cls(dane["precyzja"])
+        for lat, lon in dane["wezly"]:
+            g.wezel(lat, lon)
+        k = dane["krawedzie"]
+        for wid, u, v, km, ruch, seg in zip(k["way"], k["u"], k["v"], k["km"], k["ruch"], k["segment"]):
+            g.dodaj_way(wid, g.wsp_wezlow[u], g.wsp_wezlow[v])
+            g.ustaw_krawedz(wid, km, ruch, seg)
+        g.relacje = {int(r): ws for r, ws in dane["relacje"].items()}
+        return g
@@ -23,12 +23,17 @@ Uzycie:
   python "imgw fetcher.py" --report         # podglad danych w DB
   python "imgw fetcher.py" --backfill       # backfill Open-Meteo od 2026-03-03
   python "imgw fetcher.py" --date 2026-03-04
+  python "imgw fetcher.py" --reparse        # odbuduj weather_snapshots z archiwum (bez sieci)
+
+Surowe odpowiedzi IMGW i Open-Meteo z kolekcji do DB trafiaja do archiwum (archiwum.py).
 """
 
 import os, sys, json, sqlite3, logging, argparse, requests
 from datetime import date, datetime, timedelta, timezone
 from collections import defaultdict
 
+import archiwum
+
 try:
     from dotenv import load_dotenv; load_dotenv()
 except ImportError:
@@ -74,9 +79,10 @@ STACJE = {
     },
 }
 
-IMGW_URL    = "https://danepubliczne.imgw.pl/api/data/synop"
-OM_ARCHIVE  = "https://archive-api.open-meteo.com/v1/archive"
-OM_FORECAST = "https://api.open-meteo.com/v1/forecast"
+# Adresy nadpisywalne zmiennymi srodowiska (np. bench/mock_serwer.py)
+IMGW_URL    = os.getenv("IMGW_URL",        "https://danepubliczne.imgw.pl/api/data/synop")
+OM_ARCHIVE  = os.getenv("OM_ARCHIVE_URL",  "https://archive-api.open-meteo.com/v1/archive")
+OM_FORECAST = os.getenv("OM_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
 OM_VARS     = "temperature_2m,wind_speed_10m,wind_direction_10m,relative_humidity_2m,precipitation,surface_pressure"
 
 logging.basicConfig(level=getattr(logging, LOG_LEVEL),
@@ -105,6 +111,7 @@ def get_db():
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.executescript(SCHEMA)
+    archiwum.przygotuj(conn)
     conn.commit()
     # Migracja: dodaj kolumny których może nie być w starej bazie
     existing = {row[1] for row in conn.execute("PRAGMA table_info(weather_snapshots)")}
@@ -125,32 +132,30 @@ def si(v):
     except: return None
 
 
+UPSERT_SQL = """
+    INSERT INTO weather_snapshots
+        (station_key,captured_at,temperatura,predkosc_wiatru,kierunek_wiatru,
+         wilgotnosc,suma_opadu,cisnienie,godzina_pomiaru)
+    VALUES (?,?,?,?,?,?,?,?,?)
+    ON CONFLICT(station_key,captured_at) DO UPDATE SET
+        temperatura=excluded.temperatura, predkosc_wiatru=excluded.predkosc_wiatru,
+        kierunek_wiatru=excluded.kierunek_wiatru, wilgotnosc=excluded.wilgotnosc,
+        suma_opadu=excluded.suma_opadu, cisnienie=excluded.cisnienie,
+        godzina_pomiaru=excluded.godzina_pomiaru
+"""
+
+
 def upsert(conn, key, today, temp, wind, wdir, hum, rain, press, godzina=None):
-    conn.execute("""
-        INSERT INTO weather_snapshots
-            (station_key,captured_at,temperatura,predkosc_wiatru,kierunek_wiatru,
-             wilgotnosc,suma_opadu,cisnienie,godzina_pomiaru)
-        VALUES (?,?,?,?,?,?,?,?,?)
-        ON CONFLICT(station_key,captured_at) DO UPDATE SET
-            temperatura=excluded.temperatura, predkosc_wiatru=excluded.predkosc_wiatru,
-            kierunek_wiatru=excluded.kierunek_wiatru, wilgotnosc=excluded.wilgotnosc,
-            suma_opadu=excluded.suma_opadu, cisnienie=excluded.cisnienie,
-            godzina_pomiaru=excluded.godzina_pomiaru
-    """, (key, today, temp, wind, wdir, hum, rain, press, godzina))
+    conn.execute(UPSERT_SQL, (key, today, temp, wind, wdir, hum, rain, press, godzina))
     conn.commit()
 
 
 # -- IMGW -----------------------------------------------------------------------
 
-def collect_imgw(conn, today):
-    log.info("IMGW: pobieranie...")
-    try:
-        r = requests.get(IMGW_URL, timeout=30)
-        r.raise_for_status()
-        dane_all = {s["id_stacji"]: s for s in r.json()}
-    except Exception as e:
-        log.error(f"IMGW blad: {e}"); return
-
+def wiersze_imgw(today, lista):
+    """Lista synop z IMGW -> wiersze weather_snapshots (station_key, captured_at, ...)."""
+    dane_all = {s["id_stacji"]: s for s in lista}
+    wiersze  = []
     for key, meta in STACJE.items():
         if meta["zrodlo"] != "imgw": continue
         dane = dane_all.get(meta["imgw_id"])
@@ -165,12 +170,27 @@ def collect_imgw(conn, today):
                 godzina = f"{dp}T{int(gp):02d}:00"
         except: pass
 
-        upsert(conn, key, today,
-               sf(dane.get("temperatura")), sf(dane.get("predkosc_wiatru")),
-               si(dane.get("kierunek_wiatru")), sf(dane.get("wilgotnosc_wzgledna")),
-               sf(dane.get("suma_opadu")), sf(dane.get("cisnienie")), godzina)
-        log.info(f"  {meta['nazwa']}: {dane.get('temperatura')}C, "
-                 f"wiatr {dane.get('predkosc_wiatru')} m/s, pomiar: {godzina}")
+        wiersze.append((key, today,
+                        sf(dane.get("temperatura")), sf(dane.get("predkosc_wiatru")),
+                        si(dane.get("kierunek_wiatru")), sf(dane.get("wilgotnosc_wzgledna")),
+                        sf(dane.get("suma_opadu")), sf(dane.get("cisnienie")), godzina))
+    return wiersze
+
+
+def collect_imgw(conn, today):
+    log.info("IMGW: pobieranie...")
+    try:
+        r = requests.get(IMGW_URL, timeout=30)
+        r.raise_for_status()
+        lista = r.json()
+    except Exception as e:
+        log.error(f"IMGW blad: {e}"); return
+
+    archiwum.zapisz(conn, "imgw", "synop", today, r.content, r.url)
+    for wiersz in wiersze_imgw(today, lista):
+        upsert(conn, *wiersz)
+        log.info(f"  {STACJE[wiersz[0]]['nazwa']}: {wiersz[2]}C, "
+                 f"wiatr {wiersz[3]} m/s, pomiar: {wiersz[8]}")
 
 
 # -- Open-Meteo -----------------------------------------------------------------
@@ -200,27 +220,35 @@ def collect_open_meteo_date(conn, today):
         except Exception as e:
             log.error(f"Open-Meteo blad ({meta['nazwa']}): {e}"); continue
 
-        times  = hourly.get("time", [])
-        idx_d  = [i for i, t in enumerate(times) if t.startswith(today)]
-        if not idx_d: continue
+        archiwum.zapisz(conn, "open-meteo", key, today, r.content, r.url)
+        wiersz = wiersz_open_meteo(key, today, hourly)
+        if wiersz:
+            upsert(conn, *wiersz)
+            log.info(f"  {meta['nazwa']}: {wiersz[2]}C, wiatr max {wiersz[3]} m/s")
 
-        def vals(k): return [hourly.get(k,[])[i] for i in idx_d if i < len(hourly.get(k,[])) and hourly[k][i] is not None]
-        def avg(l): return round(sum(l)/len(l),1) if l else None
-        def mx(l):  return round(max(l),1) if l else None
-        def sm(l):  return round(sum(l),1) if l else None
 
-        temps = vals("temperature_2m"); winds = vals("wind_speed_10m")
-        wdirs = vals("wind_direction_10m"); hums = vals("relative_humidity_2m")
-        rains = vals("precipitation"); press = vals("surface_pressure")
+def wiersz_open_meteo(key, today, hourly):
+    """Godzinowe dane Open-Meteo -> wiersz dzienny weather_snapshots albo None."""
+    times  = hourly.get("time", [])
+    idx_d  = [i for i, t in enumerate(times) if t.startswith(today)]
+    if not idx_d: return None
 
-        wdir = None
-        if winds and wdirs:
-            wdir = int(wdirs[winds.index(max(winds))]) if wdirs else None
+    def vals(k): return [hourly.get(k,[])[i] for i in idx_d if i < len(hourly.get(k,[])) and hourly[k][i] is not None]
+    def avg(l): return round(sum(l)/len(l),1) if l else None
+    def mx(l):  return round(max(l),1) if l else None
+    def sm(l):  return round(sum(l),1) if l else None
 
-        godzina = times[idx_d[-1]] if idx_d else None
-        upsert(conn, key, today, avg(temps), mx(winds), wdir,
-               avg(hums), sm(rains), avg(press), godzina)
-        log.info(f"  {meta['nazwa']}: {avg(temps)}C, wiatr max {mx(winds)} m/s")
+    temps = vals("temperature_2m"); winds = vals("wind_speed_10m")
+    wdirs = vals("wind_direction_10m"); hums = vals("relative_humidity_2m")
+    rains = vals("precipitation"); press = vals("surface_pressure")
+
+    wdir = None
+    if winds and wdirs:
+        wdir = int(wdirs[winds.index(max(winds))]) if wdirs else None
+
+    godzina = times[idx_d[-1]] if idx_d else None
+    return (key, today, avg(temps), mx(winds), wdir,
+            avg(hums), sm(rains), avg(press), godzina)
 
 
 # -- Live JSON (odswiezanie co godzine) -----------------------------------------
@@ -321,10 +349,28 @@ def collect(today=None):
     conn = get_db()
     collect_imgw(conn, today)
     collect_open_meteo_date(conn, today)
+    conn.commit()
     conn.close()
     log.info("Kolekcja zakonczona.")
 
 
+def reparse():
+    """Odbudowuje weather_snapshots z archiwum surowych odpowiedzi - bez sieci."""
+    conn    = get_db()
+    wiersze = []
+    for _, dzien, tresc in archiwum.odpowiedzi(conn, "imgw"):
+        wiersze.extend(wiersze_imgw(dzien, json.loads(tresc)))
+    for key, dzien, tresc in archiwum.odpowiedzi(conn, "open-meteo"):
+        if key not in STACJE: continue
+        wiersz = wiersz_open_meteo(key, dzien, json.loads(tresc).get("hourly", {}))
+        if wiersz:
+            wiersze.append(wiersz)
+    with conn:
+        conn.executemany(UPSERT_SQL, wiersze)
+    conn.close()
+    log.info(f"Reparse: {len(wiersze)} wierszy weather_snapshots z archiwum")
+
+
 # -- Eksport z DB do JSON -------------------------------------------------------
 
 def export_json(output_path="weather_data.json"):
@@ -385,18 +431,20 @@ def main():
     p.add_argument("--live",     action="store_true", help="Live JSON bez DB (co godzine)")
     p.add_argument("--date",     default=None,        help="Konkretna data YYYY-MM-DD")
     p.add_argument("--backfill", action="store_true", help="Backfill Open-Meteo od 2026-03-03")
+    p.add_argument("--reparse",  action="store_true", help="Odbuduj DB z archiwum surowych odpowiedzi")
     args = p.parse_args()
 
     if args.report:   report();           return
     if args.export:   export_json();      return
     if args.live:     fetch_live_json();  return
+    if args.reparse:  reparse(); export_json(); return
     if args.backfill:
         conn = get_db()
         d = date(2026, 3, 3)
         while d < date.today():
             collect_open_meteo_date(conn, d.isoformat())
             d += timedelta(days=1)
-        conn.close(); export_json(); return
+        conn.commit(); conn.close(); export_json(); return
 
     collect(today=args.date)
     export_json()
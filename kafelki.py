@@ -0,0 +1,105 @@
+"""
+TATRY FLOW - kafelki wektorowe (GeoJSON) dla warstwy szlaków
+
+Piramida z/x/y (schemat slippy map, jak kafelki rastrowe Leaflet):
+dla każdego zoomu geometria jest upraszczana z tolerancją tego zoomu,
+przycinana do kafelka (z małym marginesem, żeby nie było szwów)
+i zapisywana jako FeatureCollection w katalog/z/x/y.json.
+Strona ładuje tylko kafelki widoczne na bieżącym zoomie, więc
+początkowy rozmiar nie zależy od wielkości sieci.
+
+Powyżej najwyższego zoomu kafelków strona używa kafelków max zoomu
+(geometria z tolerancją ~3 m wystarcza), poniżej - najniższego.
+"""
+
+import os
+import json
+import math
+import shutil
+
+from shapely import clip_by_rect
+from shapely.geometry import LineString
+
+from geometria import poziomy_szczegolowosci
+
+ZOOMY_KAFELKOW = range(10, 15)
+MARGINES       = 4 / 256   # ułamek kafelka dodawany z każdej strony przy przycinaniu
+MIEJSCA        = 6         # miejsca po przecinku we współrzędnych (~0.1 m)
+
+
+def kafelek_dla(lat, lon, z):
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_r = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_r)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def granice_kafelka(z, x, y):
+    """(zachód, południe, wschód, północ) w stopniach."""
+    n = 2 ** z
+    def lat(yy):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * yy / n))))
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def _wspolrzedne(geom):
+    """Lista linii [[lon, lat], ...] z wyniku przycięcia (LineString / Multi / kolekcja)."""
+    if geom.is_empty:
+        return []
+    if geom.geom_type == "LineString":
+        czesci = [geom]
+    else:
+        czesci = [g for g in getattr(geom, "geoms", []) if g.geom_type == "LineString"]
+    return [[[round(x, MIEJSCA), round(y, MIEJSCA)] for x, y in g.coords]
+            for g in czesci if len(g.coords) >= 2]
+
+
+def generuj_kafelki(obiekty, katalog, zoomy=ZOOMY_KAFELKOW):
+    """
+    obiekty - lista (punkty (k, 2) [lat, lon], właściwości dict).
+    Czyści `katalog`, zapisuje kafelki i zwraca indeks {"zmin", "zmax", "kafelki": [...]}
+    gdzie kafelki to lista "z/x/y" istniejących plików (strona nie pyta o puste).
+    """
+    if os.path.isdir(katalog):
+        shutil.rmtree(katalog)
+    istniejace = []
+    rozmiar    = 0
+    # Poziomy szczegółowości wszystkich zoomów naraz (kaskadowo, od najdokładniejszego)
+    poziomy = [(poziomy_szczegolowosci(punkty, zoomy), wlasciwosci)
+               for punkty, wlasciwosci in obiekty if len(punkty) >= 2]
+    for z in zoomy:
+        kafelki = {}
+        for lod, wlasciwosci in poziomy:
+            uproszczone = lod[z]
+            linia = LineString(uproszczone[:, ::-1])
+            (x0, y0) = kafelek_dla(float(uproszczone[:, 0].max()), float(uproszczone[:, 1].min()), z)
+            (x1, y1) = kafelek_dla(float(uproszczone[:, 0].min()), float(uproszczone[:, 1].max()), z)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    w, s, e, n = granice_kafelka(z, x, y)
+                    mx, my = (e - w) * MARGINES, (n - s) * MARGINES
+                    linie = _wspolrzedne(clip_by_rect(linia, w - mx, s - my, e + mx, n + my))
+                    if not linie:
+                        continue
+                    geometria = ({"type": "LineString", "coordinates": linie[0]} if len(linie) == 1
+                                 else {"type": "MultiLineString", "coordinates": linie})
+                    kafelki.setdefault((x, y), []).append(
+                        {"type": "Feature", "geometry": geometria, "properties": wlasciwosci})
+
+        for (x, y), cechy in kafelki.items():
+            path = os.path.join(katalog, str(z), str(x), f"{y}.json")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tekst = json.dumps({"type": "FeatureCollection", "features": cechy},
+                               ensure_ascii=False, separators=(",", ":"))
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(tekst)
+            rozmiar += len(tekst)
+            istniejace.append(f"{z}/{x}/{y}")
+
+    os.makedirs(katalog, exist_ok=True)
+    indeks = {"zmin": min(zoomy), "zmax": max(zoomy), "kafelki": istniejace}
+    with open(os.path.join(katalog, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(indeks, f, separators=(",", ":"))
+    print(f"Kafelki: {len(istniejace)} plików, {rozmiar // 1024} KB w {katalog}/")
+    return indeks
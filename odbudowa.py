@@ -0,0 +1,218 @@
+"""
+TATRY FLOW - szybka odbudowa bazy od zera (start joba, disaster recovery, analizy)
+
+Źródła, łączone w tej kolejności (późniejsze wygrywają przy tym samym kluczu):
+  --z-bazy PLIK   istniejąca baza, np. ostatnia zacommitowana tatry_segments.db
+  --zmiany KAT    dzienne zestawy zmian z zmiany.py
+  --json KAT      eksporty traffic_data.json / weather_data.json / avalanche_data.json
+                  (ostatnia deska ratunku: bez polyline, końców segmentów,
+                  historii athlete_count i indeksu archiwum)
+
+Baza budowana jest w pliku tymczasowym obok docelowej i podmieniana na końcu
+(os.replace) - przerwana odbudowa zostawia starą bazę, więc ładowanie może
+iść bez dziennika i bez fsync (journal_mode=OFF, synchronous=OFF). Schemat
+i migracje z fetcherów; jawne indeksy (CREATE INDEX) zdejmowane na czas
+ładowania i zakładane na końcu, wiersze każdej tabeli wstawiane w jednej
+transakcji posortowane po kluczu, więc indeksy UNIQUE rosną na końcu
+b-drzewa. Potem geometria segmentów (przestrzen.migruj), retencja i raport
+przepustowości.
+
+Uzycie:
+  python odbudowa.py --z-bazy tatry_segments.db --zmiany zmiany   # start joba
+  python odbudowa.py --zmiany zmiany --cel /tmp/analiza.db
+  python odbudowa.py --json . --cel /tmp/z_eksportow.db
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+
+import przestrzen
+import retencja
+import zmiany
+
+DB_PATH   = os.getenv("DB_PATH", "tatry_segments.db")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+log = logging.getLogger("odbudowa")
+
+# Warstwy retencji kopiowane z --z-bazy wprost (nie ma ich w zestawach zmian)
+WARSTWY = ("snapshots_weekly", "snapshots_monthly")
+
+
+def _z_bazy(sciezka, wiersze, warstwy):
+    zrodlo = sqlite3.connect(f"file:{sciezka}?mode=ro", uri=True)
+    for plik, lista in zmiany.wiersze_bazy(zrodlo):
+        wiersze[plik].extend(lista)
+    tabele = {r[0] for r in zrodlo.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for tabela in WARSTWY:
+        if tabela in tabele:
+            warstwy[tabela].extend(zrodlo.execute(
+                f"SELECT segment_id, period_start, captured_at, effort_count, athlete_count FROM {tabela}"))
+    zrodlo.close()
+
+
+def _z_zmian(conn, katalog, wiersze):
+    for plik, lista in zmiany.wiersze_zestawow(conn, katalog):
+        wiersze[plik].extend(lista)
+
+
+def _wczytaj_json(sciezka):
+    if not os.path.exists(sciezka):
+        log.warning(f"Brak {sciezka} - pomijam")
+        return {}
+    with open(sciezka, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _z_json(katalog, wiersze):
+    """Eksporty JSON -> wiersze upsertu w kształcie zestawów zmian."""
+    do = zmiany.do_upsertu
+    for seg_id, seg in _wczytaj_json(os.path.join(katalog, "traffic_data.json")).items():
+        meta, serie = seg["meta"], seg.get("series", {})
+        dni = sorted(serie)
+        if not dni:
+            continue
+        wiersze["segments"].append(do("segments", [
+            int(seg_id), meta.get("name"), meta.get("activity_type"), meta.get("lat"), meta.get("lng"),
+            None, None, None, meta.get("avg_grade"), meta.get("elev_difference"),
+            meta.get("distance"), json.dumps(""), None], dni[0]))
+        wiersze["segments_seen"].append(do("segments_seen", [int(seg_id)], meta.get("last_snapshot") or dni[-1]))
+        for dzien in dni:
+            atleci = meta.get("athlete_count") if dzien == meta.get("last_snapshot") else None
+            wiersze["snapshots"].append(do("snapshots", [int(seg_id), serie[dzien], atleci], dzien))
+
+    for plik, nazwa, pola in (
+            ("weather_snapshots", "weather_data.json",
+             ("temperatura", "predkosc_wiatru", "kierunek_wiatru", "wilgotnosc", "suma_opadu", "cisnienie")),
+            ("avalanche_bulletins", "avalanche_data.json",
+             ("stopien", "stopien_nazwa", "tendencja", "wazne_do", "opis"))):
+        for klucz, dane in _wczytaj_json(os.path.join(katalog, nazwa)).items():
+            dni = sorted(dane.get("series", {}))
+            for dzien in dni:
+                wartosci = dane["series"][dzien]
+                # last_updated / godzina_pomiaru eksport trzyma tylko dla ostatniego wiersza
+                ostatni = dane.get("last_updated") if dzien == dni[-1] else None
+                wiersze[plik].append(do(plik, [klucz] + [wartosci.get(p) for p in pola] + [ostatni], dzien))
+
+
+def odbuduj(cel=DB_PATH, z_bazy=None, zmiany_dir=None, json_dir=None):
+    """Buduje bazę cel od zera z podanych źródeł; zwraca statystyki ładowania."""
+    t0 = time.perf_counter()
+    tmp = cel + ".odbudowa"
+    for plik in (tmp, tmp + "-wal", tmp + "-shm"):
+        if os.path.exists(plik):
+            os.remove(plik)
+
+    # Schemat i migracje fetcherów na pustym pliku (moduły czytają DB_PATH przy starcie)
+    stare_db = os.environ.get("DB_PATH")
+    os.environ["DB_PATH"] = tmp
+    try:
+        zmiany.przygotuj_baze()
+    finally:
+        if stare_db is None:
+            os.environ.pop("DB_PATH", None)
+        else:
+            os.environ["DB_PATH"] = stare_db
+
+    conn = sqlite3.connect(tmp, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")   # 256 MB
+
+    wiersze = {plik: [] for plik in zmiany.ZESTAW}
+    warstwy = {tabela: [] for tabela in WARSTWY}
+    if z_bazy:
+        _z_bazy(z_bazy, wiersze, warstwy)
+    if zmiany_dir:
+        _z_zmian(conn, zmiany_dir, wiersze)
+    if json_dir:
+        _z_json(json_dir, wiersze)
+    t_odczyt = time.perf_counter() - t0
+
+    indeksy = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall()
+    statystyki = {}
+    conn.execute("BEGIN")
+    for nazwa, _ in indeksy:
+        conn.execute(f"DROP INDEX {nazwa}")
+    for plik, (tabela, _, klucz, _, upsert) in zmiany.ZESTAW.items():
+        lista = wiersze[plik]
+        if not lista:
+            continue
+        n = len(klucz)
+        # stabilnie: przy tym samym kluczu i dniu późniejsze źródło idzie później i wygrywa
+        lista.sort(key=lambda w: (*w[:n], w[-1] or ""))
+        t1 = time.perf_counter()
+        conn.executemany(upsert, lista)
+        statystyki[plik] = (len(lista), time.perf_counter() - t1)
+    for tabela, lista in warstwy.items():
+        if lista:
+            t1 = time.perf_counter()
+            lista.sort(key=lambda w: w[:2])
+            conn.executemany(f"INSERT OR REPLACE INTO {tabela} VALUES (?, ?, ?, ?, ?)", lista)
+            statystyki[tabela] = (len(lista), time.perf_counter() - t1)
+    t1 = time.perf_counter()
+    for _, sql in indeksy:
+        conn.execute(sql)
+    t_indeksy = time.perf_counter() - t1
+    conn.execute("COMMIT")
+
+    # migruj() / zwin() liczą na zwykłe transakcje modułu sqlite3
+    conn.isolation_level = "DEFERRED"
+    przestrzen.migruj(conn)
+    conn.commit()
+    retencja.zwin(conn, vacuum=False)
+    conn.execute("PRAGMA locking_mode=NORMAL")
+    conn.execute("PRAGMA journal_mode=WAL")   # jak baza kolektorów
+    conn.close()
+
+    for plik in (cel + "-wal", cel + "-shm"):
+        if os.path.exists(plik):
+            os.remove(plik)
+    os.replace(tmp, cel)
+
+    czas = time.perf_counter() - t0
+    razem = sum(n for n, _ in statystyki.values())
+    return {
+        "tabele":     statystyki,
+        "wiersze":    razem,
+        "odczyt_s":   t_odczyt,
+        "indeksy_s":  t_indeksy,
+        "czas_s":     czas,
+        "wierszy_s":  razem / czas if czas else None,
+        "mb":         os.path.getsize(cel) / 1e6,
+    }
+
+
+def raport(s, cel):
+    print(f"\n  Odbudowa {cel}: {s['wiersze']} wierszy w {s['czas_s']:.2f} s "
+          f"({s['wierszy_s']:,.0f} wierszy/s, {s['mb']:.1f} MB, {s['mb'] / s['czas_s']:.1f} MB/s)")
+    print(f"  Odczyt zrodel {s['odczyt_s']:.2f} s, indeksy {s['indeksy_s']:.2f} s")
+    for tabela, (n, t) in s["tabele"].items():
+        print(f"    {tabela:<22} {n:>9} wierszy  {t:>7.3f} s" + (f"  {n / t:>10,.0f}/s" if t else ""))
+
+
+def main():
+    logging.basicConfig(level=getattr(logging, LOG_LEVEL),
+                        format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    p = argparse.ArgumentParser(description="Tatry Flow — odbudowa bazy z eksportow")
+    p.add_argument("--cel",     default=DB_PATH, help="Baza wynikowa (domyslnie DB_PATH)")
+    p.add_argument("--z-bazy",  default=None, help="Istniejaca baza jako punkt wyjscia")
+    p.add_argument("--zmiany",  default=None, help="Katalog zestawow zmian (zmiany.py)")
+    p.add_argument("--json",    default=None, help="Katalog z traffic/weather/avalanche_data.json")
+    args = p.parse_args()
+    if not (args.z_bazy or args.zmiany or args.json):
+        p.error("podaj co najmniej jedno zrodlo: --z-bazy, --zmiany, --json")
+    if args.z_bazy and not os.path.exists(args.z_bazy):
+        log.warning(f"Brak {args.z_bazy} - odbudowa bez bazy startowej")
+        args.z_bazy = None
+    raport(odbuduj(args.cel, args.z_bazy, args.zmiany, args.json), args.cel)
+
+
+if __name__ == "__main__":
+    main()
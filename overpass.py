@@ -0,0 +1,185 @@
+"""
+TATRY FLOW - Overpass: strumieniowe pobieranie i kompaktowe przechowywanie OSM
+
+Odpowiedzi Overpass z `out geom` dla wszystkich relacji hiking w bbox Tatr
+są duże, a response.json() budowało całe drzewo słowników naraz.
+Tutaj tablica "elements" parsowana jest element po elemencie prosto z
+ciała odpowiedzi, a geometria trafia od razu do MagazynGeometrii.
+Węzły (nodes) i listy node-id wayów są odrzucane - mapa ich nie używa.
+"""
+
+import os
+import re
+import json
+import codecs
+import requests
+
+from geometria import MagazynGeometrii
+
+# OVERPASS_URL - lista serwerów po przecinku zastępująca domyślną (np. bench/mock_serwer.py)
+SERWERY = [s.strip() for s in os.getenv("OVERPASS_URL", "").split(",") if s.strip()] or [
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://maps.mail.ru/osm/tools/overpass/api/interpreter",
+    "https://overpass.openstreetmap.ru/api/interpreter",
+]
+
+_POCZATEK_ELEMENTOW = re.compile(r'"elements"\s*:\s*\[')
+_SEPARATOR          = re.compile(r"[\s,]*")
+
+
+class DaneOsm:
+    """
+    Wynik jednego lub kilku zapytań Overpass w zwartej postaci.
+      tagi_wayow - way_id -> tags, tylko waye z własną geometrią (kolejność z odpowiedzi)
+      geometria  - MagazynGeometrii (jedna tablica współrzędnych + offsety)
+      relacje    - rel_id -> (tags, [way_ref, ...])
+    Duplikaty (ten sam typ + id) są pomijane - wygrywa pierwsze wystąpienie.
+    """
+
+    def __init__(self):
+        self.tagi_wayow = {}
+        self.geometria  = MagazynGeometrii()
+        self.relacje    = {}
+
+    def dodaj(self, el):
+        typ = el.get("type")
+        if typ == "way":
+            wid = el.get("id")
+            if "geometry" not in el or wid in self.tagi_wayow:
+                return
+            self.tagi_wayow[wid] = el.get("tags", {})
+            self.geometria.dodaj(wid, _pary(el["geometry"]))
+        elif typ == "relation":
+            rid = el.get("id")
+            if "members" not in el or rid in self.relacje:
+                return
+            way_refs = []
+            for m in el["members"]:
+                if m.get("type") != "way":
+                    continue
+                way_refs.append(m["ref"])
+                # Geometria członka jako fallback dla wayów bez osobnego elementu
+                if "geometry" in m:
+                    self.geometria.dodaj(m["ref"], _pary(m["geometry"]))
+            self.relacje[rid] = (el.get("tags", {}), way_refs)
+
+    def punkty(self, wid):
+        """Widok (k, 2) [lat, lon] na geometrię waya (bez kopii)."""
+        return self.geometria.punkty(wid)
+
+    def znacznik(self):
+        return len(self.tagi_wayow), len(self.geometria), len(self.relacje)
+
+    def cofnij(self, znacznik):
+        """Usuwa wszystko dodane po znaczniku (np. po zerwanym transferze)."""
+        n_tagi, n_geom, n_rel = znacznik
+        for slownik, n in ((self.tagi_wayow, n_tagi), (self.relacje, n_rel)):
+            for klucz in list(slownik)[n:]:
+                del slownik[klucz]
+        self.geometria.obetnij(n_geom)
+
+
+def _pary(geometry):
+    return ((p["lat"], p["lon"]) for p in geometry if p is not None)
+
+
+def strumien_elementow(response, rozmiar_bloku=1 << 16):
+    """
+    Generator elementów z tablicy "elements" odpowiedzi Overpass.
+    Czyta ciało odpowiedzi kawałkami i dekoduje obiekty raw_decode() w miarę
+    napływu danych - w pamięci jest tylko bieżący fragment, nie cały JSON.
+    """
+    dekoder = json.JSONDecoder()
+    utf8    = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    bloki   = response.iter_content(chunk_size=rozmiar_bloku)
+    stan    = {"bufor": "", "pos": 0, "eof": False}
+
+    def dociagnij(min_dlugosc=0):
+        """Dokleja kolejne bloki do bufora; False gdy strumień się skończył."""
+        if stan["eof"]:
+            return False
+        bufor = stan["bufor"][stan["pos"]:]
+        stan["pos"] = 0
+        czesci = [bufor]
+        dlugosc = len(bufor)
+        while True:
+            blok = next(bloki, None)
+            if blok is None:
+                czesci.append(utf8.decode(b"", final=True))
+                stan["eof"] = True
+                break
+            tekst = utf8.decode(blok)
+            czesci.append(tekst)
+            dlugosc += len(tekst)
+            if dlugosc >= min_dlugosc:
+                break
+        stan["bufor"] = "".join(czesci)
+        return len(stan["bufor"]) > len(bufor) or not stan["eof"]
+
+    # Przewiń do początku tablicy "elements"
+    while True:
+        m = _POCZATEK_ELEMENTOW.search(stan["bufor"])
+        if m:
+            stan["pos"] = m.end()
+            break
+        # Zostaw ogon - klucz mógł zostać przecięty na granicy bloków
+        stan["pos"] = max(0, len(stan["bufor"]) - 32)
+        if not dociagnij():
+            raise ValueError("Brak tablicy 'elements' w odpowiedzi Overpass")
+
+    while True:
+        bufor, pos = stan["bufor"], stan["pos"]
+        pos = _SEPARATOR.match(bufor, pos).end()
+        stan["pos"] = pos
+        if pos >= len(bufor):
+            if not dociagnij():
+                raise ValueError("Odpowiedź Overpass urwała się w tablicy 'elements'")
+            continue
+        if bufor[pos] == "]":
+            return
+        try:
+            el, koniec = dekoder.raw_decode(bufor, pos)
+        except json.JSONDecodeError:
+            # Element niekompletny - podwój bufor zanim spróbujemy ponownie,
+            # żeby duże relacje nie były parsowane od nowa przy każdym bloku
+            if not dociagnij(min_dlugosc=2 * (len(bufor) - pos)):
+                raise
+            continue
+        stan["pos"] = koniec
+        yield el
+
+
+def pobierz_dane(query, opis, dane, serwery=SERWERY):
+    """
+    Pobiera zapytanie strumieniowo do `dane` (DaneOsm).
+    Zwraca listę id relacji z tej odpowiedzi (w kolejności), [] gdy wszystkie serwery zawiodły.
+    """
+    for serwer in serwery:
+        znacznik = dane.znacznik()
+        try:
+            print(f"Pobieram: {opis} ({serwer})...")
+            with requests.post(serwer, data=query, timeout=180, stream=True) as response:
+                if response.status_code != 200:
+                    print(f"  Błąd HTTP {response.status_code}, próbuję kolejny serwer...")
+                    continue
+                relacje = []
+                for el in strumien_elementow(response):
+                    if el.get("type") == "relation" and "members" in el:
+                        relacje.append(el["id"])
+                    dane.dodaj(el)
+            print(f"  OK!")
+            return relacje
+        except requests.exceptions.SSLError as e:
+            print(f"  SSL error: {e} — próbuję kolejny serwer...")
+        except requests.exceptions.Timeout:
+            print(f"  Timeout — próbuję kolejny serwer...")
+        except requests.exceptions.ConnectionError as e:
+            print(f"  Błąd połączenia: {e} — próbuję kolejny serwer...")
+        except ValueError:
+            print(f"  Błąd parsowania JSON — próbuję kolejny serwer...")
+        except Exception as e:
+            print(f"  Nieoczekiwany błąd: {e} — próbuję kolejny serwer...")
+        dane.cofnij(znacznik)
+    print(f"  Wszystkie serwery zawiodły dla: {opis}")
+    return []
@@ -0,0 +1,270 @@
+"""
+TATRY FLOW - parsery komunikatów lawinowych (TOPR, HZS, laviny.sk)
+
+Wzorce są kompilowane raz przy imporcie (dotąd re.search/re.sub z napisami
+przy każdym wywołaniu), fallbacki szukane są tylko gdy poprzednia próba nic
+nie dała - kolejność i wyniki są identyczne jak w poprzednich parserach.
+Moduł nie importuje sieci, więc nadaje się do przetwarzania archiwów
+komunikatów w wielu procesach.
+"""
+
+import re
+import logging
+
+log = logging.getLogger("avalanche")
+
+KOLORY = {1: "#8BC34A", 2: "#FFC107", 3: "#FF9800", 4: "#F44336", 5: "#7B1FA2"}
+
+
+
+def _ascii(s):
+    s = s.lower()
+    if s.isascii():
+        return s
+    # .replace jest na krótkich tekstach kilka razy szybsze niż str.translate
+    for a, b in (("ą","a"),("ć","c"),("ę","e"),("ł","l"),("ń","n"),("ó","o"),("ś","s"),
+                 ("ź","z"),("ż","z"),("č","c"),("ľ","l"),("ň","n"),("š","s"),("ž","z")):
+        s = s.replace(a, b)
+    return s
+
+
+MAPA_NAZW = [
+    (5, ["bardzo duze", "bardzo duzy", "bardzo vysokie", "very high"]),
+    (4, ["duze", "duzy", "vysokie", "velke", "velky", "high"]),
+    (3, ["znaczne", "znaczny", "zvysene", "considerable"]),
+    (2, ["umiarkowane", "umiarkowany", "mierne", "moderate"]),
+    (1, ["male", "maly", "niskie", "low", "gering", "niske"]),
+]
+
+
+def nazwa_do_stopnia(s):
+    if not s: return None
+    a = _ascii(s)
+    for nr, slowa in MAPA_NAZW:
+        for slowo in slowa:
+            if slowo in a:
+                return nr
+    return None
+
+
+# -- Parser TOPR ----------------------------------------------------------------
+# UWAGA: lawiny.topr.pl/getwidget zwraca document.write('...')
+# Regex [\"'] zatrzymuje sie na pierwszym " wewnatrz tresci (np. w alt="...")
+# Dlatego NIE uzywamy regex do wyciagania - usuwamy wrapper bezposrednio.
+
+_TOPR_WRAPPER_START = re.compile(r"^\s*document\.write\s*\(\s*'", re.DOTALL)
+_TOPR_WRAPPER_END   = re.compile(r"'\s*\)\s*;?\s*$", re.DOTALL)
+_TAG                = re.compile(r"<[^>]+>")
+_MD_BOLD            = re.compile(r"\*+([^*]+)\*+")
+_MD_LINK            = re.compile(r"\[([^\]]+)\]\([^\)]+\)")
+_SPACJE             = re.compile(r"[ \t]+")
+
+_TOPR_SLOWA = [(nr, [(s, re.compile(s, re.IGNORECASE)) for s in slowa])
+               for nr, slowa in [(5, ["Bardzo duże"]), (4, ["Duże"]), (3, ["Znaczne"]),
+                                 (2, ["Umiarkowane"]), (1, ["Małe", "Niskie"])]]
+
+_TOPR_WZORCE = {
+    "stopien": re.compile(
+        r"okre[sś]lono\s+jako\s*:?\s*"
+        r"(Bardzo\s+du[zż]e|Du[zż]e|Znaczne|Umiarkowane|Ma[lł]e"
+        r"|Bardzo\s+du[zż]y|Du[zż]y|Znaczny|Umiarkowany|Ma[lł]y"
+        r"|Niskie|Wysokie|Bardzo\s+[Ww]ysokie)", re.IGNORECASE),
+    "stopien_cyfra": re.compile(r"stopie[nń][^0-9]{0,30}([1-5])", re.IGNORECASE),
+    "wazne_do":  re.compile(r"Obowi[aą]zuje\s+do\s*:?\s*([\d\.\: ]+)", re.IGNORECASE),
+    "tendencja": re.compile(
+        r"(Stopie[nń]\s+zagro[zż]enia\s+"
+        r"(?:nie\s+powinien\s+ulec\s+zmianie"
+        r"|mo[zż]e\s+rosn[aą][cć]"
+        r"|mo[zż]e\s+male[cć]"
+        r"|pozostanie\s+bez\s+zmian))", re.IGNORECASE),
+}
+
+_TOPR_POMIN = re.compile(r"Komunikat|Obowi[aą]zuje|okre[sś]lono|Stopie[nń]|"
+                         r"Szczeg|TURYSTO|Twoje bezpiecze|TOPR\b|^\s*$", re.IGNORECASE)
+
+
+def parse_topr(raw):
+    # Usun "document.write( '" z poczatku i "' );" z konca
+    tekst = _TOPR_WRAPPER_START.sub("", raw)
+    tekst = _TOPR_WRAPPER_END.sub("", tekst)
+
+    log.debug("TOPR raw tekst (pierwsze 400): " + tekst[:400])
+
+    # HTML tagi, Markdown bold i linki, whitespace
+    tekst = _TAG.sub(" ", tekst)
+    tekst = _MD_BOLD.sub(r"\1", tekst)
+    tekst = _MD_LINK.sub(r"\1", tekst)
+    tekst = _SPACJE.sub(" ", tekst)
+
+    log.debug("TOPR oczyszczony (pierwsze 400): " + tekst[:400])
+
+    # Stopien: "Zagrozenie okreslono jako: Umiarkowane", potem cyfra po "stopien",
+    # potem slowo kluczowe gdziekolwiek w tekscie - fallbacki tylko gdy potrzebne
+    stopien, stopien_nazwa = None, None
+    m = _TOPR_WZORCE["stopien"].search(tekst)
+    if m:
+        stopien_nazwa = m.group(1).strip()
+        stopien       = nazwa_do_stopnia(stopien_nazwa)
+    if stopien is None:
+        m = _TOPR_WZORCE["stopien_cyfra"].search(tekst)
+        if m:
+            stopien = int(m.group(1))
+    if stopien is None:
+        for nr, slowa_pl in _TOPR_SLOWA:
+            for s, wzorzec in slowa_pl:
+                if wzorzec.search(tekst):
+                    stopien = nr; stopien_nazwa = s; break
+            if stopien: break
+
+    m = _TOPR_WZORCE["wazne_do"].search(tekst)
+    wazne_do  = m.group(1).strip() if m else None
+    m = _TOPR_WZORCE["tendencja"].search(tekst)
+    tendencja = m.group(1).strip()[:120] if m else None
+
+    # Opis - pierwsza dluzsza linia, ktora nie jest naglowkiem/stopka
+    opis = None
+    for line in tekst.split("\n"):
+        l = line.strip()
+        if len(l) < 40: continue
+        if _TOPR_POMIN.search(l): continue
+        opis = l[:300]
+        break
+
+    log.info(f"TOPR: stopien={stopien} ({stopien_nazwa}), tendencja={tendencja}")
+    return {"stopien": stopien, "stopien_nazwa": stopien_nazwa,
+            "tendencja": tendencja, "wazne_do": wazne_do,
+            "opis": opis, "kolor": KOLORY.get(stopien)}
+
+
+# -- Parser HZS -----------------------------------------------------------------
+
+STOPNIE_SK = {1: "Malé", 2: "Mierne", 3: "Zvýšené", 4: "Veľké", 5: "Veľmi veľké"}
+
+_HZS_IKONA     = re.compile(r"danger_rating_(\d)\.svg", re.IGNORECASE)
+_HZS_ALT       = re.compile(r'alt=["\']([^"\']+stupen[^"\']+)["\']', re.IGNORECASE)
+_HZS_PLATNOST  = re.compile(r"platnost[^:]*:\s*([^\n<]{5,40})", re.IGNORECASE)
+_HZS_DATA      = re.compile(r"(\d{1,2}\.\d{1,2}\.\d{4}[^\n<]{0,20})")
+_HZS_VYSTRAHA  = re.compile(r"V[yý]strahy?[^<]{0,20}</[^>]+>(.*?)</", re.IGNORECASE | re.DOTALL)
+_BIALE         = re.compile(r"\s+")
+
+
+def parse_hzs(html):
+    stopien, stopien_nazwa = None, None
+
+    m = _HZS_IKONA.search(html)
+    if m:
+        stopien       = int(m.group(1))
+        stopien_nazwa = STOPNIE_SK.get(stopien)
+
+    if not stopien:
+        # Fallback: alt text
+        m = _HZS_ALT.search(html)
+        if m:
+            stopien_nazwa = m.group(1)
+            stopien = nazwa_do_stopnia(stopien_nazwa)
+
+    # Waznosc
+    wazne_do = None
+    m = _HZS_PLATNOST.search(html) or _HZS_DATA.search(html)
+    if m: wazne_do = m.group(1).strip()[:60]
+
+    # Opis z sekcji Vystrazenia / ostrzezenia
+    opis = None
+    m = _HZS_VYSTRAHA.search(html)
+    if m:
+        opis_raw = _TAG.sub(" ", m.group(1)).strip()
+        opis = _BIALE.sub(" ", opis_raw)[:300] if len(opis_raw) > 5 else None
+
+    log.info(f"HZS: stopien={stopien} ({stopien_nazwa})")
+    return {"stopien": stopien, "stopien_nazwa": stopien_nazwa,
+            "tendencja": None, "wazne_do": wazne_do,
+            "opis": opis, "kolor": KOLORY.get(stopien)}
+
+
+# -- Parser laviny.sk (static.laviny.sk/simple/YYYY-MM-DD/SK_sk.html) ----------
+# Jedna strona zawiera dane dla wszystkich regionów SK.
+# Sekcja "Tatry" (Vysoké, Západné, Nízke Tatry) - pierwsza sekcja bulletinu.
+
+_STYLE   = re.compile(r"<style[^>]*>.*?</style>", re.DOTALL | re.IGNORECASE)
+_SCRIPT  = re.compile(r"<script[^>]*>.*?</script>", re.DOTALL | re.IGNORECASE)
+_SK_TJ   = re.compile(r"t\.j\.?\s*(\d)\.\s*stupe", re.IGNORECASE)
+_SK_ALT  = (re.compile(r'alt="[^"]*stupe[^"]*(\d)[^"]*"', re.IGNORECASE),
+            re.compile(r'alt="[^"]*(\d)[^"]*stupe[^"]*"', re.IGNORECASE))
+
+_SK_NAZWY = [(nr, re.compile(slowo + r".{0,30}lavinove nebezpecenstvo", re.IGNORECASE), nazwa)
+             for nr, slowo, nazwa in [
+                 (5, "velmi velke", "Veľmi veľké"),
+                 (4, "velke", "Veľké"),
+                 (3, "zvysene", "Zvýšené"),
+                 (2, "mierne", "Mierne"),
+                 (1, "male", "Malé"),
+             ]]
+_SK_WZORCE = {
+    "stupe":     re.compile(r"stupe[^\d]{0,30}(\d)", re.IGNORECASE),
+    "tendencja": re.compile(r"tendencia\s*[:\.]?\s*([a-z][a-záéíóúýäöüčďěľňřšťžů ]{3,60}?)(?:\s*\.|$|\s{2})",
+                            re.IGNORECASE),
+}
+
+
+def parse_laviny_sk(html, region_key="tatry"):
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+
+    # Usuń style/script, potem tagi HTML
+    tekst = _STYLE.sub(" ", html)
+    tekst = _SCRIPT.sub(" ", tekst)
+    tekst = _TAG.sub(" ", tekst)
+    tekst = _SPACJE.sub(" ", tekst)
+    tekst_ascii = _ascii(tekst)
+
+    log.debug(f"laviny.sk tekst_ascii (pierwsze 800): {tekst_ascii[:800]}")
+
+    # Próba 1: "t.j 2. stupe" w tekście; 2: cyfra po "stupe" w ascii;
+    # 3: alt obrazka w oryginalnym HTML; 4: nazwa słowna w ascii
+    stopien = None
+    stopien_nazwa = None
+    m = _SK_TJ.search(tekst)
+    if m:
+        stopien = int(m.group(1))
+    if stopien is None:
+        m = _SK_WZORCE["stupe"].search(tekst_ascii)
+        if m:
+            stopien = int(m.group(1))
+    if stopien is None:
+        m = _SK_ALT[0].search(html) or _SK_ALT[1].search(html)
+        if m:
+            stopien = int(m.group(1))
+    for nr, wzorzec, nazwa in _SK_NAZWY:
+        if wzorzec.search(tekst_ascii):
+            if stopien is None:
+                stopien = nr
+            stopien_nazwa = nazwa
+            break
+
+    if stopien and not stopien_nazwa:
+        stopien_nazwa = STOPNIE_SK.get(stopien)
+
+    # Tendencja - "Tendencia" i następna fraza do kropki lub końca
+    m = _SK_WZORCE["tendencja"].search(tekst_ascii)
+    tendencja = m.group(1).strip()[:120] if m else None
+
+    log.info(f"laviny.sk: stopien={stopien} ({stopien_nazwa}), tendencja={tendencja}")
+    return {"stopien": stopien, "stopien_nazwa": stopien_nazwa,
+            "tendencja": tendencja, "wazne_do": None,
+            "opis": None, "kolor": KOLORY.get(stopien)}
+
+
+PARSERY = {"topr": parse_topr, "hzs": parse_hzs, "laviny_sk": parse_laviny_sk}
+
+
+def parsuj(parser, tekst, region_key="tatry"):
+    """Wywołuje parser po nazwie z ZRODLA[...]["parser"]."""
+    if parser == "laviny_sk":
+        return parse_laviny_sk(tekst, region_key)
+    return PARSERY[parser](tekst)
+
+
+def parsuj_plik(sciezka, parser="laviny_sk", region_key="tatry"):
+    """Parsuje komunikat zapisany na dysku (backfill archiwum - w puli procesów)."""
+    with open(sciezka, "rb") as f:
+        return parsuj(parser, f.read().decode("utf-8", errors="replace"), region_key)
@@ -0,0 +1,54 @@
+"""
+TATRY FLOW - tabela popupów szlaków
+
+Zamiast słownika {klasa_css: {nazwa, typ, dlugosc, ...}} (te same napisy
+powtórzone dla każdego waya bez relacji) popupy są tabelą kolumnową:
+wiersz na klasę CSS, kolumny jako listy, a napisy zastąpione numerami
+w słowniku `napisy` (każdy napis zapisany raz). Geometria (klasy path
+"pp-N" / właściwość "p" w kafelkach) odwołuje się do numeru wiersza,
+strona składa popup z kolumn dopiero po kliknięciu.
+
+Długość to liczba km + flaga `calosc` (1 = cała relacja, 0 = odcinek),
+tekst "Długość ..." składa JS.
+"""
+
+KOLUMNY_NAPISOW = ("nazwa", "typ", "seg_name", "snapshot")
+KOLUMNY_LICZB   = ("km", "calosc", "effort", "atleci", "lat", "lon")
+
+
+class TabelaPopupow:
+
+    def __init__(self):
+        self.wiersze  = {}   # klasa_css -> nr wiersza
+        self.napisy   = []   # nr napisu -> napis
+        self._nr      = {}   # napis -> nr napisu
+        self.kolumny  = {k: [] for k in ("klasa",) + KOLUMNY_NAPISOW + KOLUMNY_LICZB}
+
+    def __contains__(self, klasa_css):
+        return klasa_css in self.wiersze
+
+    def __len__(self):
+        return len(self.wiersze)
+
+    def napis(self, s):
+        nr = self._nr.get(s)
+        if nr is None:
+            nr = self._nr[s] = len(self.napisy)
+            self.napisy.append(s)
+        return nr
+
+    def dodaj(self, klasa_css, **pola):
+        """Dodaje wiersz (jeśli klasy jeszcze nie ma) i zwraca jego numer."""
+        nr = self.wiersze.get(klasa_css)
+        if nr is not None:
+            return nr
+        nr = self.wiersze[klasa_css] = len(self.wiersze)
+        self.kolumny["klasa"].append(klasa_css)
+        for k in KOLUMNY_NAPISOW:
+            self.kolumny[k].append(self.napis(pola.get(k, "")))
+        for k in KOLUMNY_LICZB:
+            self.kolumny[k].append(pola.get(k, 0))
+        return nr
+
+    def do_json(self):
+        return {"napisy": self.napisy, **self.kolumny}
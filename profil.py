@@ -0,0 +1,157 @@
+"""
+TATRY FLOW - pomiar etapów budowy mapy
+
+    raport = RaportBudowy()
+    raport.etap("overpass")   # kończy poprzedni etap (jeśli był) i zaczyna nowy
+    ...
+    raport.etap("render")
+    ...
+    raport.zapisz()           # kończy ostatni etap, zapisuje build_report.json
+
+Dla każdego etapu: czas ścienny, czas CPU procesu, szczyt RSS procesu na
+końcu etapu i jego przyrost w trakcie etapu (ru_maxrss - tylko rośnie).
+Oprócz raportu dopisywana jest jedna linia do build_history.jsonl
+(z hashem commita), żeby workflow mógł śledzić regresje między commitami.
+Ścieżki zmieniają BUILD_REPORT / BUILD_HISTORY - workflowy, które tylko
+odświeżają mapę, piszą raport poza repo (śledzą go tylko buildy z build.yml).
+
+Zmienna PROFIL włącza profilowanie wszystkich etapów, a zapisuje wynik
+tylko dla najwolniejszego:
+    PROFIL=cprofile    -> build_profile.prof + build_profile.txt (top wg cumtime)
+    PROFIL=tracemalloc -> build_profile.txt (top przyrostów alokacji)
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+TOP_LINII = 40
+
+RAPORT_PATH   = os.getenv("BUILD_REPORT", "build_report.json")
+HISTORIA_PATH = os.getenv("BUILD_HISTORY", "build_history.jsonl")
+
+
+def _rss_szczyt_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux podaje KB, macOS bajty
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _zrzut_pamieci():
+    import tracemalloc
+    # Bez alokacji samego tracemalloc (zrzuty porównywane między etapami)
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def _commit():
+    sha = os.environ.get("GITHUB_SHA")
+    if sha:
+        return sha
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+class RaportBudowy:
+
+    def __init__(self, profil=None):
+        self.profil   = profil if profil is not None else os.environ.get("PROFIL", "").lower()
+        self.etapy    = []     # zakończone etapy (dict)
+        self._biezacy = None   # (nazwa, wall0, cpu0, rss0, profiler)
+        self._zrzuty  = {}     # nazwa etapu -> tekst profilu
+        self._prof    = {}     # nazwa etapu -> cProfile.Profile
+        self._start   = (time.perf_counter(), time.process_time())
+        if self.profil == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start()
+
+    def etap(self, nazwa):
+        self.koniec()
+        profiler = None
+        if self.profil == "cprofile":
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif self.profil == "tracemalloc":
+            profiler = _zrzut_pamieci()
+        self._biezacy = (nazwa, time.perf_counter(), time.process_time(), _rss_szczyt_mb(), profiler)
+
+    def koniec(self):
+        if self._biezacy is None:
+            return
+        nazwa, wall0, cpu0, rss0, profiler = self._biezacy
+        self._biezacy = None
+        wall = time.perf_counter() - wall0
+        cpu  = time.process_time() - cpu0
+        rss  = _rss_szczyt_mb()
+        if self.profil == "cprofile":
+            profiler.disable()
+            self._prof[nazwa] = profiler
+        elif self.profil == "tracemalloc":
+            roznice = _zrzut_pamieci().compare_to(profiler, "lineno")
+            self._zrzuty[nazwa] = "\n".join(str(r) for r in roznice[:TOP_LINII])
+        self.etapy.append({
+            "nazwa":           nazwa,
+            "wall_s":          round(wall, 3),
+            "cpu_s":           round(cpu, 3),
+            "rss_szczyt_mb":   rss,
+            "rss_przyrost_mb": round(rss - rss0, 1) if rss is not None else None,
+        })
+        print(f"[etap] {nazwa}: {wall:.2f} s (CPU {cpu:.2f} s), RSS {rss} MB")
+
+    def najwolniejszy(self):
+        return max(self.etapy, key=lambda e: e["wall_s"])["nazwa"] if self.etapy else None
+
+    def _zapisz_profil(self, nazwa, path):
+        if self.profil == "cprofile":
+            import io
+            import pstats
+            profiler = self._prof[nazwa]
+            profiler.dump_stats(os.path.splitext(path)[0] + ".prof")
+            bufor = io.StringIO()
+            pstats.Stats(profiler, stream=bufor).sort_stats("cumulative").print_stats(TOP_LINII)
+            tekst = bufor.getvalue()
+        else:
+            tekst = self._zrzuty[nazwa]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# etap: {nazwa} ({self.profil})\n{tekst}\n")
+
+    def zapisz(self, path=RAPORT_PATH, historia=HISTORIA_PATH,
+               profil_path="build_profile.txt"):
+        self.koniec()
+        wall0, cpu0 = self._start
+        raport = {
+            "commit":  _commit(),
+            "czas":    datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python":  sys.version.split()[0],
+            "etapy":   self.etapy,
+            "razem": {
+                "wall_s":        round(time.perf_counter() - wall0, 3),
+                "cpu_s":         round(time.process_time() - cpu0, 3),
+                "rss_szczyt_mb": _rss_szczyt_mb(),
+            },
+            "najwolniejszy": self.najwolniejszy(),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(raport, f, ensure_ascii=False, indent=2)
+        if historia:
+            with open(historia, "a", encoding="utf-8") as f:
+                f.write(json.dumps(raport, ensure_ascii=False, separators=(",", ":")) + "\n")
+        if self.profil in ("cprofile", "tracemalloc") and raport["najwolniejszy"]:
+            self._zapisz_profil(raport["najwolniejszy"], profil_path)
+            print(f"Profil etapu '{raport['najwolniejszy']}' zapisany do {profil_path}")
+        print(f"Raport budowy: {raport['razem']['wall_s']} s, zapisano {path}")
+        return raport
@@ -0,0 +1,324 @@
+"""
+TATRY FLOW - geometria segmentów Strava w SQLite
+
+segments.polyline trzyma polyline Strava (zakodowany tekst w JSON-ie).
+Tutaj jest dekodowany raz, przy zapisie, do kolumny segments.geom:
+współrzędne skwantowane do 1e-5° (dokładność polyline Strava - bez strat),
+pierwszy punkt bezwzględnie, kolejne jako różnice, każda liczba jako
+zigzag varint. Do tego bbox (polyline + start_latlng/end_latlng, które
+Strava podaje dokładniej niż polyline) w kolumnach min_lat/max_lat/min_lng/max_lng
+i indeks R*Tree segments_rtree na tych samych granicach - zapytania
+przestrzenne (np. segmenty w pobliżu punktu) idą przez indeks w SQL.
+
+migruj() dodaje kolumny / R*Tree do istniejącej bazy i uzupełnia geometrię
+segmentów zapisanych wcześniej tylko jako polyline (albo z bboxem, który
+nie obejmuje punktu startowego).
+
+Zapytania: R*Tree daje prefiltr po bbox, dokładny warunek (dystans od
+punktu startowego segmentu) liczony jest dopiero na kandydatach. Drugi
+indeks, osm_ways_rtree, trzyma bboxy wayów OSM z ostatniej budowy mapy.
+Spatial join wielu punktów naraz (kandydaci_dla_punktow) idzie jednym
+złączeniem tabeli tymczasowej z R*Tree. Bez bazy (albo gdy nie pokrywa
+segmentów z traffic_data.json) indeks_w_pamieci() buduje te same tabele
+w :memory: z punktów startowych - zapytania są identyczne.
+"""
+
+import os
+import json
+import math
+import sqlite3
+import logging
+
+import numpy as np
+
+log = logging.getLogger("przestrzen")
+
+SKALA = 100_000   # 1e-5° ~ 1.1 m
+
+SCHEMA_RTREE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_rtree USING rtree(
+    id, min_lat, max_lat, min_lng, max_lng
+);
+"""
+
+SCHEMA_WAYE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS osm_ways_rtree USING rtree(
+    id, min_lat, max_lat, min_lng, max_lng
+);
+"""
+
+KM_NA_STOPIEN = 111
+
+KOLUMNY = [("geom", "BLOB"), ("min_lat", "REAL"), ("max_lat", "REAL"),
+           ("min_lng", "REAL"), ("max_lng", "REAL")]
+
+
+# -- Kodowanie ----------------------------------------------------------------
+
+def dekoduj_polyline(tekst, precyzja=5):
+    """Encoded polyline (Google / Strava) -> lista (lat, lng)."""
+    punkty, liczby, wynik, przesuniecie = [], [], 0, 0
+    for znak in tekst or "":
+        b = ord(znak) - 63
+        wynik |= (b & 0x1F) << przesuniecie
+        przesuniecie += 5
+        if b < 0x20:
+            liczby.append(~(wynik >> 1) if wynik & 1 else wynik >> 1)
+            wynik, przesuniecie = 0, 0
+    lat = lng = 0
+    dzielnik = 10 ** precyzja
+    for i in range(0, len(liczby) - 1, 2):
+        lat += liczby[i]
+        lng += liczby[i + 1]
+        punkty.append((lat / dzielnik, lng / dzielnik))
+    return punkty
+
+
+def koduj_geom(punkty):
+    """Lista (lat, lng) -> BLOB: zigzag varinty różnic skwantowanych współrzędnych."""
+    out = bytearray()
+    poprz_lat = poprz_lng = 0
+    for lat, lng in punkty:
+        qlat, qlng = round(lat * SKALA), round(lng * SKALA)
+        for d in (qlat - poprz_lat, qlng - poprz_lng):
+            z = (d << 1) ^ (d >> 63)
+            while z >= 0x80:
+                out.append((z & 0x7F) | 0x80)
+                z >>= 7
+            out.append(z)
+        poprz_lat, poprz_lng = qlat, qlng
+    return bytes(out)
+
+
+def dekoduj_geom(blob):
+    """BLOB z koduj_geom() -> lista (lat, lng)."""
+    liczby, z, przesuniecie = [], 0, 0
+    for b in blob or b"":
+        z |= (b & 0x7F) << przesuniecie
+        przesuniecie += 7
+        if b < 0x80:
+            liczby.append((z >> 1) ^ -(z & 1))
+            z, przesuniecie = 0, 0
+    punkty, lat, lng = [], 0, 0
+    for i in range(0, len(liczby) - 1, 2):
+        lat += liczby[i]
+        lng += liczby[i + 1]
+        punkty.append((lat / SKALA, lng / SKALA))
+    return punkty
+
+
+def obwiednia(punkty):
+    """(min_lat, max_lat, min_lng, max_lng) albo None dla pustej geometrii."""
+    if not punkty:
+        return None
+    lats = [p[0] for p in punkty]
+    lngs = [p[1] for p in punkty]
+    return min(lats), max(lats), min(lngs), max(lngs)
+
+
+# -- Baza -----------------------------------------------------------------------
+
+def _wiersz_geometrii(polyline, koncowki=()):
+    punkty = dekoduj_polyline(polyline)
+    bbox   = obwiednia(punkty + [p for p in koncowki
+                                 if p and len(p) == 2 and None not in p])
+    return (koduj_geom(punkty) if punkty else None), bbox
+
+
+def zapisz_geometrie(conn, segment_id, polyline, koncowki=()):
+    """
+    Zapisuje geom + bbox segmentu i jego wpis w segments_rtree (bez commit).
+    koncowki - (start_latlng, end_latlng) dołączane do bboxa.
+    """
+    geom, bbox = _wiersz_geometrii(polyline, koncowki)
+    conn.execute("""
+        UPDATE segments SET geom = ?, min_lat = ?, max_lat = ?, min_lng = ?, max_lng = ?
+        WHERE id = ?
+    """, (geom, *(bbox or (None,) * 4), segment_id))
+    conn.execute("DELETE FROM segments_rtree WHERE id = ?", (segment_id,))
+    if bbox:
+        conn.execute("INSERT INTO segments_rtree VALUES (?,?,?,?,?)", (segment_id, *bbox))
+
+
+def polyline_z_kolumny(wartosc):
+    """segments.polyline jest zapisywane jako json.dumps(points) - zwraca sam polyline."""
+    if not wartosc:
+        return ""
+    try:
+        tekst = json.loads(wartosc)
+    except ValueError:
+        return wartosc
+    return tekst if isinstance(tekst, str) else ""
+
+
+def migruj(conn):
+    """Dodaje kolumny geometrii i segments_rtree; uzupełnia segmenty bez geom (bez commit)."""
+    istniejace = {row[1] for row in conn.execute("PRAGMA table_info(segments)")}
+    for kolumna, typ in KOLUMNY:
+        if kolumna not in istniejace:
+            conn.execute(f"ALTER TABLE segments ADD COLUMN {kolumna} {typ}")
+    conn.executescript(SCHEMA_RTREE)
+
+    braki = conn.execute("""
+        SELECT id, polyline, start_lat, start_lng, end_lat, end_lng FROM segments
+        WHERE (polyline NOT IN ('', '""') OR start_lat IS NOT NULL)
+          AND (min_lat IS NULL
+               OR start_lat < min_lat OR start_lat > max_lat
+               OR start_lng < min_lng OR start_lng > max_lng)
+    """).fetchall()
+    if not braki:
+        return 0
+    segmenty, rtree = [], []
+    for segment_id, polyline, *koncowki in braki:
+        geom, bbox = _wiersz_geometrii(polyline_z_kolumny(polyline),
+                                       (tuple(koncowki[:2]), tuple(koncowki[2:])))
+        if bbox:
+            segmenty.append((geom, *bbox, segment_id))
+            rtree.append((segment_id, *bbox))
+    conn.executemany("""
+        UPDATE segments SET geom = ?, min_lat = ?, max_lat = ?, min_lng = ?, max_lng = ?
+        WHERE id = ?
+    """, segmenty)
+    conn.executemany("INSERT OR REPLACE INTO segments_rtree VALUES (?,?,?,?,?)", rtree)
+    log.info(f"Migracja: geometria dla {len(segmenty)} segmentow")
+    return len(segmenty)
+
+
+# -- Zapytania ------------------------------------------------------------------
+
+def _okno(lat, lng, promien_km):
+    """Okno (min_lat, max_lat, min_lng, max_lng) wokół punktu, z 1% zapasu na zaokrąglenia."""
+    dlat = promien_km / KM_NA_STOPIEN * 1.01
+    dlng = promien_km / (KM_NA_STOPIEN * max(math.cos(math.radians(lat)), 1e-6)) * 1.01
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def dystans_km(lat1, lng1, lat2, lng2):
+    """Przybliżenie równoodległościowe (cos szerokości pierwszego punktu), jak w mapie."""
+    dlat = (lat2 - lat1) * KM_NA_STOPIEN
+    dlng = (lng2 - lng1) * KM_NA_STOPIEN * math.cos(math.radians(lat1))
+    return math.sqrt(dlat ** 2 + dlng ** 2)
+
+
+def segmenty_w_poblizu(conn, lat, lng, promien_km=0.55):
+    """Segmenty z punktem startowym w promieniu od punktu: [(id, dystans_km)] od najbliższego."""
+    wynik = []
+    for segment_id, s_lat, s_lng in conn.execute("""
+        SELECT s.id, s.start_lat, s.start_lng
+        FROM segments_rtree r JOIN segments s ON s.id = r.id
+        WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lng >= ? AND r.min_lng <= ?
+    """, _okno(lat, lng, promien_km)):
+        if s_lat is None or s_lng is None:
+            continue
+        d = dystans_km(lat, lng, s_lat, s_lng)
+        if d <= promien_km:
+            wynik.append((segment_id, d))
+    return sorted(wynik, key=lambda x: x[1])
+
+
+def kandydaci_dla_punktow(conn, punkty, promien_km=0.55):
+    """
+    Spatial join wielu punktów naraz: okna punktów w tabeli tymczasowej,
+    złączenie z segments_rtree. Zwraca dla każdego punktu listę id segmentów,
+    których bbox przecina okno - nadzbiór segmentów z punktem startowym
+    w promieniu (dokładny dystans liczy wołający).
+    """
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS okna_punktow
+            (nr INTEGER PRIMARY KEY, min_lat REAL, max_lat REAL, min_lng REAL, max_lng REAL)
+    """)
+    conn.execute("DELETE FROM temp.okna_punktow")
+    conn.executemany("INSERT INTO temp.okna_punktow VALUES (?,?,?,?,?)",
+                     ((nr, *_okno(float(lat), float(lng), promien_km))
+                      for nr, (lat, lng) in enumerate(punkty)))
+    wynik = [[] for _ in punkty]
+    for nr, segment_id in conn.execute("""
+        SELECT o.nr, r.id FROM temp.okna_punktow o, segments_rtree r
+        WHERE r.max_lat >= o.min_lat AND r.min_lat <= o.max_lat
+          AND r.max_lng >= o.min_lng AND r.min_lng <= o.max_lng
+    """):
+        wynik[nr].append(segment_id)
+    return wynik
+
+
+def zapisz_bbox_wayow(conn, magazyn):
+    """Przepisuje osm_ways_rtree bboxami wszystkich niepustych wayów z MagazynGeometrii."""
+    conn.executescript(SCHEMA_WAYE)
+    conn.execute("DELETE FROM osm_ways_rtree")
+    wsp, offsety, ids = magazyn.wspolrzedne, magazyn.offsety, magazyn.ids
+    niepuste = offsety[1:] > offsety[:-1]
+    if not niepuste.any():
+        return 0
+    poczatki = offsety[:-1][niepuste]
+    bboxy = np.column_stack([np.minimum.reduceat(wsp[:, 0], poczatki),
+                             np.maximum.reduceat(wsp[:, 0], poczatki),
+                             np.minimum.reduceat(wsp[:, 1], poczatki),
+                             np.maximum.reduceat(wsp[:, 1], poczatki)])
+    conn.executemany("INSERT INTO osm_ways_rtree VALUES (?,?,?,?,?)",
+                     ((int(w), *map(float, b)) for w, b in zip(ids[niepuste], bboxy)))
+    return int(niepuste.sum())
+
+
+def waye_w_obszarze(conn, min_lat, max_lat, min_lng, max_lng):
+    """Id wayów, których bbox przecina prostokąt."""
+    return [row[0] for row in conn.execute("""
+        SELECT id FROM osm_ways_rtree
+        WHERE max_lat >= ? AND min_lat <= ? AND max_lng >= ? AND min_lng <= ?
+    """, (min_lat, max_lat, min_lng, max_lng))]
+
+
+def waye_przy_segmentach(conn, promien_km=0.55):
+    """
+    Id wayów, których bbox leży bliżej niż promien_km od bboxa któregoś segmentu
+    (złączenie dwóch R*Tree). Waye spoza zbioru nie mają segmentu w promieniu
+    od żadnego swojego punktu.
+    """
+    max_lat = conn.execute("SELECT MAX(max_lat) FROM segments_rtree").fetchone()[0]
+    if max_lat is None:
+        return set()
+    dlat = promien_km / KM_NA_STOPIEN * 1.01
+    dlng = promien_km / (KM_NA_STOPIEN * max(math.cos(math.radians(max_lat + dlat)), 1e-6)) * 1.01
+    return {row[0] for row in conn.execute("""
+        SELECT DISTINCT w.id FROM segments_rtree s, osm_ways_rtree w
+        WHERE w.max_lat >= s.min_lat - ? AND w.min_lat <= s.max_lat + ?
+          AND w.max_lng >= s.min_lng - ? AND w.min_lng <= s.max_lng + ?
+    """, (dlat, dlat, dlng, dlng))}
+
+
+def indeks_w_pamieci(segmenty):
+    """
+    Indeks :memory: z listy segmentów {"id", "lat", "lng"} (np. z traffic_data.json):
+    tabela segments z punktem startowym i segments_rtree z bboxem-punktem.
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE segments (id INTEGER PRIMARY KEY, start_lat REAL, start_lng REAL)")
+    conn.executescript(SCHEMA_RTREE)
+    conn.executemany("INSERT OR REPLACE INTO segments VALUES (?,?,?)",
+                     ((s["id"], s["lat"], s["lng"]) for s in segmenty))
+    conn.executemany("INSERT OR REPLACE INTO segments_rtree VALUES (?,?,?,?,?)",
+                     ((s["id"], s["lat"], s["lat"], s["lng"], s["lng"]) for s in segmenty))
+    return conn
+
+
+def otworz_indeks(db_path, segmenty):
+    """
+    Połączenie z bazą, jeśli jej segments_rtree pokrywa wszystkie segmenty
+    (punkt startowy w bboxie segmentu), inaczej indeks_w_pamieci(segmenty).
+    """
+    if db_path and os.path.exists(db_path):
+        try:
+            conn = sqlite3.connect(db_path)
+            bboxy = {row[0]: row[1:] for row in conn.execute(
+                "SELECT id, min_lat, max_lat, min_lng, max_lng FROM segments_rtree")}
+            # R*Tree trzyma float32 zaokrąglone na zewnątrz - porównanie z małym zapasem
+            e = 1e-6
+            if all(s["id"] in bboxy
+                   and bboxy[s["id"]][0] - e <= s["lat"] <= bboxy[s["id"]][1] + e
+                   and bboxy[s["id"]][2] - e <= s["lng"] <= bboxy[s["id"]][3] + e
+                   for s in segmenty):
+                return conn
+            conn.close()
+            log.info(f"{db_path}: segments_rtree nie pokrywa segmentów - indeks w pamięci")
+        except sqlite3.Error as e:
+            log.info(f"{db_path}: brak segments_rtree ({e}) - indeks w pamięci")
+    return indeks_w_pamieci(segmenty)
@@ -0,0 +1,167 @@
+"""
+TATRY FLOW - retencja snapshotów Strava (warstwy dzienna / tygodniowa / miesięczna)
+
+Tabela snapshots trzyma pełną rozdzielczość dzienną tylko z ostatnich
+SNAPSHOT_DAILY_MONTHS miesięcy. Starsze dni zwijane są do snapshots_weekly
+(tydzień od poniedziałku), a tygodnie starsze niż SNAPSHOT_WEEKLY_MONTHS
+do snapshots_monthly. Wiersz warstwy to stan liczników na koniec okresu:
+effort_count / athlete_count i captured_at ostatniego snapshotu w okresie.
+Przyrost efortów za okres to różnica z poprzednim wierszem segmentu, więc
+suma przyrostów (i ostatni stan licznika) po zwinięciu się nie zmienia.
+
+Widok snapshots_all łączy trzy warstwy; widok traffic liczy z niego
+przyrosty (daily_efforts - dla wierszy zwiniętych przyrost za cały okres,
+kolumna resolution mówi za jaki). Eksport i raport kolektora czytają
+snapshots_all.
+"""
+
+import os
+import sqlite3
+import logging
+from datetime import date
+
+MIESIACE_DZIENNE    = int(os.getenv("SNAPSHOT_DAILY_MONTHS", "6"))
+MIESIACE_TYGODNIOWE = int(os.getenv("SNAPSHOT_WEEKLY_MONTHS", "24"))
+
+log = logging.getLogger("retencja")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots_weekly (
+    segment_id     INTEGER NOT NULL,
+    period_start   TEXT NOT NULL,
+    captured_at    TEXT NOT NULL,
+    effort_count   INTEGER,
+    athlete_count  INTEGER,
+    PRIMARY KEY (segment_id, period_start)
+);
+
+CREATE TABLE IF NOT EXISTS snapshots_monthly (
+    segment_id     INTEGER NOT NULL,
+    period_start   TEXT NOT NULL,
+    captured_at    TEXT NOT NULL,
+    effort_count   INTEGER,
+    athlete_count  INTEGER,
+    PRIMARY KEY (segment_id, period_start)
+);
+
+CREATE VIEW IF NOT EXISTS snapshots_all AS
+    SELECT segment_id, captured_at, effort_count, athlete_count, 'day'   AS resolution FROM snapshots
+    UNION ALL
+    SELECT segment_id, captured_at, effort_count, athlete_count, 'week'  AS resolution FROM snapshots_weekly
+    UNION ALL
+    SELECT segment_id, captured_at, effort_count, athlete_count, 'month' AS resolution FROM snapshots_monthly;
+"""
+
+WIDOK_TRAFFIC = """
+CREATE VIEW traffic AS
+    SELECT
+        segment_id,
+        captured_at                       AS date,
+        effort_count                      AS effort_count_cumulative,
+        effort_count - COALESCE(
+            LAG(effort_count) OVER (PARTITION BY segment_id ORDER BY captured_at), 0
+        )                                 AS daily_efforts,
+        athlete_count,
+        resolution
+    FROM snapshots_all;
+"""
+
+# Początek okresu dla daty captured_at: poniedziałek tygodnia / 1. dzień miesiąca
+_OKRES = {
+    "snapshots_weekly":  "date(captured_at, '-6 days', 'weekday 1')",
+    "snapshots_monthly": "date(captured_at, 'start of month')",
+}
+
+# Ostatni snapshot okresu wygrywa - także gdy okres był już zwinięty, a do
+# warstwy niższej wróciły dni z tego okresu (np. po --reparse z archiwum).
+_ZWIN_SQL = """
+    INSERT INTO {cel} (segment_id, period_start, captured_at, effort_count, athlete_count)
+    SELECT segment_id, {okres} AS okres, MAX(captured_at), effort_count, athlete_count
+    FROM {zrodlo}
+    WHERE captured_at < ?
+    GROUP BY segment_id, okres
+    ON CONFLICT(segment_id, period_start) DO UPDATE SET
+        effort_count  = CASE WHEN excluded.captured_at >= captured_at
+                             THEN excluded.effort_count ELSE effort_count END,
+        athlete_count = CASE WHEN excluded.captured_at >= captured_at
+                             THEN excluded.athlete_count ELSE athlete_count END,
+        captured_at   = MAX(captured_at, excluded.captured_at)
+"""
+
+
+def przygotuj(conn):
+    """Tabele warstw i widoki; traffic sprzed retencji (tylko snapshots) jest podmieniany."""
+    conn.executescript(SCHEMA)
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'traffic'").fetchone()
+    if sql is None or "snapshots_all" not in sql[0]:
+        conn.execute("DROP VIEW IF EXISTS traffic")
+        conn.execute(WIDOK_TRAFFIC)
+
+
+def widoki_tymczasowe(conn):
+    """
+    Dla połączenia tylko do odczytu (api.py): gdy baza nie przeszła jeszcze
+    przygotuj(), snapshots_all i traffic powstają jako widoki TEMP (schemat
+    temp jest przeszukiwany przed main). Zwraca listę utworzonych widoków.
+    """
+    obiekty = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'view')"))
+    if "snapshots" not in obiekty:
+        raise sqlite3.OperationalError("brak tabeli snapshots")
+    utworzone = []
+    if "snapshots_all" not in obiekty:
+        warstwy = [f"SELECT segment_id, captured_at, effort_count, athlete_count, '{res}' AS resolution "
+                   f"FROM {tabela}"
+                   for tabela, res in (("snapshots", "day"), ("snapshots_weekly", "week"),
+                                       ("snapshots_monthly", "month"))
+                   if tabela in obiekty]
+        conn.execute("CREATE TEMP VIEW snapshots_all AS " + " UNION ALL ".join(warstwy))
+        utworzone.append("snapshots_all")
+    if "snapshots_all" not in (obiekty.get("traffic") or ""):
+        conn.execute(WIDOK_TRAFFIC.replace("CREATE VIEW", "CREATE TEMP VIEW", 1))
+        utworzone.append("traffic")
+    return utworzone
+
+
+def granice(dzis, miesiace_dzienne=MIESIACE_DZIENNE, miesiace_tygodniowe=MIESIACE_TYGODNIOWE):
+    """
+    (granica_dni, granica_tygodni) dla dnia dzis: dni przed pierwszą idą do
+    tygodni, tygodnie przed drugą do miesięcy. Granice leżą na początku
+    tygodnia / miesiąca, żeby okres nie był zwijany po kawałku.
+    """
+    miesiace_tygodniowe = max(miesiace_tygodniowe, miesiace_dzienne)
+    d = date.fromisoformat(dzis)
+
+    def cofnij(miesiace, dzien=1):
+        rok, mies = divmod(d.year * 12 + d.month - 1 - miesiace, 12)
+        return date(rok, mies + 1, dzien)
+
+    # poniedziałek tygodnia, w którym wypada dzis - N miesięcy
+    dni = cofnij(miesiace_dzienne, min(d.day, 28))
+    granica_dni = date.fromordinal(dni.toordinal() - dni.weekday())
+    return granica_dni.isoformat(), cofnij(miesiace_tygodniowe).isoformat()
+
+
+def zwin(conn, dzis=None, miesiace_dzienne=MIESIACE_DZIENNE, miesiace_tygodniowe=MIESIACE_TYGODNIOWE,
+         vacuum=True):
+    """
+    Zwija dni sprzed granicy do tygodni, a tygodnie do miesięcy (jedna
+    transakcja). Zwraca (zwinięte dni, zwinięte tygodnie); gdy coś ubyło,
+    VACUUM oddaje zwolnione strony (vacuum=False pomija - np. świeżo
+    zbudowana baza).
+    """
+    przygotuj(conn)
+    granica_dni, granica_tygodni = granice(dzis or date.today().isoformat(),
+                                           miesiace_dzienne, miesiace_tygodniowe)
+    zwiniete = []
+    with conn:
+        for zrodlo, cel, granica in (("snapshots",        "snapshots_weekly",  granica_dni),
+                                     ("snapshots_weekly", "snapshots_monthly", granica_tygodni)):
+            conn.execute(_ZWIN_SQL.format(cel=cel, zrodlo=zrodlo, okres=_OKRES[cel]), (granica,))
+            zwiniete.append(conn.execute(f"DELETE FROM {zrodlo} WHERE captured_at < ?",
+                                         (granica,)).rowcount)
+    if any(zwiniete):
+        if vacuum:
+            conn.execute("VACUUM")
+        log.info(f"Retencja: {zwiniete[0]} dni przed {granica_dni} -> tygodnie, "
+                 f"{zwiniete[1]} tygodni przed {granica_tygodni} -> miesiace")
+    return tuple(zwiniete)
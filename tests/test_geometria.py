@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geometria import MagazynGeometrii, dlugosc_km, dlugosci_wayow
+
+
+def test_dlugosci_pusty_way_na_koncu():
+    m = MagazynGeometrii()
+    m.dodaj(1, [(49.2, 20.0), (49.21, 20.0)])
+    m.dodaj(2, [])
+    dl = dlugosci_wayow(m)
+    assert dl[1] == pytest.approx(1.11)
+    assert dl[2] == 0.0
+
+
+def test_dlugosci_puste_i_jednopunktowe_waye():
+    m = MagazynGeometrii()
+    m.dodaj(1, [])
+    m.dodaj(2, [(49.2, 20.0), (49.21, 20.0), (49.21, 20.01)])
+    m.dodaj(3, [(49.3, 20.1)])
+    m.dodaj(4, [])
+    m.dodaj(5, [(49.25, 20.05), (49.26, 20.06)])
+    m.dodaj(6, [])
+    dl = dlugosci_wayow(m)
+    assert dl == {1: 0.0, 2: round(dlugosc_km(m.punkty(2)), 2), 3: 0.0, 4: 0.0,
+                  5: round(dlugosc_km(m.punkty(5)), 2), 6: 0.0}
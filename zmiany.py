@@ -0,0 +1,321 @@
+"""
+TATRY FLOW - dzienne zestawy zmian bazy zamiast commitowania tatry_segments.db
+
+Workflow nie commituje już całej bazy (codziennie nowy 3 MB blob w historii
+gita), tylko katalog ZMIANY_DIR: na każdy dzień podkatalog zmiany/RRRR-MM-DD/
+z plikami CSV wierszy, które tego dnia przybyły - snapshoty Strava, nowe
+segmenty, segmenty widziane w explore, pogoda, komunikaty lawinowe, indeks
+archiwum surowych odpowiedzi, przebiegi kolektora. Wiersze posortowane po
+kluczu, NULL zapisany jako \\N, dzień tylko w nazwie katalogu.
+
+Pliki są tylko dopisywane: ponowny eksport dnia łączy się z tym, co już jest
+w pliku (wiersz z bazy wygrywa), więc snapshoty zwinięte przez retencję ani
+last_seen przesunięte na kolejny dzień z pliku nie znikają.
+
+--wczytaj dopisuje zestawy do istniejącej bazy: schemat i migracje
+fetcherów, dni po kolei (upsert - baza może już mieć część danych),
+geometria segmentów (przestrzen.migruj) i retencja. Na starcie joba bazę
+od zera buduje szybszy odbudowa.py (ostatnia zacommitowana
+tatry_segments.db + zestawy).
+
+Uzycie:
+  python zmiany.py --eksport                        # ostatnie ZMIANY_DNI dni z bazy do zmiany/
+  python zmiany.py --eksport --od 2026-03-01        # zakres dni (--do domyslnie dzis)
+  python zmiany.py --eksport --wszystko             # cala historia z bazy
+  python zmiany.py --wczytaj                        # odbuduj baze z zmiany/
+"""
+
+import io
+import os
+import csv
+import time
+import runpy
+import sqlite3
+import logging
+import argparse
+from datetime import date, timedelta
+
+import przestrzen
+import retencja
+
+DB_PATH     = os.getenv("DB_PATH", "tatry_segments.db")
+ZMIANY_DIR  = os.getenv("ZMIANY_DIR", "zmiany")
+ZMIANY_DNI  = int(os.getenv("ZMIANY_DNI", "7"))
+LOG_LEVEL   = os.getenv("LOG_LEVEL", "INFO")
+KATALOG     = os.path.dirname(os.path.abspath(__file__))
+FETCHERY    = ("Strava API fetcher.py", "imgw fetcher.py", "avalanche fetcher.py")
+NULL        = "\\N"
+
+log = logging.getLogger("zmiany")
+
+# plik -> (tabela, dzień wiersza w SQL, kolumny klucza w obrębie dnia, pozostałe kolumny, upsert)
+# Upsert dostaje kolumny klucza, pozostałe i na końcu dzień (KOPIE_DNIA, do_upsertu).
+ZESTAW = {
+    "segments": (
+        "segments", "first_seen", ("id",),
+        ("name", "activity_type", "start_lat", "start_lng", "end_lat", "end_lng",
+         "climb_category", "avg_grade", "elev_difference", "distance", "polyline", "osm_way_id"),
+        """INSERT INTO segments
+               (id, name, activity_type, start_lat, start_lng, end_lat, end_lng,
+                climb_category, avg_grade, elev_difference, distance, polyline, osm_way_id,
+                first_seen, last_seen)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(id) DO UPDATE SET
+               name = excluded.name, activity_type = excluded.activity_type,
+               start_lat = excluded.start_lat, start_lng = excluded.start_lng,
+               end_lat = excluded.end_lat, end_lng = excluded.end_lng,
+               climb_category = excluded.climb_category, avg_grade = excluded.avg_grade,
+               elev_difference = excluded.elev_difference, distance = excluded.distance,
+               polyline = excluded.polyline, osm_way_id = excluded.osm_way_id,
+               first_seen = MIN(COALESCE(first_seen, excluded.first_seen), excluded.first_seen),
+               last_seen  = MAX(COALESCE(last_seen, excluded.last_seen), excluded.last_seen)"""),
+    "segments_seen": (
+        "segments", "last_seen", ("id",), (),
+        "UPDATE segments SET last_seen = MAX(COALESCE(last_seen, ?2), ?2) WHERE id = ?1"),
+    "snapshots": (
+        "snapshots", "captured_at", ("segment_id",), ("effort_count", "athlete_count"),
+        """INSERT INTO snapshots (segment_id, effort_count, athlete_count, captured_at)
+           VALUES (?, ?, ?, ?)
+           ON CONFLICT(segment_id, captured_at) DO UPDATE SET
+               effort_count = excluded.effort_count, athlete_count = excluded.athlete_count"""),
+    "weather_snapshots": (
+        "weather_snapshots", "captured_at", ("station_key",),
+        ("temperatura", "predkosc_wiatru", "kierunek_wiatru", "wilgotnosc",
+         "suma_opadu", "cisnienie", "godzina_pomiaru"),
+        """INSERT INTO weather_snapshots
+               (station_key, temperatura, predkosc_wiatru, kierunek_wiatru, wilgotnosc,
+                suma_opadu, cisnienie, godzina_pomiaru, captured_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(station_key, captured_at) DO UPDATE SET
+               temperatura = excluded.temperatura, predkosc_wiatru = excluded.predkosc_wiatru,
+               kierunek_wiatru = excluded.kierunek_wiatru, wilgotnosc = excluded.wilgotnosc,
+               suma_opadu = excluded.suma_opadu, cisnienie = excluded.cisnienie,
+               godzina_pomiaru = excluded.godzina_pomiaru"""),
+    "avalanche_bulletins": (
+        "avalanche_bulletins", "captured_at", ("source_key",),
+        ("stopien", "stopien_nazwa", "tendencja", "wazne_do", "opis", "last_updated"),
+        """INSERT INTO avalanche_bulletins
+               (source_key, stopien, stopien_nazwa, tendencja, wazne_do, opis, last_updated, captured_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(source_key, captured_at) DO UPDATE SET
+               stopien = excluded.stopien, stopien_nazwa = excluded.stopien_nazwa,
+               tendencja = excluded.tendencja, wazne_do = excluded.wazne_do,
+               opis = excluded.opis, last_updated = excluded.last_updated"""),
+    "raw_responses": (
+        "raw_responses", "captured_at", ("source", "key", "sha256"),
+        ("fetched_at", "url", "size", "codec", "encoding"),
+        """INSERT INTO raw_responses (source, key, sha256, fetched_at, url, size, codec, encoding, captured_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(source, key, captured_at, sha256) DO UPDATE SET
+               fetched_at = MAX(fetched_at, excluded.fetched_at),
+               encoding   = COALESCE(excluded.encoding, encoding)"""),
+    "collection_runs": (
+        "collection_runs", "run_date", ("id",),
+        ("started_at", "updated_at", "finished_at", "stage", "tiles_done", "queue_pos",
+         "last_segment_id", "segments_found", "snapshots_saved", "errors",
+         "rate_usage", "rate_limit", "rate_reset", "token_expires_at", "status"),
+        """INSERT OR REPLACE INTO collection_runs
+               (id, started_at, updated_at, finished_at, stage, tiles_done, queue_pos,
+                last_segment_id, segments_found, snapshots_saved, errors,
+                rate_usage, rate_limit, rate_reset, token_expires_at, status, run_date)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""),
+    "collection_log": (
+        "collection_log", "substr(started_at, 1, 10)", ("id",),
+        ("started_at", "finished_at", "tiles_queried", "segments_found",
+         "snapshots_saved", "errors", "status"),
+        """INSERT OR REPLACE INTO collection_log
+               (id, started_at, finished_at, tiles_queried, segments_found,
+                snapshots_saved, errors, status)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""),
+}
+
+# Ile razy dzień zestawu dochodzi na koniec wiersza upsertu (segments: first_seen i last_seen)
+KOPIE_DNIA = {"segments": 2, "collection_log": 0}
+
+
+def _tekst(v):
+    return NULL if v is None else str(v)
+
+
+def _liczba(p):
+    try:
+        return int(p)
+    except ValueError:
+        return float(p)
+
+
+def _konwersje(conn, tabela, kolumny):
+    """
+    Tekst pola -> wartość wg zadeklarowanego typu kolumny. Liczby nie idą przez
+    afinitet kolumny: konwersja tekstu na REAL w SQLite nie zawsze trafia w ten
+    sam float, który dał str().
+    """
+    typy = {r[1]: r[2].upper() for r in conn.execute(f"PRAGMA table_info({tabela})")}
+    return [_liczba if typy.get(k) in ("INTEGER", "REAL") else str for k in kolumny]
+
+
+def _klucz_sortowania(klucz):
+    return tuple((0, int(x)) if x.lstrip("-").isdigit() else (1, x) for x in klucz)
+
+
+def _czytaj_csv(sciezka, kolumn):
+    """
+    Wiersze pliku zestawu (bez nagłówka) jako listy tekstów. Kolumny dopisane
+    na końcu zestawu później (np. raw_responses.encoding) w starszych plikach
+    są uzupełniane NULL-em.
+    """
+    with open(sciezka, encoding="utf-8", newline="") as f:
+        wiersze = csv.reader(f)
+        next(wiersze, None)
+        return [w + [NULL] * (kolumn - len(w)) for w in wiersze]
+
+
+def _zapisz_plik(sciezka, naglowek, n_klucza, wiersze):
+    """
+    Łączy wiersze z istniejącym plikiem (po kluczu, nowe wygrywają) i zapisuje,
+    jeśli treść się zmieniła. Zwraca True, gdy plik został zapisany.
+    """
+    wg_klucza = {}
+    if os.path.exists(sciezka):
+        wg_klucza = {tuple(w[:n_klucza]): w for w in _czytaj_csv(sciezka, len(naglowek))}
+    wg_klucza.update((tuple(w[:n_klucza]), w) for w in wiersze)
+    linie = [naglowek] + [wg_klucza[k] for k in sorted(wg_klucza, key=_klucz_sortowania)]
+
+    bufor = io.StringIO()
+    csv.writer(bufor, lineterminator="\n").writerows(linie)
+    tresc = bufor.getvalue()
+    if os.path.exists(sciezka):
+        with open(sciezka, encoding="utf-8", newline="") as f:
+            if f.read() == tresc:
+                return False
+    os.makedirs(os.path.dirname(sciezka), exist_ok=True)
+    with open(sciezka + ".tmp", "w", encoding="utf-8", newline="") as f:
+        f.write(tresc)
+    os.replace(sciezka + ".tmp", sciezka)
+    return True
+
+
+def _tabele(conn):
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _kolumny_sql(conn, tabela, kolumny):
+    """Lista SELECT kolumn; brakujące w bazie sprzed migracji (np. raw_responses.encoding) jako NULL."""
+    istniejace = {r[1] for r in conn.execute(f"PRAGMA table_info({tabela})")}
+    return ", ".join(k if k in istniejace else f"NULL AS {k}" for k in kolumny)
+
+
+def eksportuj(conn, od, do, katalog=ZMIANY_DIR):
+    """Zestawy zmian dni od..do (włącznie) z bazy; zwraca liczbę zapisanych plików."""
+    tabele = _tabele(conn)
+    zapisane = 0
+    for plik, (tabela, dzien_sql, klucz, reszta, _) in ZESTAW.items():
+        if tabela not in tabele:
+            continue
+        kolumny = list(klucz) + list(reszta)
+        wiersze = conn.execute(f"""
+            SELECT {dzien_sql}, {_kolumny_sql(conn, tabela, kolumny)} FROM {tabela}
+            WHERE {dzien_sql} BETWEEN ? AND ?
+            ORDER BY 1
+        """, (od, do)).fetchall()
+        dni = {}
+        for w in wiersze:
+            dni.setdefault(w[0], []).append([_tekst(v) for v in w[1:]])
+        for dzien, lista in dni.items():
+            sciezka = os.path.join(katalog, dzien, plik + ".csv")
+            zapisane += _zapisz_plik(sciezka, kolumny, len(klucz), lista)
+    log.info(f"Eksport zmian {od or 'od poczatku'} .. {do}: {zapisane} plikow zapisanych w {katalog}/")
+    return zapisane
+
+
+def przygotuj_baze():
+    """Schemat i migracje wszystkich fetcherów (pliki ze spacjami w nazwie - przez runpy)."""
+    for plik in FETCHERY:
+        modul = runpy.run_path(os.path.join(KATALOG, plik), run_name="zmiany")
+        if "init_db" in modul:
+            modul["init_db"]()
+        else:
+            modul["get_db"]().close()
+
+
+def dni_zestawow(katalog=ZMIANY_DIR):
+    if not os.path.isdir(katalog):
+        return []
+    return sorted(d for d in os.listdir(katalog)
+                  if len(d) == 10 and os.path.isdir(os.path.join(katalog, d)))
+
+
+def do_upsertu(plik, wartosci, dzien):
+    """Wiersz upsertu ZESTAW[plik]: kolumny klucza i pozostałe, na końcu dzień."""
+    return list(wartosci) + [dzien] * KOPIE_DNIA.get(plik, 1)
+
+
+def wiersze_zestawow(conn, katalog=ZMIANY_DIR):
+    """Generator (plik, wiersze upsertu) po kolei dla dni i plików zestawów; typy wg kolumn w conn."""
+    konwersje = {}
+    for dzien in dni_zestawow(katalog):
+        for plik, (tabela, _, klucz, reszta, _) in ZESTAW.items():
+            sciezka = os.path.join(katalog, dzien, plik + ".csv")
+            if not os.path.exists(sciezka):
+                continue
+            if plik not in konwersje:
+                konwersje[plik] = _konwersje(conn, tabela, klucz + reszta)
+            yield plik, [do_upsertu(plik, [None if p == NULL else f(p)
+                                           for f, p in zip(konwersje[plik], w)], dzien)
+                         for w in _czytaj_csv(sciezka, len(klucz) + len(reszta))]
+
+
+def wiersze_bazy(conn):
+    """Generator (plik, wiersze upsertu) z całej bazy - ten sam kształt co wiersze_zestawow."""
+    tabele = _tabele(conn)
+    for plik, (tabela, dzien_sql, klucz, reszta, _) in ZESTAW.items():
+        if tabela in tabele:
+            yield plik, [do_upsertu(plik, w[1:], w[0]) for w in conn.execute(
+                f"SELECT {dzien_sql}, {_kolumny_sql(conn, tabela, klucz + reszta)} FROM {tabela} "
+                f"WHERE {dzien_sql} IS NOT NULL")]
+
+
+def wczytaj(conn, katalog=ZMIANY_DIR):
+    """Wczytuje wszystkie zestawy zmian (jedna transakcja); zwraca liczbę wierszy."""
+    t0 = time.perf_counter()
+    n = 0
+    with conn:
+        for plik, wiersze in wiersze_zestawow(conn, katalog):
+            conn.executemany(ZESTAW[plik][4], wiersze)
+            n += len(wiersze)
+    log.info(f"Wczytano {n} wierszy z {katalog}/ ({time.perf_counter() - t0:.1f} s)")
+    return n
+
+
+def main():
+    logging.basicConfig(level=getattr(logging, LOG_LEVEL),
+                        format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    p = argparse.ArgumentParser(description="Tatry Flow — dzienne zestawy zmian bazy")
+    p.add_argument("--eksport",  action="store_true", help="Baza -> zestawy zmian")
+    p.add_argument("--wczytaj",  action="store_true", help="Zestawy zmian -> baza")
+    p.add_argument("--od",       default=None, help="Pierwszy dzien eksportu (YYYY-MM-DD)")
+    p.add_argument("--do",       default=None, help="Ostatni dzien eksportu (domyslnie dzis)")
+    p.add_argument("--wszystko", action="store_true", help="Eksport calej historii z bazy")
+    args = p.parse_args()
+
+    if args.wczytaj:
+        przygotuj_baze()
+        conn = sqlite3.connect(DB_PATH)
+        wczytaj(conn)
+        przestrzen.migruj(conn)
+        conn.commit()
+        retencja.zwin(conn)
+        conn.close()
+    if args.eksport:
+        do = args.do or date.today().isoformat()
+        od = "" if args.wszystko else (args.od or
+                                       (date.fromisoformat(do) - timedelta(days=ZMIANY_DNI)).isoformat())
+        conn = sqlite3.connect(DB_PATH)
+        eksportuj(conn, od, do)
+        conn.close()
+    if not (args.wczytaj or args.eksport):
+        p.print_help()
+
+
+if __name__ == "__main__":
+    main()